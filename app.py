@@ -1,8 +1,10 @@
 """
 This module initializes the Brewblog application, and creates
-the Flask application instance.
+the Flask application instance, warmed up before it serves requests.
 """
 
 from brewblog import create_app
+from brewblog.warmup import warm_up
 
 app = create_app()
+warm_up(app)
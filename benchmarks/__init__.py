@@ -0,0 +1,3 @@
+"""
+This package contains the benchmark and load-test tooling for the Brewblog API.
+"""
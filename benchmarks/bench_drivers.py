@@ -0,0 +1,114 @@
+"""
+This module compares the database drivers on the hot read queries.
+
+Each mode creates an application instance on the configured PostgreSQL
+database, with the driver and options of the mode, and times the queries behind
+`GET /api/breweries/<brewery_id>`, `GET /api/breweries/<brewery_id>/beers` and
+`POST /api/breweries/lookup`, each in its own transaction, as a request would.
+The modes are psycopg2, psycopg 3 with prepared statements and pipelining,
+psycopg 3 without pipelining, and psycopg 3 in PgBouncer mode. Run it against a
+database loaded with `benchmarks.dataset`.
+
+Usage:
+    python -m benchmarks.bench_drivers --requests 2000 --lookup-size 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+import sqlalchemy as sa
+from brewblog import create_app, db
+from brewblog.models import Brewery
+from brewblog.queries import fetch_beers_for_brewery, fetch_breweries, lookup_breweries
+from config import Config
+
+# (driver, DB_PIPELINE, DB_PGBOUNCER) of each mode
+MODES = {
+    'psycopg2': ('psycopg2', False, False),
+    'psycopg': ('psycopg', True, False),
+    'psycopg-no-pipeline': ('psycopg', False, False),
+    'psycopg-pgbouncer': ('psycopg', True, True),
+}
+
+def make_app(mode):
+    """
+    Creates an application instance using the driver and options of a mode.
+
+    Args:
+        mode (str): One of MODES.
+
+    Returns:
+        Flask: The application.
+    """
+    driver, pipeline, pgbouncer = MODES[mode]
+    url = sa.engine.make_url(Config.SQLALCHEMY_DATABASE_URI).set(drivername=f'postgresql+{driver}')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url.render_as_string(hide_password=False)
+        DB_PIPELINE = pipeline
+        DB_PGBOUNCER = pgbouncer
+        CACHE_TTL = 0
+    return create_app(BenchConfig)
+
+def time_query(query, arguments):
+    """
+    Runs a query once per argument, each in its own transaction.
+
+    Args:
+        query (callable): The function running the query.
+        arguments (list): The argument of each run.
+
+    Returns:
+        list: The duration of each run, in microseconds.
+    """
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        query(argument)
+        db.session.rollback()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+def main():
+    """
+    Main entry point for the database driver benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--requests', type=int, default=2000, help='number of runs of each query')
+    parser.add_argument('--lookup-size', type=int, default=20, help='number of ids per lookup')
+    parser.add_argument('--mode', choices=tuple(MODES), action='append',
+                        help='mode to run, repeat for several (default: all)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed of the requested ids')
+    args = parser.parse_args()
+
+    print(f'{"mode":<20} {"query":<16} {"mean":>8} {"p50":>8} {"p99":>8}')
+    for mode in args.mode or MODES:
+        app = make_app(mode)
+        with app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                parser.error('this benchmark compares PostgreSQL drivers')
+            ids = list(db.session.scalars(sa.select(Brewery.id)))
+            if not ids:
+                parser.error('the database has no brewery, load one with benchmarks.dataset')
+            # Every mode requests the same ids
+            rng = random.Random(args.seed)
+            queries = {
+                'show_brewery': (lambda brewery_id: fetch_breweries([brewery_id]),
+                                 rng.choices(ids, k=args.requests)),
+                'brewery_beers': (fetch_beers_for_brewery, rng.choices(ids, k=args.requests)),
+                'lookup': (lookup_breweries,
+                           [rng.sample(ids, min(args.lookup_size, len(ids)))
+                            for _ in range(args.requests)]),
+            }
+            for name, (query, arguments) in queries.items():
+                # Warm up the pool, and let psycopg 3 prepare the statements
+                time_query(query, arguments[:20])
+                timings = sorted(time_query(query, arguments))
+                print(f'{mode:<20} {name:<16} {statistics.mean(timings):>6.0f}us '
+                      f'{timings[len(timings) // 2]:>6.0f}us '
+                      f'{timings[int(len(timings) * 0.99)]:>6.0f}us')
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+This module compares the encode time and payload size of the response encoders
+on a large generated catalogue, shaped like the `get_breweries` response.
+
+Usage:
+    python -m benchmarks.bench_encoding --breweries 5000 --beers 100000
+"""
+
+import argparse
+import json
+import time
+from benchmarks.dataset import Dataset
+from seed import STYLES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def encoders():
+    """
+    Lists the available encoders.
+
+    Returns:
+        dict: Encoding functions by name.
+    """
+    available = {
+        # Flask's default provider: sorted keys, compact separators
+        'stdlib json': lambda obj: json.dumps(
+            obj, sort_keys=True, separators=(',', ':')).encode('utf-8'),
+    }
+    if orjson is not None:
+        available['orjson'] = lambda obj: orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    if msgpack is not None:
+        available['msgpack'] = msgpack.packb
+    return available
+
+def main():
+    """
+    Main entry point for the encoding benchmark.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark response encoders.')
+    parser.add_argument('--breweries', type=int, default=5000, help='number of breweries')
+    parser.add_argument('--beers', type=int, default=100000, help='total number of beers')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--repeat', type=int, default=5, help='encodes per encoder')
+    args = parser.parse_args()
+
+    catalogue = Dataset(args.breweries, args.beers, args.seed).catalogue(STYLES)
+    print(f'{"encoder":<14} {"best ms":>10} {"size KiB":>10}')
+    for name, encode in encoders().items():
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            body = encode(catalogue)
+            timings.append(time.perf_counter() - started)
+        print(f'{name:<14} {min(timings) * 1000:>10.1f} {len(body) / 1024:>10.1f}')
+
+if __name__ == '__main__':
+    main()
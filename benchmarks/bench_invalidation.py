@@ -0,0 +1,76 @@
+"""
+This module measures how long a change committed by one worker takes to evict
+the cache of another worker.
+
+Two application instances run in this process, each with its own invalidation
+bus: one commits changes to a brewery, the other receives them through the
+change feed (PostgreSQL) or by polling the change log, and records the delay
+between each change and its eviction. Run it against a database loaded with
+`benchmarks.dataset`.
+
+Usage:
+    python -m benchmarks.bench_invalidation --changes 200 --mode notify
+"""
+
+import argparse
+import time
+import sqlalchemy as sa
+from brewblog import create_app, db
+from brewblog.changes import record_change
+from brewblog.models import Brewery
+from config import Config
+
+def make_app(mode):
+    """
+    Creates an application instance using the given invalidation mode.
+
+    Args:
+        mode (str): 'notify' or 'poll'.
+
+    Returns:
+        Flask: The application.
+    """
+    class BenchConfig(Config):
+        CACHE_INVALIDATION = mode
+    return create_app(BenchConfig)
+
+def main():
+    """
+    Main entry point for the cache invalidation benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--changes', type=int, default=200, help='number of changes to commit')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between two changes')
+    parser.add_argument('--mode', choices=('notify', 'poll'), default='notify',
+                        help='how the reading worker receives changes')
+    args = parser.parse_args()
+
+    writer = make_app('notify')
+    reader = make_app(args.mode)
+    bus = reader.extensions['invalidation_bus']
+    bus.start()
+    # Let the listener connect before the first change
+    time.sleep(1)
+
+    with writer.app_context():
+        brewery_id = db.session.scalar(sa.select(Brewery.id).limit(1))
+        if brewery_id is None:
+            parser.error('the database has no brewery, load one with benchmarks.dataset')
+        for i in range(args.changes):
+            db.session.execute(
+                sa.update(Brewery).where(Brewery.id == brewery_id).values(phone=f'{i:010d}'))
+            record_change('brewery', brewery_id)
+            db.session.commit()
+            time.sleep(args.interval)
+
+    deadline = time.monotonic() + 10 + bus.poll_interval
+    while bus.latency_stats()['samples'] < args.changes and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    stats = bus.latency_stats()
+    print(f'mode: {args.mode}, received {stats["samples"]}/{args.changes} changes')
+    if stats['samples']:
+        print(f'p50 {stats["p50_ms"]}ms  p99 {stats["p99_ms"]}ms  max {stats["max_ms"]}ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+This module compares brewery IDs stored as 36 character strings with the
+native `uuid` type, on PostgreSQL.
+
+The brewery and beer IDs of the configured database are copied into two pairs
+of temporary tables, one keyed by `varchar(36)` as before the UUID migration,
+one keyed by `uuid` as after it, with the same indexes as the real tables. The
+benchmark reports the size of the indexes and the time of the join made by
+`get_breweries`, and of the brewery lookups made by `show_brewery`. Run it
+against a database loaded with `benchmarks.dataset`.
+
+Usage:
+    python -m benchmarks.bench_uuid_ids --lookups 10000 --joins 5
+"""
+
+import argparse
+import random
+import time
+import sqlalchemy as sa
+from brewblog import create_app, db
+
+LAYOUTS = {'varchar': 'varchar(36)', 'uuid': 'uuid'}
+
+def create_tables(conn, layout, column_type):
+    """
+    Copies the brewery and beer IDs into temporary tables keyed by the given type.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        layout (str): The name of the layout, used as a table prefix.
+        column_type (str): The SQL type of the brewery IDs.
+    """
+    conn.execute(sa.text(
+        f'CREATE TEMPORARY TABLE {layout}_brewery AS '
+        f'SELECT id::{column_type} AS id, name FROM "Brewery"'))
+    conn.execute(sa.text(
+        f'CREATE TEMPORARY TABLE {layout}_beer AS '
+        f'SELECT id, name, brewery_id::{column_type} AS brewery_id FROM "Beer"'))
+    conn.execute(sa.text(f'ALTER TABLE {layout}_brewery ADD PRIMARY KEY (id)'))
+    conn.execute(sa.text(f'CREATE INDEX {layout}_beer_brewery_id ON {layout}_beer (brewery_id)'))
+    conn.execute(sa.text(f'ANALYZE {layout}_brewery'))
+    conn.execute(sa.text(f'ANALYZE {layout}_beer'))
+
+def index_sizes(conn, layout):
+    """
+    Returns the size of the indexes of a layout.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        layout (str): The name of the layout.
+
+    Returns:
+        tuple: The size of the brewery primary key and of the beer foreign key index, in bytes.
+    """
+    return (
+        conn.scalar(sa.text(f"SELECT pg_relation_size('{layout}_brewery_pkey')")),
+        conn.scalar(sa.text(f"SELECT pg_relation_size('{layout}_beer_brewery_id')")),
+    )
+
+def time_joins(conn, layout, repeat):
+    """
+    Times the join of every beer with its brewery.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        layout (str): The name of the layout.
+        repeat (int): The number of runs.
+
+    Returns:
+        float: The fastest run, in seconds.
+    """
+    query = sa.text(
+        f'SELECT count(*), max(br.name) FROM {layout}_beer b '
+        f'JOIN {layout}_brewery br ON br.id = b.brewery_id')
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(query).one()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def time_lookups(conn, layout, brewery_ids):
+    """
+    Times the lookup of breweries and their beers by ID.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        layout (str): The name of the layout.
+        brewery_ids (list): The IDs to look up, in canonical form.
+
+    Returns:
+        float: The mean time of a lookup, in microseconds.
+    """
+    query = sa.text(
+        f'SELECT br.name, count(b.id) FROM {layout}_brewery br '
+        f'LEFT JOIN {layout}_beer b ON b.brewery_id = br.id '
+        f'WHERE br.id = CAST(:id AS {LAYOUTS[layout]}) GROUP BY br.name')
+    started = time.perf_counter()
+    for brewery_id in brewery_ids:
+        conn.execute(query, {'id': brewery_id}).all()
+    return (time.perf_counter() - started) / len(brewery_ids) * 1_000_000
+
+def main():
+    """
+    Main entry point for the UUID id benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--lookups', type=int, default=10000, help='number of brewery lookups')
+    parser.add_argument('--joins', type=int, default=5, help='number of runs of the full join')
+    parser.add_argument('--seed', type=int, default=42, help='random seed of the looked up IDs')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        conn = db.session.connection()
+        if conn.dialect.name != 'postgresql':
+            parser.error('this benchmark compares PostgreSQL column types')
+        ids = list(conn.scalars(sa.text('SELECT id::text FROM "Brewery"')))
+        if not ids:
+            parser.error('the database has no brewery, load one with benchmarks.dataset')
+        beers = conn.scalar(sa.text('SELECT count(*) FROM "Beer"'))
+        lookups = random.Random(args.seed).choices(ids, k=args.lookups)
+
+        print(f'{len(ids)} breweries, {beers} beers')
+        print(f'{"layout":<8} {"pkey":>10} {"fk index":>10} {"join":>10} {"lookup":>10}')
+        for layout, column_type in LAYOUTS.items():
+            create_tables(conn, layout, column_type)
+            pkey, fk_index = index_sizes(conn, layout)
+            join = time_joins(conn, layout, args.joins)
+            lookup = time_lookups(conn, layout, lookups)
+            print(f'{layout:<8} {pkey / 2**20:>8.1f}MB {fk_index / 2**20:>8.1f}MB '
+                  f'{join * 1000:>8.0f}ms {lookup:>8.0f}us')
+        db.session.rollback()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+This module generates a synthetic, production-scale dataset of breweries and beers.
+Breweries are spread over a realistic city/state distribution, and each brewery gets
+a Zipf-like (heavily skewed) number of beers. The same seed always produces the
+same dataset, so it is the standard fixture for the benchmarks.
+
+Usage:
+    python -m benchmarks.dataset --breweries 50000 --beers 1000000 --seed 42
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+import uuid
+import sqlalchemy as sa
+
+# (city, state, weight) with weights roughly proportional to the local brewery scene
+CITIES = [
+    ('Portland', 'Oregon', 70), ('Denver', 'Colorado', 65), ('Seattle', 'Washington', 60),
+    ('San Diego', 'California', 58), ('Chicago', 'Illinois', 55), ('Asheville', 'North Carolina', 40),
+    ('Austin', 'Texas', 38), ('Grand Rapids', 'Michigan', 30), ('Boulder', 'Colorado', 28),
+    ('Bend', 'Oregon', 26), ('Philadelphia', 'Pennsylvania', 26), ('Brooklyn', 'New York', 25),
+    ('Los Angeles', 'California', 25), ('Minneapolis', 'Minnesota', 24), ('Milwaukee', 'Wisconsin', 22),
+    ('Cincinnati', 'Ohio', 20), ('Boston', 'Massachusetts', 20), ('Fort Collins', 'Colorado', 19),
+    ('Burlington', 'Vermont', 18), ('Richmond', 'Virginia', 17), ('Tampa', 'Florida', 16),
+    ('Kansas City', 'Missouri', 15), ('St. Louis', 'Missouri', 15), ('Pittsburgh', 'Pennsylvania', 14),
+    ('Columbus', 'Ohio', 14), ('Nashville', 'Tennessee', 13), ('Atlanta', 'Georgia', 13),
+    ('Houston', 'Texas', 13), ('Salt Lake City', 'Utah', 10), ('Phoenix', 'Arizona', 10),
+    ('Fayetteville', 'Arkansas', 8), ('Missoula', 'Montana', 8), ('Portland', 'Maine', 8),
+    ('Anchorage', 'Alaska', 6), ('Boise', 'Idaho', 6), ('Fargo', 'North Dakota', 4),
+    ('Burlington', 'Iowa', 3), ('Cheyenne', 'Wyoming', 3), ('Wilmington', 'Delaware', 3),
+]
+
+NAME_PREFIXES = [
+    'Hop', 'Iron', 'Copper', 'River', 'Mountain', 'Old', 'Lost', 'Rusty', 'Wild', 'Black',
+    'Golden', 'Broken', 'Twin', 'Red', 'Stone', 'Lucky', 'Crooked', 'Foggy', 'Salty', 'Prairie',
+]
+NAME_SUFFIXES = [
+    'Barrel', 'Anchor', 'Fox', 'Kettle', 'Bridge', 'Owl', 'Mill', 'Hollow', 'Creek', 'Bear',
+    'Lantern', 'Harbor', 'Ridge', 'Yard', 'Oak', 'Pine', 'Rail', 'Horse', 'Compass', 'Forge',
+]
+BREWERY_KINDS = ['Brewing', 'Brewing Company', 'Brewery', 'Beer Works', 'Ales', 'Taproom']
+STREETS = ['Main', 'Oak', 'Elm', 'Market', 'Water', 'Mill', 'Park', 'Church', 'Railroad', 'Depot']
+STREET_KINDS = ['St', 'Ave', 'Blvd', 'Rd', 'Way']
+BEER_ADJECTIVES = [
+    'Hazy', 'Juicy', 'Dark', 'Dry', 'Imperial', 'Session', 'Smoked', 'Barrel Aged', 'Citrus', 'Crisp',
+]
+BEER_NOUNS = ['Daydream', 'Trail', 'Horizon', 'Ember', 'Tide', 'Orchard', 'Summit', 'Fog', 'Harvest', 'Echo']
+FLAVOURS = ['citrus', 'pine', 'caramel', 'chocolate', 'coffee', 'stone fruit', 'bread crust', 'tart cherry']
+
+class Dataset:
+    """
+    Deterministic description of a synthetic dataset.
+
+    Attributes:
+        breweries (int): The number of breweries.
+        beers (int): The total number of beers.
+        seed (int): The random seed.
+        zipf_exponent (float): The skew of the beers-per-brewery distribution.
+    """
+    def __init__(self, breweries, beers, seed=42, zipf_exponent=1.1):
+        self.breweries = breweries
+        self.beers = beers
+        self.seed = seed
+        self.zipf_exponent = zipf_exponent
+
+    def beer_counts(self):
+        """
+        Distributes the beers over the breweries following a Zipf-like law.
+
+        The brewery with rank r gets a share proportional to 1 / r**s of the beers,
+        and ranks are shuffled so large breweries are spread over the dataset.
+
+        Returns:
+            list: The number of beers of each brewery, in brewery order.
+        """
+        rng = random.Random(self.seed + 1)
+        weights = [1.0 / rank ** self.zipf_exponent for rank in range(1, self.breweries + 1)]
+        total = sum(weights)
+        counts = [int(self.beers * weight / total) for weight in weights]
+        for rank in range(self.beers - sum(counts)):
+            counts[rank % self.breweries] += 1
+        rng.shuffle(counts)
+        return counts
+
+    def brewery_rows(self):
+        """
+        Generates the brewery rows.
+
+        Yields:
+            dict: The column values of a brewery.
+        """
+        rng = random.Random(self.seed)
+        cities, weights = zip(*[((city, state), weight) for city, state, weight in CITIES])
+        for i in range(self.breweries):
+            city, state = rng.choices(cities, weights)[0]
+            name = (f'{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_SUFFIXES)} '
+                    f'{rng.choice(BREWERY_KINDS)}')
+            slug = name.lower().replace(' ', '')
+            yield {
+                'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'name': name,
+                'address': f'{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_KINDS)}',
+                'city': city,
+                'state': state,
+                'phone': f'{rng.randint(200, 999)}{rng.randint(200, 999)}{rng.randint(0, 9999):04d}',
+                'website_link': f'http://www.{slug}{i}.com',
+            }
+
+    def beer_rows(self, brewery_ids, style_ids, first_id=1):
+        """
+        Generates the beer rows.
+
+        Args:
+            brewery_ids (list): The ids of the breweries, in generation order.
+            style_ids (list): The ids of the available beer styles.
+            first_id (int): The id of the first beer.
+
+        Yields:
+            dict: The column values of a beer.
+        """
+        rng = random.Random(self.seed + 2)
+        beer_id = first_id
+        for brewery_id, count in zip(brewery_ids, self.beer_counts()):
+            for _ in range(count):
+                yield {
+                    'id': beer_id,
+                    'name': f'{rng.choice(BEER_ADJECTIVES)} {rng.choice(BEER_NOUNS)}',
+                    'description': (f'Notes of {rng.choice(FLAVOURS)} and {rng.choice(FLAVOURS)}, '
+                                    f'{rng.randint(4, 12)}.{rng.randint(0, 9)}% ABV.'),
+                    'brewery_id': brewery_id,
+                    'style_id': rng.choice(style_ids),
+                }
+                beer_id += 1
+
+    def catalogue(self, style_names):
+        """
+        Builds the serialized catalogue in memory, without a database.
+
+        The result has the shape of the `get_breweries` response, which makes it
+        suitable for encoding and payload size benchmarks.
+
+        Args:
+            style_names (list): The names of the available beer styles.
+
+        Returns:
+            list: The breweries grouped by city and state.
+        """
+        breweries = list(self.brewery_rows())
+        by_brewery = {brewery['id']: [] for brewery in breweries}
+        style_ids = list(range(len(style_names)))
+        for beer in self.beer_rows([brewery['id'] for brewery in breweries], style_ids):
+            by_brewery[beer['brewery_id']].append({
+                'beer_id': beer['id'],
+                'beer_name': beer['name'],
+                'beer_style': style_names[beer['style_id']],
+                'beer_description': beer['description'],
+            })
+
+        areas = {}
+        for brewery in breweries:
+            beers = by_brewery[brewery['id']]
+            areas.setdefault((brewery['city'], brewery['state']), []).append(
+                dict(brewery, beers=beers, beers_count=len(beers)))
+        return [{'city': city, 'state': state, 'breweries': items}
+                for (city, state), items in areas.items()]
+
+def _batches(rows, size):
+    """
+    Splits an iterable of rows into lists of at most `size` rows.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def bulk_insert(conn, table, rows, batch_size=10000):
+    """
+    Inserts rows in bulk, with COPY on PostgreSQL and executemany elsewhere.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        table (Table): The table to insert into.
+        rows (iterable): The column values of each row.
+        batch_size (int): The number of rows sent per round trip.
+
+    Returns:
+        int: The number of inserted rows.
+    """
+    inserted = 0
+    driver = conn.dialect.driver if conn.dialect.name == 'postgresql' else None
+    for batch in _batches(rows, batch_size):
+        if driver == 'psycopg':
+            columns = list(batch[0])
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            with conn.connection.cursor() as cursor:
+                with cursor.copy(f'COPY "{table.name}" ({column_list}) FROM STDIN') as copy:
+                    for row in batch:
+                        copy.write_row([row[column] for column in columns])
+        elif driver == 'psycopg2':
+            columns = list(batch[0])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([row[column] for column in columns] for row in batch)
+            buffer.seek(0)
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            conn.execute(sa.insert(table), batch)
+        inserted += len(batch)
+    return inserted
+
+def load_dataset(dataset, truncate=False, batch_size=10000):
+    """
+    Loads a synthetic dataset into the database of the current application.
+
+    Args:
+        dataset (Dataset): The dataset to load.
+        truncate (bool): Whether to delete existing breweries and beers first.
+        batch_size (int): The number of rows sent per round trip.
+
+    Returns:
+        tuple: The number of inserted breweries and beers.
+    """
+    from brewblog import db
+    from brewblog.models import Beer, Brewery, Style
+    from seed import seed_styles
+
+    seed_styles()
+    conn = db.session.connection()
+    if truncate:
+        conn.execute(sa.delete(Beer))
+        conn.execute(sa.delete(Brewery))
+
+    style_ids = list(conn.scalars(sa.select(Style.id).order_by(Style.id)))
+    brewery_rows = list(dataset.brewery_rows())
+    breweries = bulk_insert(conn, Brewery.__table__, brewery_rows, batch_size)
+
+    first_id = (conn.scalar(sa.select(sa.func.max(Beer.id))) or 0) + 1
+    beers = bulk_insert(
+        conn,
+        Beer.__table__,
+        dataset.beer_rows([row['id'] for row in brewery_rows], style_ids, first_id),
+        batch_size)
+
+    if conn.dialect.name == 'postgresql':
+        # Explicit ids do not advance the serial sequence
+        conn.execute(sa.text(
+            'SELECT setval(pg_get_serial_sequence(\'"Beer"\', \'id\'), '
+            '(SELECT MAX(id) FROM "Beer"))'))
+    db.session.commit()
+    return breweries, beers
+
+def main():
+    """
+    Main entry point for the dataset generator.
+    """
+    parser = argparse.ArgumentParser(description='Generate a synthetic Brewblog dataset.')
+    parser.add_argument('--breweries', type=int, default=1000, help='number of breweries')
+    parser.add_argument('--beers', type=int, default=20000, help='total number of beers')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--zipf', type=float, default=1.1,
+                        help='skew of the beers-per-brewery distribution')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per round trip')
+    parser.add_argument('--truncate', action='store_true',
+                        help='delete existing breweries and beers first')
+    args = parser.parse_args()
+
+    from brewblog import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        breweries, beers = load_dataset(
+            Dataset(args.breweries, args.beers, args.seed, args.zipf),
+            truncate=args.truncate,
+            batch_size=args.batch_size)
+        elapsed = time.perf_counter() - started
+    print(f'Inserted {breweries} breweries and {beers} beers in {elapsed:.1f}s')
+
+if __name__ == '__main__':
+    main()
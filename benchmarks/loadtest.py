@@ -0,0 +1,355 @@
+"""
+This module replays the requests described in the Postman collection against a
+running instance of the API, and reports throughput and latency percentiles per route.
+
+The bearer tokens of the collection are replaced with tokens minted locally with
+the test private key, carrying the same permissions. The API must therefore run
+with `FLASK_ENV=testing`, so it verifies tokens against the test public key
+instead of Auth0.
+
+Usage:
+    FLASK_ENV=testing flask run
+    python -m benchmarks.loadtest --concurrency 16 --duration 30
+    python -m benchmarks.loadtest --compare results/a.json results/b.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import jwt
+import requests
+
+COLLECTION = 'BrewBlog_API.postman_collection.json'
+PRIVATE_KEY = 'tests/private_key.pem'
+RESULTS_DIR = 'benchmarks/results'
+POSTMAN_BREWERY_ID = '64f90c02-c3f8-4dec-a7c1-ea176b161d88'
+
+def mint_token(private_key, permissions):
+    """
+    Mints a JWT signed with the test private key.
+
+    Args:
+        private_key (str): The PEM encoded private key.
+        permissions (list): The permissions to include in the token.
+
+    Returns:
+        str: The encoded token.
+    """
+    now = datetime.now(timezone.utc)
+    payload = {
+        'permissions': permissions,
+        'exp': int((now + timedelta(hours=12)).timestamp()),
+        'iat': int(now.timestamp()),
+        'iss': 'loadtest',
+        'sub': 'loadtest'
+    }
+    return jwt.encode(payload, private_key, algorithm='RS256')
+
+def load_collection(path, private_key):
+    """
+    Extracts the request shapes of the Postman collection.
+
+    Args:
+        path (str): The path of the Postman collection.
+        private_key (str): The PEM encoded private key used to mint tokens.
+
+    Returns:
+        list: The requests, as dicts with a name, method, path, body and headers.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        collection = json.load(f)
+    variables = {variable['key']: variable['value'] for variable in collection.get('variable', [])}
+
+    tokens = {}
+    def token_for(auth):
+        variable = auth['bearer'][0]['value'].strip('{}')
+        if variable not in tokens:
+            claims = jwt.decode(variables[variable], options={'verify_signature': False})
+            tokens[variable] = mint_token(private_key, claims.get('permissions', []))
+        return tokens[variable]
+
+    shapes = []
+    def walk(items, prefix, auth):
+        for item in items:
+            item_auth = item.get('auth', auth)
+            if 'item' in item:
+                walk(item['item'], f'{prefix}{item["name"]}/', item_auth)
+                continue
+            request = item['request']
+            url = request['url']['raw'] if isinstance(request['url'], dict) else request['url']
+            headers = {}
+            if item_auth and item_auth.get('type') == 'bearer':
+                headers['Authorization'] = f'Bearer {token_for(item_auth)}'
+            body = request.get('body', {}).get('raw')
+            shapes.append({
+                'name': f'{prefix}{item["name"]}',
+                'method': request['method'],
+                'path': url.replace('{{endpoint}}', ''),
+                'body': json.loads(body) if body else None,
+                'headers': headers,
+            })
+
+    walk(collection['item'], '', collection.get('auth'))
+    return shapes
+
+def percentile(samples, fraction):
+    """
+    Computes a nearest-rank percentile.
+
+    Args:
+        samples (list): The sorted samples.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The percentile value.
+    """
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+class LoadTest:
+    """
+    Replays request shapes against the API from a pool of threads.
+
+    Attributes:
+        endpoint (str): The base URL of the API, including the /api prefix.
+        shapes (list): The request shapes to replay.
+        brewery_id (str): The brewery id substituted for the one in the collection.
+        concurrency (int): The number of concurrent clients.
+    """
+    def __init__(self, endpoint, shapes, brewery_id, concurrency):
+        self.endpoint = endpoint.rstrip('/')
+        self.shapes = shapes
+        self.brewery_id = brewery_id
+        self.concurrency = concurrency
+        self.samples = {shape['name']: [] for shape in shapes}
+        self.statuses = {shape['name']: {} for shape in shapes}
+        self.errors = {shape['name']: 0 for shape in shapes}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _prepare(self, shape):
+        """
+        Substitutes the brewery id and fresh ids for created entities.
+        """
+        path = shape['path'].replace(POSTMAN_BREWERY_ID, self.brewery_id)
+        body = shape['body']
+        if body is not None:
+            body = dict(body)
+            if body.get('brewery_id') == POSTMAN_BREWERY_ID:
+                body['brewery_id'] = self.brewery_id
+            if shape['path'].endswith('/breweries/create'):
+                body['id'] = str(uuid.uuid4())
+            elif shape['path'].endswith('/beers/create'):
+                body['id'] = random.randint(10 ** 8, 2 ** 31 - 1)
+        return path, body
+
+    def send(self, shape):
+        """
+        Sends a single request and records its latency and status.
+
+        Args:
+            shape (dict): The request shape.
+        """
+        path, body = self._prepare(shape)
+        started = time.perf_counter()
+        try:
+            response = self._session().request(
+                shape['method'], self.endpoint + path, json=body, headers=shape['headers'], timeout=60)
+            response.content  # pylint: disable=pointless-statement
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.samples[shape['name']].append(elapsed)
+            statuses = self.statuses[shape['name']]
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status is None or status >= 500:
+                self.errors[shape['name']] += 1
+
+    def run(self, duration=None, iterations=None):
+        """
+        Runs the load test for a duration or a number of iterations per client.
+
+        Args:
+            duration (float): The number of seconds to run for.
+            iterations (int): The number of passes over the shapes per client.
+
+        Returns:
+            float: The wall clock time of the run in seconds.
+        """
+        deadline = time.monotonic() + duration if duration else None
+
+        def client(seed):
+            rng = random.Random(seed)
+            count = 0
+            while (deadline and time.monotonic() < deadline) or (iterations and count < iterations):
+                shapes = list(self.shapes)
+                rng.shuffle(shapes)
+                for shape in shapes:
+                    self.send(shape)
+                count += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(client, range(self.concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        """
+        Summarizes the recorded samples.
+
+        Args:
+            elapsed (float): The wall clock time of the run in seconds.
+
+        Returns:
+            dict: The throughput and latency percentiles per route.
+        """
+        routes = {}
+        for name, samples in self.samples.items():
+            samples = sorted(samples)
+            routes[name] = {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'statuses': self.statuses[name],
+                'throughput': len(samples) / elapsed if elapsed else 0,
+                'p50_ms': _ms(percentile(samples, 0.50)),
+                'p95_ms': _ms(percentile(samples, 0.95)),
+                'p99_ms': _ms(percentile(samples, 0.99)),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'elapsed': elapsed,
+            'concurrency': self.concurrency,
+            'throughput': total / elapsed if elapsed else 0,
+            'routes': routes,
+        }
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+def git_commit():
+    """
+    Returns the current git commit, if any.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(report):
+    """
+    Prints a report as a table.
+    """
+    print(f'{"route":<40} {"reqs":>7} {"err":>5} {"req/s":>9} {"p50":>9} {"p95":>9} {"p99":>9}')
+    for name, route in sorted(report['routes'].items()):
+        print(f'{name:<40} {route["requests"]:>7} {route["errors"]:>5} {route["throughput"]:>9.1f} '
+              f'{route["p50_ms"] or 0:>9.2f} {route["p95_ms"] or 0:>9.2f} {route["p99_ms"] or 0:>9.2f}')
+    print(f'total throughput: {report["throughput"]:.1f} req/s over {report["elapsed"]:.1f}s')
+
+def compare(before_path, after_path):
+    """
+    Prints the per-route difference between two stored results.
+
+    Args:
+        before_path (str): The path of the baseline result.
+        after_path (str): The path of the result to compare.
+    """
+    with open(before_path, 'r', encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+
+    def change(old, new):
+        if not old or new is None:
+            return '     n/a'
+        return f'{(new - old) / old * 100:+7.1f}%'
+
+    print(f'{before.get("commit")} -> {after.get("commit")}')
+    print(f'{"route":<40} {"req/s":>9} {"p50":>9} {"p95":>9} {"p99":>9}')
+    for name in sorted(set(before['routes']) & set(after['routes'])):
+        old, new = before['routes'][name], after['routes'][name]
+        print(f'{name:<40} {change(old["throughput"], new["throughput"]):>9} '
+              f'{change(old["p50_ms"], new["p50_ms"]):>9} {change(old["p95_ms"], new["p95_ms"]):>9} '
+              f'{change(old["p99_ms"], new["p99_ms"]):>9}')
+
+def main():
+    """
+    Main entry point for the load-test harness.
+    """
+    parser = argparse.ArgumentParser(description='Load test the Brewblog API.')
+    parser.add_argument('--endpoint', default='http://localhost:5000/api', help='base URL of the API')
+    parser.add_argument('--collection', default=COLLECTION, help='Postman collection to replay')
+    parser.add_argument('--private-key', default=PRIVATE_KEY, help='key used to sign tokens')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+    parser.add_argument('--iterations', type=int, help='passes per client, instead of a duration')
+    parser.add_argument('--brewery-id', help='brewery used by per-brewery routes')
+    parser.add_argument('--routes', help='comma separated substrings of the request names to replay')
+    parser.add_argument('--reads-only', action='store_true', help='only replay GET requests')
+    parser.add_argument('--output', help='path of the JSON result file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two stored results instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with open(args.private_key, 'r', encoding='utf-8') as f:
+        private_key = f.read()
+    shapes = load_collection(args.collection, private_key)
+    if args.reads_only:
+        shapes = [shape for shape in shapes if shape['method'] == 'GET']
+    if args.routes:
+        wanted = args.routes.split(',')
+        shapes = [shape for shape in shapes if any(part in shape['name'] for part in wanted)]
+
+    brewery_id = args.brewery_id
+    if brewery_id is None:
+        token = mint_token(private_key, ['get:breweries'])
+        areas = requests.get(
+            f'{args.endpoint.rstrip("/")}/breweries',
+            headers={'Authorization': f'Bearer {token}'}, timeout=300).json()
+        brewery_id = areas[0]['breweries'][0]['id'] if areas else POSTMAN_BREWERY_ID
+
+    load_test = LoadTest(args.endpoint, shapes, brewery_id, args.concurrency)
+    elapsed = load_test.run(
+        duration=None if args.iterations else args.duration, iterations=args.iterations)
+    report = load_test.report(elapsed)
+    report.update({
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'endpoint': args.endpoint,
+        'brewery_id': brewery_id,
+    })
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{stamp}-{report["commit"] or "unknown"}.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'results written to {output}')
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,11 @@ It sets up the database, migration, CORS, and registers blueprints.
 from os import environ as env
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from dotenv import find_dotenv, load_dotenv
 from flask_cors import CORS
+# Loads the .env file, once
 from config import Config
 
-ENV = find_dotenv('.env')
-if ENV:
-    load_dotenv(ENV)
-
 db = SQLAlchemy()
-migrate = Migrate()
 
 def create_app(config_class=Config):
     """
@@ -32,17 +26,72 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     app.secret_key = env.get("APP_SECRET_KEY")
 
+    from brewblog.ids import register_converters
+    register_converters(app)
+
+    from brewblog.json_provider import init_json_provider
+    init_json_provider(app)
+
+    from brewblog.database import init_database
+    init_database(app)
+
     db.init_app(app)
-    migrate.init_app(app, db)
+    if env.get('FLASK_RUN_FROM_CLI') == 'true':
+        # Migration tooling imports alembic, which only the `flask db` commands need
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from brewblog.slow_query import register_slow_query_log
+    with app.app_context():
+        register_slow_query_log(app, db.engine)
+
+    from brewblog.tracing import init_tracing
+    init_tracing(app)
+
+    from brewblog.profiling import init_profiling
+    init_profiling(app)
+
+    from brewblog.resilience import init_resilience
+    init_resilience(app)
+
+    from brewblog.admission import init_admission
+    init_admission(app)
+
+    from brewblog.feed import init_change_feed
+    init_change_feed(app)
+
+    from brewblog.cache import init_cache
+    init_cache(app)
 
     CORS(app, origins="*", supports_credentials=True)
 
+    from brewblog.compression import init_compression
+    init_compression(app)
+
+    from brewblog.cli import register_commands
+    register_commands(app)
+
     from brewblog.beer import bp as beer_bp
     app.register_blueprint(beer_bp)
 
     from brewblog.brewery import bp as brewery_bp
     app.register_blueprint(brewery_bp)
 
+    from brewblog.sync import bp as sync_bp
+    app.register_blueprint(sync_bp)
+
+    from brewblog.stream import bp as stream_bp
+    app.register_blueprint(stream_bp)
+
+    from brewblog.batch import bp as batch_bp
+    app.register_blueprint(batch_bp)
+
+    from brewblog.job import bp as job_bp
+    app.register_blueprint(job_bp)
+
+    from brewblog.tracing import instrument_views
+    instrument_views(app)
+
     return app
 
 from brewblog import models
@@ -0,0 +1,278 @@
+"""
+This module implements admission control, so spikes are shed early instead of
+queueing behind an exhausted connection pool. Each worker admits a bounded
+number of requests at once, sized from its connection pool. Excess requests
+wait briefly in a bounded queue and are then rejected with a fast 503 and a
+Retry-After header. Cheap routes, marked with the `priority` decorator, can use
+a share of the capacity that standard routes cannot, and are admitted before
+the standard routes queued with them. `GET /ready` reports the saturation of the
+worker to the load balancer.
+"""
+
+import threading
+from flask import current_app, jsonify, request
+import sqlalchemy as sa
+from brewblog import db
+
+PRIORITY = 'priority'
+STANDARD = 'standard'
+
+# The request environ key holding the class a request was admitted as
+ADMISSION_KEY = 'brewblog.admission'
+
+# Requests counted by their parent request, such as the sub-requests of a batch
+ADMITTED_BY_PARENT = 'parent'
+
+# Endpoints that never wait for admission: readiness probes, and event streams,
+# which return their connection to the pool before streaming
+EXEMPT_ENDPOINTS = ('ready', 'stream.stream', 'static')
+
+def priority(f):
+    """
+    Decorator marking a view as cheap, so it is admitted ahead of standard views.
+
+    Args:
+        f (function): The view function.
+
+    Returns:
+        function: The same function.
+    """
+    f.admission_priority = True
+    return f
+
+def pool_capacity(pool):
+    """
+    Returns the number of connections a pool can check out at once.
+
+    Args:
+        pool (Pool): The connection pool.
+
+    Returns:
+        int: The capacity, or 0 if the pool is unbounded.
+    """
+    if not isinstance(pool, sa.pool.QueuePool):
+        return 0
+    max_overflow = pool._max_overflow  # pylint: disable=protected-access
+    return 0 if max_overflow < 0 else pool.size() + max_overflow
+
+class AdmissionController:
+    """
+    Counts the requests in flight and the connections checked out by a worker,
+    and decides which requests are admitted.
+
+    Attributes:
+        capacity (int): The number of requests admitted at once.
+        standard_capacity (int): The number of standard requests admitted at once.
+        max_queue (int): The number of requests waiting for admission at once.
+        queue_timeout (float): Seconds a request waits for admission before it is rejected.
+        retry_after (int): Seconds clients are told to wait before retrying a rejected request.
+        ready_threshold (float): The saturation above which the worker reports it is not ready.
+        pool_size (int): The capacity of the connection pool, or 0 if unbounded.
+    """
+    def __init__(self, capacity, reserved_fraction, max_queue, queue_timeout, retry_after,
+                 ready_threshold, pool_size=0):
+        self.capacity = max(capacity, 1)
+        self.standard_capacity = max(int(self.capacity * (1 - reserved_fraction)), 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.ready_threshold = ready_threshold
+        self.pool_size = pool_size
+        self.in_flight = {PRIORITY: 0, STANDARD: 0}
+        self.waiting = {PRIORITY: 0, STANDARD: 0}
+        self.checked_out = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    def _can_admit(self, cls):
+        total = self.in_flight[PRIORITY] + self.in_flight[STANDARD]
+        if cls == PRIORITY:
+            return total < self.capacity
+        # Standard requests leave the reserved share to cheap ones, wait for the
+        # cheap requests queued before them, and do not start on a drained pool
+        return (total < self.standard_capacity
+                and self.waiting[PRIORITY] == 0
+                and (not self.pool_size or self.checked_out < self.pool_size))
+
+    def acquire(self, cls):
+        """
+        Admits a request, waiting up to `queue_timeout` for capacity.
+
+        Args:
+            cls (str): The class of the request, PRIORITY or STANDARD.
+
+        Returns:
+            bool: True if the request was admitted, and must be released.
+        """
+        with self._condition:
+            if not self._can_admit(cls):
+                if sum(self.waiting.values()) >= self.max_queue or self.queue_timeout <= 0:
+                    self.rejected += 1
+                    return False
+                self.waiting[cls] += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self._can_admit(cls), self.queue_timeout)
+                finally:
+                    self.waiting[cls] -= 1
+                    # Standard requests may have been waiting on this one
+                    self._condition.notify_all()
+                if not admitted:
+                    self.rejected += 1
+                    return False
+            self.in_flight[cls] += 1
+            return True
+
+    def release(self, cls):
+        """
+        Releases the capacity held by an admitted request.
+
+        Args:
+            cls (str): The class the request was admitted as.
+        """
+        with self._condition:
+            self.in_flight[cls] -= 1
+            self._condition.notify_all()
+
+    def on_checkout(self, *args):  # pylint: disable=unused-argument
+        """
+        Pool listener counting a connection checked out.
+        """
+        with self._condition:
+            self.checked_out += 1
+
+    def on_checkin(self, *args):  # pylint: disable=unused-argument
+        """
+        Pool listener counting a connection returned, or detached from the pool,
+        which may admit a waiting request.
+        """
+        with self._condition:
+            self.checked_out = max(self.checked_out - 1, 0)
+            self._condition.notify_all()
+
+    def saturation(self):
+        """
+        Returns how close the worker is to rejecting requests.
+
+        Returns:
+            float: The largest of the request and connection pool usage, from 0 to 1 or more.
+        """
+        with self._condition:
+            requests = (self.in_flight[PRIORITY] + self.in_flight[STANDARD]) / self.capacity
+            connections = self.checked_out / self.pool_size if self.pool_size else 0.0
+            return max(requests, connections)
+
+    def stats(self):
+        """
+        Returns the counters of the worker.
+
+        Returns:
+            dict: The requests in flight and waiting, the connections checked out, and the saturation.
+        """
+        saturation = self.saturation()
+        with self._condition:
+            return {
+                'in_flight': dict(self.in_flight),
+                'waiting': dict(self.waiting),
+                'capacity': self.capacity,
+                'pool_checked_out': self.checked_out,
+                'pool_size': self.pool_size,
+                'rejected': self.rejected,
+                'saturation': round(saturation, 3),
+            }
+
+def request_class():
+    """
+    Returns the admission class of the current request.
+
+    Returns:
+        str: PRIORITY for views marked with `priority`, STANDARD otherwise.
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    return PRIORITY if getattr(view, 'admission_priority', False) else STANDARD
+
+def service_unavailable(controller, body):
+    """
+    Builds a 503 response telling the client when to retry.
+
+    Args:
+        controller (AdmissionController): The admission controller.
+        body (dict): The body of the response.
+
+    Returns:
+        Response: The response.
+    """
+    response = jsonify(body)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(controller.retry_after)
+    return response
+
+def admit_request():
+    """
+    Admits the current request, or rejects it with a 503 response.
+
+    Returns:
+        Response: The rejection, or None if the request was admitted.
+    """
+    if ADMISSION_KEY in request.environ or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    controller = current_app.extensions['admission']
+    cls = request_class()
+    if not controller.acquire(cls):
+        return service_unavailable(
+            controller, {'error': 'The server is overloaded, please retry later.'})
+    request.environ[ADMISSION_KEY] = cls
+    return None
+
+def release_request(exc=None):  # pylint: disable=unused-argument
+    """
+    Releases the capacity held by the current request, if it was admitted.
+    """
+    cls = request.environ.get(ADMISSION_KEY)
+    if cls in (PRIORITY, STANDARD):
+        current_app.extensions['admission'].release(cls)
+        # Released once, even if the teardown runs again
+        request.environ[ADMISSION_KEY] = None
+
+def ready():
+    """
+    Endpoint for the load balancer to check whether the worker accepts requests.
+
+    Returns:
+        Response: 200 with the admission counters, or 503 when the worker is saturated.
+    """
+    controller = current_app.extensions['admission']
+    stats = controller.stats()
+    if stats['saturation'] >= controller.ready_threshold:
+        return service_unavailable(controller, {'status': 'saturated', **stats})
+    return jsonify({'status': 'ready', **stats})
+
+def init_admission(app):
+    """
+    Creates the admission controller of the application and registers its hooks.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    config = app.config
+    with app.app_context():
+        engine = db.engine
+    pool_size = pool_capacity(engine.pool)
+    capacity = config.get('ADMISSION_MAX_IN_FLIGHT', 0) or pool_size or 32
+    controller = AdmissionController(
+        capacity,
+        config.get('ADMISSION_RESERVED_FRACTION', 0.25),
+        config.get('ADMISSION_MAX_QUEUE', 64),
+        config.get('ADMISSION_QUEUE_TIMEOUT', 1.0),
+        config.get('ADMISSION_RETRY_AFTER', 1),
+        config.get('ADMISSION_READY_THRESHOLD', 0.9),
+        pool_size)
+    sa.event.listen(engine, 'checkout', controller.on_checkout)
+    sa.event.listen(engine, 'checkin', controller.on_checkin)
+    # Detached connections, such as the change feed listener's, are never checked in
+    sa.event.listen(engine, 'detach', controller.on_checkin)
+    app.extensions['admission'] = controller
+    app.add_url_rule('/ready', 'ready', ready)
+    if config.get('ADMISSION_ENABLED', True):
+        app.before_request(admit_request)
+        app.teardown_request(release_request)
@@ -0,0 +1,159 @@
+"""
+This module maintains the area summary tables.
+The write routes apply the change in brewery, beer and style counts of each
+area they touch in the same transaction as the write, as atomic increments, so
+concurrent writes never recompute an area from a stale read. `refresh_areas`
+rebuilds both tables from scratch, to repair them after out-of-band writes.
+"""
+
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.models import AreaStyle, AreaSummary, Beer, Brewery, Style
+from brewblog.queries import dialect_insert
+
+def area_key(city, state):
+    """
+    Returns the key of an area in the summary tables.
+
+    Args:
+        city (str): The city, or None.
+        state (str): The state, or None.
+
+    Returns:
+        tuple: The city and state, with None replaced by an empty string.
+    """
+    return city or '', state or ''
+
+def lock_brewery_area(brewery_id):
+    """
+    Reads the area of a brewery, locking its row until the end of the transaction.
+
+    Writes to a brewery's beers lock the brewery, so they are counted in the
+    area the brewery is in when they commit, even if it concurrently moves.
+
+    Args:
+        brewery_id (str): The ID of the brewery.
+
+    Returns:
+        tuple: The area key, or None if the brewery does not exist.
+    """
+    row = db.session.execute(
+        sa.select(Brewery.city, Brewery.state).where(Brewery.id == brewery_id).with_for_update()
+    ).first()
+    return None if row is None else area_key(row.city, row.state)
+
+def _increment(model, keys, rows):
+    """
+    Adds counts to rows of a summary table, creating the missing rows.
+    """
+    if not rows:
+        return
+    insert = dialect_insert(model).values(rows)
+    counts = [column for column in rows[0] if column not in keys]
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: getattr(model, column) + getattr(insert.excluded, column)
+              for column in counts}))
+
+def add_to_area(area, breweries=0, beers=0, styles=None):
+    """
+    Adds brewery and beer counts to an area. Negative counts are subtracted.
+
+    Args:
+        area (tuple): The area key.
+        breweries (int): The number of breweries to add.
+        beers (int): The number of beers to add.
+        styles (dict, optional): The number of beers to add by style ID.
+    """
+    city, state = area
+    _increment(AreaSummary, ['city', 'state'], [{
+        'city': city, 'state': state, 'brewery_count': breweries, 'beer_count': beers}])
+    _increment(AreaStyle, ['city', 'state', 'style_id'], [{
+        'city': city, 'state': state, 'style_id': style_id, 'beer_count': count}
+        for style_id, count in (styles or {}).items() if style_id is not None])
+
+def move_brewery(brewery_id, old_area, new_area, beer_count):
+    """
+    Moves the counts of a brewery and its beers from one area to another.
+
+    Args:
+        brewery_id (str): The ID of the brewery, whose row must be locked.
+        old_area (tuple): The key of the area the brewery moved from.
+        new_area (tuple): The key of the area the brewery moved to.
+        beer_count (int): The number of beers of the brewery.
+    """
+    if old_area == new_area:
+        return
+    styles = dict(db.session.execute(
+        sa.select(Beer.style_id, sa.func.count())
+        .where(Beer.brewery_id == brewery_id, Beer.style_id.is_not(None))
+        .group_by(Beer.style_id)
+    ).all())
+
+    _increment(AreaSummary, ['city', 'state'], [
+        {'city': city, 'state': state, 'brewery_count': sign, 'beer_count': sign * beer_count}
+        for (city, state), sign in ((old_area, -1), (new_area, 1))])
+    _increment(AreaStyle, ['city', 'state', 'style_id'], [
+        {'city': city, 'state': state, 'style_id': style_id, 'beer_count': sign * count}
+        for (city, state), sign in ((old_area, -1), (new_area, 1))
+        for style_id, count in styles.items()])
+
+def refresh_areas():
+    """
+    Rebuilds the area summary tables from the brewery and beer tables.
+
+    Concurrent writes wait for the rebuild to commit, and the writes it does
+    not see apply their counts after it.
+
+    Returns:
+        int: The number of areas.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(sa.text('LOCK TABLE "AreaSummary", "AreaStyle" IN EXCLUSIVE MODE'))
+    db.session.execute(sa.delete(AreaStyle))
+    db.session.execute(sa.delete(AreaSummary))
+
+    city = sa.func.coalesce(Brewery.city, '')
+    state = sa.func.coalesce(Brewery.state, '')
+    db.session.execute(sa.insert(AreaSummary).from_select(
+        ['city', 'state', 'brewery_count', 'beer_count'],
+        sa.select(city, state, sa.func.count(sa.distinct(Brewery.id)), sa.func.count(Beer.id))
+        .outerjoin(Beer, Beer.brewery_id == Brewery.id)
+        .group_by(city, state)))
+    db.session.execute(sa.insert(AreaStyle).from_select(
+        ['city', 'state', 'style_id', 'beer_count'],
+        sa.select(city, state, Beer.style_id, sa.func.count())
+        .join(Beer, Beer.brewery_id == Brewery.id)
+        .where(Beer.style_id.is_not(None))
+        .group_by(city, state, Beer.style_id)))
+    areas = db.session.scalar(sa.select(sa.func.count()).select_from(AreaSummary))
+    db.session.commit()
+    return areas
+
+def fetch_area_summaries():
+    """
+    Fetches the summary of every area with at least one brewery.
+
+    Returns:
+        list: The areas, with their brewery and beer counts and their beer count by style.
+    """
+    styles = {}
+    for row in db.session.execute(
+            sa.select(AreaStyle.city, AreaStyle.state, Style.name, AreaStyle.beer_count)
+            .join(Style, AreaStyle.style_id == Style.id)
+            .where(AreaStyle.beer_count > 0)
+            .order_by(AreaStyle.beer_count.desc(), Style.name)):
+        styles.setdefault((row.city, row.state), []).append(
+            {'style': row.name, 'beers_count': row.beer_count})
+
+    return [{
+        'city': row.city or None,
+        'state': row.state or None,
+        'breweries_count': row.brewery_count,
+        'beers_count': row.beer_count,
+        'styles': styles.get((row.city, row.state), [])
+    } for row in db.session.execute(
+        sa.select(AreaSummary)
+        .where(AreaSummary.brewery_count > 0)
+        .order_by(AreaSummary.state, AreaSummary.city)
+    ).scalars()]
@@ -2,20 +2,33 @@
 This module handles authentication and authorization using Auth0.
 It includes functions to get the token from the authorization header,
 verify and decode JWT tokens, and check permissions.
+The JWT and TLS libraries are imported on first use rather than at startup, and
+the JWKS of the tenant is cached by each worker.
 """
 
 import json
 import os
-import ssl
+import threading
+import time
 from functools import wraps
-from urllib.request import urlopen
 from flask import request
-from jose import jwt
-import certifi
+from brewblog.tracing import span
 
 AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
 ALGORITHMS = os.getenv('AUTH0_ALGORITHMS', 'RS256').split(',')
 AUTH0_AUDIENCE = os.getenv('AUTH0_AUDIENCE')
+JWKS_TTL = float(os.getenv('AUTH0_JWKS_TTL', 3600))
+
+# Minimum number of seconds between two fetches of the JWKS caused by tokens
+# signed with an unknown key, so such tokens cannot flood the tenant
+JWKS_MIN_REFRESH_INTERVAL = 60
+
+_jwks = {'keys': None, 'fetched_at': 0.0}
+_jwks_lock = threading.Lock()
+
+# WSGI environ key holding a payload already verified for the request's token,
+# set on the sub-requests of a batch so the token is verified once
+VERIFIED_PAYLOAD_KEY = 'brewblog.jwt_payload'
 
 class AuthError(Exception):
     """
@@ -67,6 +80,64 @@ def get_token_auth_header():
     token = parts[1]
     return token
 
+def fetch_jwks():
+    """
+    Downloads the JSON Web Key Set of the Auth0 tenant.
+
+    Returns:
+        dict: The key set.
+    """
+    import ssl
+    from urllib.request import urlopen
+    import certifi
+
+    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    with urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json', context=ssl_context) as jsonurl:
+        return json.loads(jsonurl.read())
+
+def get_jwks(refresh=False):
+    """
+    Returns the JSON Web Key Set of the Auth0 tenant, from the cache of the worker.
+
+    Args:
+        refresh (bool): Whether to fetch the key set again, for a token signed with
+            a key it does not contain. Ignored if it was fetched less than
+            JWKS_MIN_REFRESH_INTERVAL seconds ago.
+
+    Returns:
+        dict: The key set.
+    """
+    with _jwks_lock:
+        age = time.monotonic() - _jwks['fetched_at']
+        if (_jwks['keys'] is None or age > JWKS_TTL
+                or (refresh and age > JWKS_MIN_REFRESH_INTERVAL)):
+            with span('auth.jwks'):
+                _jwks['keys'] = fetch_jwks()
+            _jwks['fetched_at'] = time.monotonic()
+        return _jwks['keys']
+
+def find_signing_key(jwks, kid):
+    """
+    Finds the key a token was signed with in a key set.
+
+    Args:
+        jwks (dict): The key set.
+        kid (str): The key ID from the token header.
+
+    Returns:
+        dict: The RSA key, or an empty dict if the key set does not contain it.
+    """
+    for key in jwks['keys']:
+        if key['kid'] == kid:
+            return {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+    return {}
+
 def verify_decode_jwt(token):
     """
     Verifies and decodes a JWT token.
@@ -80,12 +151,15 @@ def verify_decode_jwt(token):
     Returns:
         dict: The decoded token payload.
     """
+    from jose import jwt
+
     if os.getenv('FLASK_ENV') == 'testing':
         # Load the public key for testing
         with open('tests/public_key.pem', 'r', encoding='utf-8') as f:
             public_key = f.read()
         try:
-            payload = jwt.decode(token, public_key, algorithms=['RS256'])
+            with span('auth.decode'):
+                payload = jwt.decode(token, public_key, algorithms=['RS256'])
             return payload
         except jwt.ExpiredSignatureError as exc:
             raise AuthError({
@@ -103,35 +177,27 @@ def verify_decode_jwt(token):
                 'description': 'Unable to parse authentication token.'
             }, 401) from exc
     else:
-      ssl_context = ssl.create_default_context(cafile=certifi.where())
-      with urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json', context=ssl_context) as jsonurl:
-        jwks = json.loads(jsonurl.read())
       unverified_header = jwt.get_unverified_header(token)
-      rsa_key = {}
       if 'kid' not in unverified_header:
           raise AuthError({
               'code': 'invalid_header',
               'description': 'Authorization malformed.'
           }, 401)
 
-      for key in jwks['keys']:
-          if key['kid'] == unverified_header['kid']:
-              rsa_key = {
-                  'kty': key['kty'],
-                  'kid': key['kid'],
-                  'use': key['use'],
-                  'n': key['n'],
-                  'e': key['e']
-              }
+      rsa_key = find_signing_key(get_jwks(), unverified_header['kid'])
+      if not rsa_key:
+          # The tenant may have rotated its signing keys
+          rsa_key = find_signing_key(get_jwks(refresh=True), unverified_header['kid'])
       if rsa_key:
           try:
-              payload = jwt.decode(
-                  token,
-                  rsa_key,
-                  algorithms=ALGORITHMS,
-                  audience=AUTH0_AUDIENCE,
-                  issuer='https://' + AUTH0_DOMAIN + '/'
-              )
+              with span('auth.decode'):
+                  payload = jwt.decode(
+                      token,
+                      rsa_key,
+                      algorithms=ALGORITHMS,
+                      audience=AUTH0_AUDIENCE,
+                      issuer='https://' + AUTH0_DOMAIN + '/'
+                  )
               return payload
 
           except jwt.ExpiredSignatureError as exc:
@@ -184,6 +250,9 @@ def requires_auth(permission=''):
     """
     Decorator function to enforce authentication on endpoints.
 
+    The token is not verified again when the request carries the payload the
+    batch endpoint already verified for it.
+
     Args:
         f (function): The function to be decorated.
 
@@ -193,8 +262,11 @@ def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
+            payload = request.environ.get(VERIFIED_PAYLOAD_KEY)
+            if payload is None:
+                with span('auth.header'):
+                    token = get_token_auth_header()
+                payload = verify_decode_jwt(token)
             check_permissions(permission, payload)
             return f(*args, payload=payload, **kwargs)
 
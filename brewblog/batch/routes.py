@@ -0,0 +1,174 @@
+"""
+This module defines the routes for the Batch API.
+It includes an endpoint executing several API requests in a single HTTP
+request, so clients rendering a screen from several resources pay for one
+round trip and one token verification.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from brewblog import db
+from brewblog.batch import bp
+from brewblog.admission import ADMISSION_KEY, ADMITTED_BY_PARENT
+from brewblog.auth import VERIFIED_PAYLOAD_KEY, get_token_auth_header, verify_decode_jwt
+from brewblog.error_handlers import register_error_handlers
+from brewblog.tracing import trace_headers
+
+register_error_handlers(bp)
+
+BATCH_METHODS = ('GET', 'POST', 'PATCH', 'DELETE')
+
+# Endpoints that cannot run as a sub-request
+UNBATCHABLE_ENDPOINTS = ('batch.batch', 'stream.stream')
+
+# Sub-request headers that would make the response unreadable as JSON: a
+# compressed body, or an empty 304. The batch response itself is compressed.
+DROPPED_HEADERS = ('accept-encoding', 'if-none-match', 'if-modified-since')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor(max_workers):
+    """
+    Returns the thread pool running the read sub-requests of batches in parallel.
+
+    Args:
+        max_workers (int): The number of threads, used when the pool is created.
+
+    Returns:
+        ThreadPoolExecutor: The thread pool.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+        return _executor
+
+def build_environ(sub_request, token, payload):
+    """
+    Builds the WSGI environ of a sub-request.
+
+    Args:
+        sub_request (dict): The sub-request, with its method, path, and optional body and headers.
+        token (str): The bearer token of the batch.
+        payload (dict): The verified payload of the token.
+
+    Returns:
+        dict: The environ.
+    """
+    headers = {name: value for name, value in (sub_request.get('headers') or {}).items()
+               if name.lower() not in DROPPED_HEADERS}
+    headers['Authorization'] = f'Bearer {token}'
+    headers.update(trace_headers())
+    headers['Accept'] = 'application/json'
+    builder = EnvironBuilder(
+        path=sub_request['path'],
+        method=sub_request.get('method', 'GET').upper(),
+        headers=headers,
+        json=sub_request.get('body'),
+        base_url=request.host_url)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    environ[VERIFIED_PAYLOAD_KEY] = payload
+    environ[ADMISSION_KEY] = ADMITTED_BY_PARENT
+    return environ
+
+def dispatch(app, environ):
+    """
+    Runs a sub-request through the application's request handling.
+
+    Args:
+        app (Flask): The Flask application instance.
+        environ (dict): The environ of the sub-request.
+
+    Returns:
+        dict: The status code and decoded body of the response.
+    """
+    with app.request_context(environ) as ctx:
+        try:
+            endpoint = app.url_map.bind_to_environ(environ).match()[0]
+        except HTTPException as e:
+            return {'status': e.code, 'body': {'error': e.description}}
+        if endpoint in UNBATCHABLE_ENDPOINTS:
+            return {'status': 400, 'body': {'error': f'{ctx.request.path} cannot be batched.'}}
+
+        try:
+            response = app.full_dispatch_request()
+        except Exception:  # pylint: disable=broad-except
+            app.logger.exception('Batched request to %s failed', ctx.request.path)
+            db.session.rollback()
+            return {'status': 500, 'body': {'error': 'Internal Server Error'}}
+
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        return {'status': response.status_code, 'body': body}
+
+def dispatch_in_thread(app, environ):
+    """
+    Runs a sub-request in its own application context, and database session.
+    """
+    with app.app_context():
+        return dispatch(app, environ)
+
+@bp.route('/api/batch', methods=['POST'])
+def batch():
+    """
+    Endpoint to execute several API requests at once.
+
+    The bearer token is verified once, and each sub-request is then authorized
+    against the permissions of the route it calls. Sub-requests run in order;
+    with `BATCH_PARALLEL_READS`, consecutive GET sub-requests run concurrently.
+
+    Returns:
+        Response: The JSON response with the status code and body of each sub-request, in order.
+    """
+    token = get_token_auth_header()
+    payload = verify_decode_jwt(token)
+
+    data = request.get_json(silent=True)
+    sub_requests = data.get('requests') if isinstance(data, dict) else None
+    max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({'error': 'Request must contain a non-empty requests array.'}), 400
+    if len(sub_requests) > max_requests:
+        return jsonify({'error': f'A batch can contain at most {max_requests} requests.'}), 400
+    for sub_request in sub_requests:
+        if (not isinstance(sub_request, dict)
+                or not isinstance(sub_request.get('path'), str)
+                or not sub_request['path'].startswith('/')
+                or str(sub_request.get('method', 'GET')).upper() not in BATCH_METHODS):
+            return jsonify({
+                'error': 'Each request must have a path and a method among ' + ', '.join(BATCH_METHODS)
+            }), 400
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    environs = [build_environ(sub_request, token, payload) for sub_request in sub_requests]
+    parallel = current_app.config.get('BATCH_PARALLEL_READS', False)
+
+    results = []
+    reads = []
+    def flush_reads():
+        if len(reads) == 1:
+            results.append(dispatch(app, reads.pop()))
+            return
+        executor = get_executor(current_app.config.get('BATCH_WORKERS', 4))
+        futures = [executor.submit(dispatch_in_thread, app, environ) for environ in reads]
+        results.extend(future.result() for future in futures)
+        reads.clear()
+
+    for environ in environs:
+        if parallel and environ['REQUEST_METHOD'] == 'GET':
+            reads.append(environ)
+            continue
+        # Writes run on their own, after the reads sent before them
+        if reads:
+            flush_reads()
+        results.append(dispatch(app, environ))
+    if reads:
+        flush_reads()
+
+    return jsonify(results)
@@ -4,18 +4,27 @@ It includes endpoints to get beers for a specific brewery, create a new beer,
 delete a beer, and get a list of beer styles.
 """
 
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 import sqlalchemy as sa
 from brewblog import db
 from brewblog.beer import bp
 from brewblog.models import Beer, Brewery, Style
+from brewblog.queries import fetch_beers_for_brewery
 from brewblog.auth import requires_auth
+from brewblog.admission import priority
+from brewblog.areas import add_to_area, area_key, lock_brewery_area
+from brewblog.changes import record_change
+from brewblog.documents import documents_enabled, rebuild_documents
+from brewblog.idempotency import idempotent
+from brewblog.ids import parse_brewery_id
+from brewblog.resilience import stale_if_error
 from brewblog.error_handlers import register_error_handlers
 
 register_error_handlers(bp)
 
-@bp.route('/api/breweries/<string:brewery_id>/beers', methods=['GET'])
+@bp.route('/api/breweries/<uuidstr:brewery_id>/beers', methods=['GET'])
 @requires_auth('get:breweries')
+@stale_if_error
 def get_beers_for_brewery(brewery_id, payload):
     """
     Endpoint to get a list of beers for a specific brewery.
@@ -27,15 +36,17 @@ def get_beers_for_brewery(brewery_id, payload):
     Returns:
         Response: The JSON response with a list of beers for the specified brewery.
     """
-    beers = db.session.scalars(sa.select(Beer).where(Beer.brewery_id == brewery_id)).all()
-    return jsonify([beer.serialize() for beer in beers]), 200
+    return jsonify(fetch_beers_for_brewery(brewery_id)), 200
 
 @bp.route('/api/beers/create', methods=['POST'])
 @requires_auth('create:beers')
+@idempotent
 def create_beer(payload):
     """
     Endpoint to create a new beer.
 
+    Retries sent with the same Idempotency-Key header replay the first response.
+
     Args:
         payload (dict): The JWT payload containing user information.
 
@@ -43,8 +54,12 @@ def create_beer(payload):
         Response: The JSON response with the created beer details or an error message.
     """
     data = request.json
-    brewery_id = data.get('brewery_id')
-    brewery = db.session.scalar(sa.select(Brewery).where(Brewery.id == brewery_id))
+    brewery_id = parse_brewery_id(data.get('brewery_id'))
+    if brewery_id is None:
+        return jsonify({'error': 'brewery_id must be a UUID.'}), 400
+    # Locks the brewery, so the beer is counted in its current area
+    brewery = db.session.scalar(
+        sa.select(Brewery).where(Brewery.id == brewery_id).with_for_update())
     if not brewery:
         return jsonify({'error': f'Brewery with ID {brewery_id} not found.'}), 404
 
@@ -56,6 +71,12 @@ def create_beer(payload):
         brewery_id=brewery.id
     )
     db.session.add(new_beer)
+    db.session.flush()
+    record_change('beer', new_beer.id)
+    add_to_area(
+        area_key(brewery.city, brewery.state), beers=1, styles={new_beer.style_id: 1})
+    if documents_enabled():
+        rebuild_documents([brewery.id])
     db.session.commit()
     return jsonify(new_beer.serialize()), 201
 
@@ -72,19 +93,39 @@ def delete_beer(beer_id, payload):
     Returns:
         Response: The JSON response with a success message or an error message.
     """
-    beer = db.session.scalar(sa.select(Beer).where(Beer.id == beer_id))
-    if beer is None:
+    row = db.session.execute(
+        sa.delete(Beer).where(Beer.id == beer_id)
+        .returning(Beer.name, Beer.brewery_id, Beer.style_id)
+    ).first()
+    if row is None:
+        db.session.rollback()
         return jsonify({'error': f'Beer with id {beer_id} not found.'}), 404
 
-    brewery_id = beer.brewery_id
-    db.session.delete(beer)
+    record_change('beer', beer_id, 'delete')
+    area = lock_brewery_area(row.brewery_id) if row.brewery_id is not None else None
+    if area is not None:
+        add_to_area(area, beers=-1, styles={row.style_id: -1})
+    if documents_enabled() and row.brewery_id is not None:
+        rebuild_documents([row.brewery_id])
     db.session.commit()
     return jsonify({
-      'message': f'Beer {beer.name} deleted successfully.', 
-      'brewery_id': brewery_id
+      'message': f'Beer {row.name} deleted successfully.',
+      'brewery_id': row.brewery_id
     }), 200
 
+def cached_styles():
+    """
+    Returns the serialized beer styles, from the cache of the worker.
+
+    Returns:
+        list: The serialized styles.
+    """
+    return current_app.extensions['cache'].get_or_load('style', '*', None, lambda: [
+        style.serialize() for style in db.session.scalars(sa.select(Style).distinct())])
+
 @bp.route('/api/styles', methods=['GET'])
+@priority
+@stale_if_error
 def get_styles():
     """
     Endpoint to get a list of beer styles.
@@ -92,5 +133,4 @@ def get_styles():
     Returns:
         Response: The JSON response with a list of beer styles.
     """
-    styles = db.session.scalars(sa.select(Style).distinct()).all()
-    return jsonify([style.serialize() for style in styles]), 200
+    return jsonify(cached_styles()), 200
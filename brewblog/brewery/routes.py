@@ -1,54 +1,146 @@
 """
 This module defines the routes for the Brewery API.
 It includes endpoints to get a list of breweries, create a new brewery,
-show a specific brewery, and edit an existing brewery.
+show a specific brewery, edit an existing brewery, and summarize breweries by area.
 """
 
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 import sqlalchemy as sa
 from brewblog import db
 from brewblog.brewery import bp
 from brewblog.models import Brewery
+from brewblog.queries import (
+    BREWERY_FIELDS, dialect_insert, fetch_breweries, fetch_brewery_beers, lookup_breweries,
+    parse_fieldset, select_breweries)
 from brewblog.auth import requires_auth
+from brewblog.admission import priority
+from brewblog.areas import (
+    add_to_area, area_key, fetch_area_summaries, lock_brewery_area, move_brewery)
+from brewblog.changes import record_change
+from brewblog.documents import documents_enabled, fetch_document, store_documents
+from brewblog.idempotency import idempotent
+from brewblog.ids import parse_brewery_id
+from brewblog.resilience import stale_if_error
 from brewblog.error_handlers import register_error_handlers
 
 register_error_handlers(bp)
 
+def lookup_response(ids, fields, include_beers):
+    """
+    Builds the response of a lookup of breweries by id.
+
+    Args:
+        ids (list): The requested brewery ids.
+        fields (tuple): The brewery fields to serialize.
+        include_beers (bool): Whether to embed the beers and their count.
+
+    Returns:
+        Response: The JSON response with the breweries found, in request order, and the missing ids.
+    """
+    max_ids = current_app.config.get('BREWERY_LOOKUP_MAX_IDS', 500)
+    if len(ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} ids can be requested at once.'}), 400
+
+    breweries, missing = lookup_breweries(ids, fields, include_beers)
+    return jsonify({'breweries': breweries, 'missing': missing})
+
 @bp.route('/api/breweries')
 @requires_auth('get:breweries')
+@stale_if_error
 def get_breweries(payload):
     """
     Endpoint to get a list of breweries.
 
+    The `fields` and `include=beers` query parameters restrict the response to
+    the listed brewery fields and embeds. With the `ids` query parameter, only
+    the listed breweries are returned, in the same order, along with the ids
+    that were not found.
+
     Args:
         payload (dict): The JWT payload containing user information.
 
     Returns:
         Response: The JSON response with a list of breweries grouped by city and state.
     """
-    breweries = db.session.scalars(sa.select(Brewery)).all()
+    try:
+        fields, include_beers = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if 'ids' in request.args:
+        ids = [brewery_id for brewery_id in request.args['ids'].split(',') if brewery_id]
+        return lookup_response(ids, fields, include_beers)
 
     areas = {}
-    for brewery in breweries:
-        area = (brewery.city, brewery.state)
+    for _, city, state, brewery in select_breweries(fields=fields, include_beers=include_beers):
+        area = (city, state)
         if area not in areas:
             areas[area] = []
         areas[area].append(brewery)
 
     areas_list = [
       {'city': city,
-       'state': state, 
-       'breweries': [brewery.serialize() for brewery in breweries]
+       'state': state,
+       'breweries': breweries
       } for (city, state), breweries in areas.items()]
 
     return jsonify(areas_list)
 
+@bp.route('/api/breweries/lookup', methods=['POST'])
+@requires_auth('get:breweries')
+def lookup_breweries_by_id(payload):
+    """
+    Endpoint to get many breweries by id, for lists too long for a query string.
+
+    The request body is a JSON object with an `ids` array. The `fields` and
+    `include=beers` query parameters apply as for listing breweries.
+
+    Args:
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The JSON response with the breweries found, in request order, and the missing ids.
+    """
+    try:
+        fields, include_beers = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = request.get_json(silent=True)
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(brewery_id, str) for brewery_id in ids):
+        return jsonify({'error': 'Request must contain an ids array of strings.'}), 400
+
+    return lookup_response(ids, fields, include_beers)
+
+@bp.route('/api/areas/summary')
+@priority
+@requires_auth('get:breweries')
+def get_area_summary(payload):
+    """
+    Endpoint to get the number of breweries, beers and beers by style of each area.
+
+    The counts are read from the area summary tables, which the write routes
+    keep up to date, so the response does not aggregate the brewery and beer tables.
+
+    Args:
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The JSON response with a list of areas and their counts.
+    """
+    areas = current_app.extensions['cache'].get_or_load('area', '*', None, fetch_area_summaries)
+    return jsonify(areas)
+
 @bp.route('/api/breweries/create', methods=['POST'])
 @requires_auth('create:breweries')
+@idempotent
 def create_brewery(payload):
     """
     Endpoint to create a new brewery.
 
+    Retries sent with the same Idempotency-Key header replay the first response.
+
     Args:
         payload (dict): The JWT payload containing user information.
 
@@ -65,38 +157,51 @@ def create_brewery(payload):
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
 
-    brewery_id = data.get('id')
-
-    # Check if the brewery already exists
-    existing_brewery = db.session.scalar(sa.select(Brewery).where(Brewery.id == brewery_id))
-    if existing_brewery:
-        return jsonify({'error': f'Brewery with ID {brewery_id} already exists.'}), 400
+    brewery_id = parse_brewery_id(data['id'])
+    if brewery_id is None:
+        return jsonify({'error': 'id must be a UUID.'}), 400
+    values = {field: data.get(field) for field in BREWERY_FIELDS}
+    values['id'] = brewery_id
 
     try:
-        new_brewery = Brewery(
-            id=brewery_id,
-            name=data.get('name'),
-            address=data.get('address'),
-            city=data.get('city'),
-            state=data.get('state'),
-            phone=data.get('phone'),
-            website_link=data.get('website_link')
-        )
-        db.session.add(new_brewery)
+        # Insert and detect an existing brewery in a single statement
+        row = db.session.execute(
+            dialect_insert(Brewery)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=[Brewery.id])
+            .returning(*BREWERY_FIELDS.values())
+        ).first()
+        if row is None:
+            db.session.rollback()
+            return jsonify({'error': f'Brewery with ID {brewery_id} already exists.'}), 400
+
+        record_change('brewery', row.id)
+        add_to_area(area_key(row.city, row.state), breweries=1)
+        # A new brewery has no beers yet
+        brewery = dict(row._mapping, beers=[], beers_count=0)
+        if documents_enabled():
+            store_documents([brewery])
         db.session.commit()
-        return jsonify(new_brewery.serialize()), 201
+        return jsonify(brewery), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 422
     finally:
         db.session.close()
 
-@bp.route('/api/breweries/<string:brewery_id>')
+@bp.route('/api/breweries/<uuidstr:brewery_id>')
+@priority
 @requires_auth('get:breweries')
+@stale_if_error
 def show_brewery(brewery_id, payload):
     """
     Endpoint to show details of a specific brewery.
 
+    The `fields` and `include=beers` query parameters restrict the response to
+    the listed brewery fields and embeds. Responses are cached by each worker
+    until the brewery or one of its beers changes. When brewery documents are
+    enabled, the full representation is served from the stored document.
+
     Args:
         brewery_id (str): The ID of the brewery to be shown.
         payload (dict): The JWT payload containing user information.
@@ -104,20 +209,36 @@ def show_brewery(brewery_id, payload):
     Returns:
         Response: The JSON response with the brewery details or an error message.
     """
-    brewery = db.session.scalar(sa.select(Brewery).where(Brewery.id == brewery_id))
-    if brewery is None:
+    try:
+        fields, include_beers = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cache = current_app.extensions['cache']
+    if documents_enabled() and (fields, include_beers) == (tuple(BREWERY_FIELDS), True):
+        document = cache.get_or_load(
+            'brewery', brewery_id, 'document', lambda: fetch_document(brewery_id))
+        if document is not None:
+            return current_app.json.raw_response(document)
+
+    breweries = cache.get_or_load(
+        'brewery', brewery_id, (fields, include_beers),
+        lambda: fetch_breweries([brewery_id], fields, include_beers))
+    if not breweries:
         return jsonify({'error': f'Brewery with id {brewery_id} not found.'}), 404
 
-    brewery_data = brewery.serialize()
+    brewery_data = breweries[0]
 
     return jsonify(brewery_data)
 
-@bp.route('/api/breweries/<string:brewery_id>/edit', methods=['POST', 'PATCH'])
+@bp.route('/api/breweries/<uuidstr:brewery_id>/edit', methods=['POST', 'PATCH'])
 @requires_auth('edit:breweries')
 def edit_brewery(brewery_id, payload):
     """
     Endpoint to edit an existing brewery.
 
+    Only the supplied fields are updated.
+
     Args:
         brewery_id (str): The ID of the brewery to be edited.
         payload (dict): The JWT payload containing user information.
@@ -125,23 +246,48 @@ def edit_brewery(brewery_id, payload):
     Returns:
         Response: The JSON response with the updated brewery details or an error message.
     """
-    brewery = db.session.scalar(sa.select(Brewery).where(Brewery.id == brewery_id))
-    if brewery is None:
-        return jsonify({'error': f'Brewery with id {brewery_id} not found.'}), 404
-
     data = request.json
-    required_fields = ['name', 'address', 'city', 'state', 'phone', 'website_link']
 
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    if not data:
+        return jsonify({'error': 'Request does not contain a valid JSON body'}), 400
+
+    editable_fields = ['name', 'address', 'city', 'state', 'phone', 'website_link']
+    values = {field: data[field] for field in editable_fields if field in data}
+    if not values:
+        return jsonify({
+            'error': f'Request must contain at least one of: {", ".join(editable_fields)}'
+        }), 400
+
+    old_area = None
+    if 'city' in values or 'state' in values:
+        # Locks the brewery, so its beers are moved along with it
+        old_area = lock_brewery_area(brewery_id)
+        if old_area is None:
+            db.session.rollback()
+            return jsonify({'error': f'Brewery with id {brewery_id} not found.'}), 404
+
+    row = db.session.execute(
+        sa.update(Brewery)
+        .where(Brewery.id == brewery_id)
+        .values(values)
+        .returning(*BREWERY_FIELDS.values())
+    ).first()
+    if row is None:
+        db.session.rollback()
+        return jsonify({'error': f'Brewery with id {brewery_id} not found.'}), 404
 
-    brewery.name = data['name']
-    brewery.address = data['address']
-    brewery.city = data['city']
-    brewery.state = data['state']
-    brewery.phone = data['phone']
-    brewery.website_link = data['website_link']
+    record_change('brewery', brewery_id)
+    beers_by_brewery, counts = fetch_brewery_beers([brewery_id])
+    if old_area is not None:
+        move_brewery(
+            brewery_id, old_area, area_key(row.city, row.state), counts.get(brewery_id, 0))
+    brewery = dict(
+        row._mapping,
+        beers=beers_by_brewery.get(brewery_id, []),
+        beers_count=counts.get(brewery_id, 0))
+    if documents_enabled():
+        # The update keeps the brewery row locked, so the beers read above are current
+        store_documents([brewery])
     db.session.commit()
 
-    return jsonify(brewery.serialize())
\ No newline at end of file
+    return jsonify(brewery)
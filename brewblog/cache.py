@@ -0,0 +1,232 @@
+"""
+This module implements the per-worker cache and its invalidation bus.
+Entries are keyed by entity and entity ID, and evicted when a change to that
+entity is committed by any worker. Changes are received from the change feed,
+which LISTENs for notifications on PostgreSQL, or by polling the change log
+when notifications are not available. Entries also expire after a TTL, which
+bounds how stale they get when the database is written to out of band.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import timezone
+from brewblog import db
+from brewblog.changes import read_changes, settled_sequence
+
+logger = logging.getLogger(__name__)
+
+# Changes to these entities also invalidate the cached entries of others
+DEPENDENT_ENTITIES = {
+    'brewery': ('area',),
+    'beer': ('brewery', 'area'),
+    'style': ('brewery', 'beer', 'area'),
+}
+
+class LocalCache:
+    """
+    A thread-safe, size-bounded cache with per-entry expiry.
+
+    Attributes:
+        ttl (float): Seconds after which an entry expires. 0 disables the cache.
+        max_entries (int): The maximum number of entries kept.
+    """
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, entity, entity_id, variant, loader):
+        """
+        Returns a cached value, loading and caching it on a miss.
+
+        Args:
+            entity (str): The kind of entity the value is derived from.
+            entity_id (str): The ID of the entity, or '*' for values derived from every entity.
+            variant (Hashable): Distinguishes the values derived from the same entity.
+            loader (callable): Loads the value on a miss.
+
+        Returns:
+            object: The value.
+        """
+        if self.ttl <= 0:
+            return loader()
+        key = (entity, str(entity_id), variant)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            # Drop the value if an invalidation arrived while it was loading
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, entity, entity_id):
+        """
+        Evicts the entries derived from an entity, and from every entity depending on its kind.
+
+        Args:
+            entity (str): The kind of entity that changed.
+            entity_id (str): The ID of the entity that changed.
+        """
+        entity_id = str(entity_id)
+        dependents = DEPENDENT_ENTITIES.get(entity, ())
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                if key[0] in dependents or (key[0] == entity and key[1] in (entity_id, '*')):
+                    del self._entries[key]
+
+    def clear(self):
+        """
+        Evicts every entry.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+class InvalidationBus:
+    """
+    Evicts the entries of a local cache when changes are committed by any worker,
+    and measures how long changes take to propagate.
+
+    Attributes:
+        app (Flask): The application whose change log is polled.
+        cache (LocalCache): The cache to evict entries from.
+        mode (str): 'notify' to receive changes from the change feed, 'poll' to poll the change log.
+        poll_interval (float): Seconds between two polls of the change log.
+    """
+    def __init__(self, app, cache, feed, mode, poll_interval, sample_size=1000):
+        self.app = app
+        self.cache = cache
+        self.feed = feed
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self._latencies = deque(maxlen=sample_size)
+        self._lock = threading.Lock()
+        self._poller_started = False
+        feed.add_callback(self.receive, on_commit=self.evict_committed, on_reset=cache.clear)
+
+    def start(self):
+        """
+        Starts receiving changes from other workers.
+        """
+        if self.mode != 'poll':
+            self.feed.start()
+            return
+        with self._lock:
+            if self._poller_started:
+                return
+            self._poller_started = True
+        threading.Thread(target=self._poll, name='cache-invalidation-poller', daemon=True).start()
+
+    def receive(self, event):
+        """
+        Evicts the entries derived from a changed entity, recording the propagation latency.
+
+        Args:
+            event (dict): The change event.
+        """
+        self.cache.invalidate(event['entity'], event['entity_id'])
+        latency = time.time() - event['ts']
+        with self._lock:
+            self._latencies.append(latency)
+        logger.debug('Invalidated %s %s after %.1fms', event['entity'], event['entity_id'], latency * 1000)
+
+    def evict_committed(self, events):
+        """
+        Evicts the entries derived from the entities changed by this worker.
+
+        Args:
+            events (list): The change events of the committed transaction.
+        """
+        for event in events:
+            self.cache.invalidate(event['entity'], event['entity_id'])
+
+    def latency_stats(self):
+        """
+        Summarizes the propagation latency of the recently received changes.
+
+        Returns:
+            dict: The number of samples and the p50, p99 and max latencies in milliseconds.
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return {'samples': 0, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+        return {
+            'samples': len(samples),
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(samples[-1] * 1000, 2)
+        }
+
+    def _poll(self):
+        """
+        Reads the changes appended to the change log since the last poll.
+        """
+        since = None
+        while True:
+            try:
+                with self.app.app_context():
+                    settle_seconds = self.app.config.get('SYNC_SETTLE_SECONDS', 5)
+                    if since is None:
+                        since = settled_sequence(settle_seconds)
+                    changes, since, _ = read_changes(since, 1000, settle_seconds)
+                    db.session.remove()
+                for change in changes:
+                    created_at = change.created_at
+                    if created_at.tzinfo is None:
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    self.receive({
+                        'entity': change.entity,
+                        'entity_id': change.entity_id,
+                        'ts': created_at.timestamp()
+                    })
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Polling the change log failed')
+                # Changes may be missed until the next successful poll
+                self.cache.clear()
+            time.sleep(self.poll_interval)
+
+def init_cache(app):
+    """
+    Creates the local cache of the application and subscribes it to invalidations.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    cache = LocalCache(app.config.get('CACHE_TTL', 300), app.config.get('CACHE_MAX_ENTRIES', 1024))
+    feed = app.extensions['change_feed']
+    mode = app.config.get('CACHE_INVALIDATION', 'auto')
+    dialect = feed.engine.dialect.name
+    if mode == 'auto':
+        mode = 'notify' if feed.uses_notify else 'poll'
+        logger.info('Cache invalidation mode: %s, on %s', mode, dialect)
+    elif mode == 'notify' and not feed.uses_notify:
+        # Without notifications, the feed only sees the changes of this process
+        logger.warning('%s has no LISTEN/NOTIFY: cached entries are not evicted by the '
+                       'changes of other processes until CACHE_TTL expires', dialect)
+    bus = InvalidationBus(app, cache, feed, mode, app.config.get('CACHE_POLL_INTERVAL', 1.0))
+    app.extensions['cache'] = cache
+    app.extensions['invalidation_bus'] = bus
+    if cache.ttl > 0:
+        # Started on the first request, so each forked worker runs its own
+        app.before_request(bus.start)
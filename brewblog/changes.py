@@ -0,0 +1,147 @@
+"""
+This module maintains the change log of breweries and beers.
+The write routes record a change in the same transaction as the write, and
+the sync endpoint reads the log back by sequence number, so a sync with few
+changes is a primary key range scan.
+
+Every change is also published as an event once its transaction commits: on
+PostgreSQL with NOTIFY, issued in the same statement as the insert, and on
+other databases through the in-process change feed. In both cases the worker
+that made the change is told about it synchronously on commit.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.models import Change
+
+NOTIFY_CHANNEL = 'brewblog_changes'
+
+# The number of changes read at once while scanning back from the end of the log
+SETTLE_SCAN_PAGE = 100
+
+def record_change(entity, entity_id, operation='upsert'):
+    """
+    Records a change to an entity in the current transaction.
+
+    Args:
+        entity (str): The kind of entity, 'brewery' or 'beer'.
+        entity_id (str | int): The ID of the entity.
+        operation (str): 'upsert' if the entity was created or updated, 'delete' if it was deleted.
+    """
+    insert = sa.insert(Change).values(
+        entity=entity,
+        entity_id=str(entity_id),
+        operation=operation,
+        created_at=datetime.now(timezone.utc)
+    ).returning(Change.id, Change.entity, Change.entity_id, Change.operation)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # NOTIFY is delivered when the transaction commits, and dropped on rollback
+        inserted = insert.cte('inserted')
+        change_id = db.session.execute(
+            sa.select(inserted.c.id, sa.func.pg_notify(
+                NOTIFY_CHANNEL,
+                sa.cast(sa.func.json_build_object(
+                    'id', inserted.c.id,
+                    'entity', inserted.c.entity,
+                    'entity_id', inserted.c.entity_id,
+                    'operation', inserted.c.operation,
+                    'ts', sa.func.extract('epoch', sa.func.clock_timestamp())
+                ), sa.Text)))).scalar_one()
+    else:
+        change_id = db.session.execute(insert).scalar_one()
+
+    # Handed to the change feed once the transaction commits
+    db.session.info.setdefault('pending_changes', []).append({
+        'id': change_id,
+        'entity': entity,
+        'entity_id': str(entity_id),
+        'operation': operation,
+        'ts': time.time()
+    })
+
+def settled_sequence(settle_seconds):
+    """
+    Returns the sequence number a client can resume from without missing a change.
+
+    The latest sequence number is not safe: a transaction still in flight may
+    hold a lower one, and its change would be skipped once it commits. Following
+    the rule of `read_changes`, this is the last sequence number before the
+    oldest gap younger than `settle_seconds`.
+
+    Args:
+        settle_seconds (float): The age after which a gap is considered permanent.
+
+    Returns:
+        int: The sequence number, or 0 if no change was recorded.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+    # Scans back from the end of the log along the primary key, so the cost
+    # depends on the number of recent changes rather than on the size of the log
+    token = 0
+    recent = []
+    before = None
+    while True:
+        query = sa.select(Change.id, Change.created_at).order_by(Change.id.desc()).limit(SETTLE_SCAN_PAGE)
+        if before is not None:
+            query = query.where(Change.id < before)
+        rows = db.session.execute(query).all()
+        for row in rows:
+            created_at = row.created_at
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            if created_at < cutoff:
+                token = row.id
+                break
+            recent.append(row.id)
+        if token or len(rows) < SETTLE_SCAN_PAGE:
+            break
+        before = rows[-1].id
+
+    for change_id in reversed(recent):
+        if change_id != token + 1:
+            break
+        token = change_id
+    return token
+
+def read_changes(since, limit, settle_seconds):
+    """
+    Reads the changes recorded after a sequence number.
+
+    Sequence numbers are assigned when a change is inserted, but become visible
+    when its transaction commits, so a recent gap in the sequence may belong to
+    a transaction still in flight. Reading stops before such a gap, unless it is
+    older than `settle_seconds`, in which case it belongs to a rolled back
+    transaction and is skipped.
+
+    Args:
+        since (int): The sequence number of the last change already seen.
+        limit (int): The maximum number of changes to read.
+        settle_seconds (float): The age after which a gap is considered permanent.
+
+    Returns:
+        tuple: The changes, the sequence number to resume from, and whether more changes are pending.
+    """
+    rows = db.session.execute(
+        sa.select(Change.id, Change.entity, Change.entity_id, Change.operation, Change.created_at)
+        .where(Change.id > since)
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    now = datetime.now(timezone.utc)
+    changes = []
+    token = since
+    for row in rows[:limit]:
+        created_at = row.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if row.id != token + 1 and (now - created_at).total_seconds() < settle_seconds:
+            has_more = True
+            break
+        changes.append(row)
+        token = row.id
+    return changes, token, has_more
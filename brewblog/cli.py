@@ -0,0 +1,126 @@
+"""
+This module defines the maintenance commands of the Flask CLI.
+They are registered on the application in `create_app`, and run within an
+application context.
+"""
+
+import os
+import signal
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+idempotency_cli = AppGroup('idempotency', help='Manage idempotency keys.')
+
+@idempotency_cli.command('purge')
+def purge_idempotency_keys():
+    """
+    Deletes the idempotency keys whose stored response expired.
+    """
+    from brewblog.idempotency import purge_expired_keys
+    click.echo(f'Deleted {purge_expired_keys()} expired idempotency keys.')
+
+documents_cli = AppGroup('documents', help='Manage the pre-encoded brewery documents.')
+
+@documents_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of breweries rebuilt per transaction.')
+def rebuild_documents(batch_size):
+    """
+    Rebuilds the document of every brewery.
+    """
+    from brewblog.documents import rebuild_all_documents
+    click.echo(f'Rebuilt {rebuild_all_documents(batch_size)} brewery documents.')
+
+areas_cli = AppGroup('areas', help='Manage the area summary tables.')
+
+@areas_cli.command('refresh')
+def refresh_areas():
+    """
+    Rebuilds the area summary tables from the breweries and beers.
+    """
+    from brewblog.areas import refresh_areas as refresh
+    click.echo(f'Refreshed the summary of {refresh()} areas.')
+
+jobs_cli = AppGroup('jobs', help='Run background jobs.')
+
+@jobs_cli.command('worker')
+@click.option('--poll-interval', type=float, default=None,
+              help='Seconds to wait when no job is due. Defaults to JOB_POLL_INTERVAL.')
+@click.option('--once', is_flag=True, help='Stop as soon as no job is due.')
+def run_jobs_worker(poll_interval, once):
+    """
+    Runs queued jobs until interrupted.
+
+    SIGTERM and SIGINT stop the worker once its current job is done.
+    """
+    from brewblog.jobs import default_worker_id, run_worker
+
+    stopping = []
+    def stop(signum, frame):  # pylint: disable=unused-argument
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    worker_id = default_worker_id()
+    if poll_interval is None:
+        poll_interval = current_app.config.get('JOB_POLL_INTERVAL', 1)
+    click.echo(f'Worker {worker_id} waiting for jobs.')
+    run_worker(worker_id, poll_interval, lambda: bool(stopping), once=once)
+    click.echo(f'Worker {worker_id} stopped.')
+
+profiles_cli = AppGroup('profiles', help='Aggregate sampled request profiles.')
+
+@profiles_cli.command('aggregate')
+@click.option('--directory', default=None,
+              help='Directory the profiles were written to. Defaults to PROFILE_DIR.')
+@click.option('--output', default=None,
+              help='Directory to write one merged folded profile per route to, for flame graphs.')
+@click.option('--top', default=5, show_default=True,
+              help='Number of functions with the most self samples listed per route.')
+def aggregate_profiles(directory, output, top):
+    """
+    Merges the profiles of each route and lists where their time goes.
+    """
+    from brewblog.profiling import aggregate_profiles as aggregate, self_time, write_folded
+
+    directory = directory or current_app.config.get('PROFILE_DIR', 'profiles')
+    routes = aggregate(directory)
+    if not routes:
+        click.echo(f'No profiles found in {directory}.')
+        return
+    if output:
+        os.makedirs(output, exist_ok=True)
+    for endpoint, route in routes.items():
+        samples = sum(route['stacks'].values())
+        click.echo(f"{endpoint}: {route['profiles']} profiles, {samples} samples")
+        for name, count in self_time(route['stacks']).most_common(top):
+            click.echo(f'  {100 * count / samples:5.1f}%  {name}')
+        if output:
+            write_folded(os.path.join(output, f'{endpoint}.folded'), route['stacks'])
+
+@profiles_cli.command('sign')
+@click.argument('path')
+def sign_profile_request(path):
+    """
+    Prints the X-Profile header value requesting a profile of a request to PATH.
+    """
+    from brewblog.profiling import sign_profile_request as sign
+
+    secret = current_app.config.get('PROFILE_SECRET')
+    if not secret:
+        raise click.ClickException('PROFILE_SECRET is not set.')
+    click.echo(sign(secret, path))
+
+def register_commands(app):
+    """
+    Registers the maintenance commands on the application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(documents_cli)
+    app.cli.add_command(areas_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(profiles_cli)
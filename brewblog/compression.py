@@ -0,0 +1,222 @@
+"""
+This module compresses responses according to the client's Accept-Encoding header.
+It supports gzip, plus brotli and zstd when their libraries are installed, skips
+bodies below a minimum size, compresses streamed responses chunk by chunk, and keeps
+a small cache of compressed bodies so identical responses are not recompressed.
+"""
+
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from flask import current_app, request
+from brewblog.tracing import span
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/msgpack',
+    'text/event-stream',
+    'text/html',
+    'text/plain',
+}
+
+class _GzipStream:
+    """
+    Incremental gzip compressor, flushed after each chunk.
+    """
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class _BrotliStream:
+    """
+    Incremental brotli compressor, flushed after each chunk.
+    """
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+class _ZstdStream:
+    """
+    Incremental zstd compressor, flushed after each chunk.
+    """
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk):
+        return (self._compressor.compress(chunk)
+                + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self):
+        return self._compressor.flush()
+
+def available_encodings():
+    """
+    Lists the content encodings supported by the installed libraries.
+
+    Returns:
+        dict: The streaming compressor class of each encoding.
+    """
+    encodings = {'gzip': _GzipStream}
+    if brotli is not None:
+        encodings['br'] = _BrotliStream
+    if zstandard is not None:
+        encodings['zstd'] = _ZstdStream
+    return encodings
+
+def compress(encoding, body, level):
+    """
+    Compresses a complete body.
+
+    Args:
+        encoding (str): The content encoding.
+        body (bytes): The body to compress.
+        level (int): The compression level.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    stream = _GzipStream(level)
+    return stream.compress(body) + stream.finish()
+
+class CompressedBodyCache:
+    """
+    Thread-safe LRU cache of compressed bodies, keyed by a digest of the body.
+
+    Attributes:
+        max_entries (int): The maximum number of cached bodies.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, encoding, body, level):
+        """
+        Returns the compressed body, compressing it only on a cache miss.
+
+        Args:
+            encoding (str): The content encoding.
+            body (bytes): The body to compress.
+            level (int): The compression level.
+
+        Returns:
+            bytes: The compressed body.
+        """
+        if self.max_entries <= 0:
+            return compress(encoding, body, level)
+
+        key = (encoding, level, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = compress(encoding, body, level)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+def negotiate_encoding(preferences):
+    """
+    Picks the content encoding for the current request.
+
+    Args:
+        preferences (list): The supported encodings, in order of preference.
+
+    Returns:
+        str | None: The selected encoding, if the client accepts any.
+    """
+    accepted = request.accept_encodings
+    candidates = [encoding for encoding in preferences if accepted[encoding] > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: accepted[encoding])
+
+def _compress_stream(chunks, stream):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        compressed = stream.compress(chunk)
+        if compressed:
+            yield compressed
+    yield stream.finish()
+
+def compress_response(response):
+    """
+    Compresses a response if the client accepts a supported encoding.
+
+    Args:
+        response (Response): The response to compress.
+
+    Returns:
+        Response: The response, compressed if applicable.
+    """
+    config = current_app.config
+    if (not config.get('COMPRESS_ENABLED', True)
+            or request.method == 'HEAD'
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encodings = available_encodings()
+    preferences = [encoding for encoding in config.get('COMPRESS_ALGORITHMS', ['br', 'zstd', 'gzip'])
+                   if encoding in encodings]
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(preferences)
+    if encoding is None:
+        return response
+
+    level = config.get('COMPRESS_LEVELS', {}).get(encoding, 6)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encodings[encoding](level))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        cache = current_app.extensions['compression']
+        with span('encode', encoding=encoding, size=len(body)):
+            response.set_data(cache.get_or_compress(encoding, body, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """
+    Registers response compression on the application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.extensions['compression'] = CompressedBodyCache(app.config.get('COMPRESS_CACHE_SIZE', 128))
+    app.after_request(compress_response)
@@ -0,0 +1,159 @@
+"""
+This module configures the database driver.
+`SQLALCHEMY_DATABASE_URI` selects the driver: `postgresql://` uses psycopg2, and
+`postgresql+psycopg://` uses psycopg 3, which prepares the statements a
+connection runs repeatedly on the server, and can pipeline independent queries
+so a route sends them in a single round trip. `DB_PGBOUNCER` turns server-side
+prepared statements off, for transaction poolers that hand each transaction to
+a different server connection.
+"""
+
+import sqlalchemy as sa
+from flask import current_app
+from brewblog import db
+from brewblog.tracing import span
+
+def uses_psycopg3(uri):
+    """
+    Tells whether a database URI selects the psycopg 3 driver.
+
+    Args:
+        uri (str): The SQLAlchemy database URI.
+
+    Returns:
+        bool: True for `postgresql+psycopg://` URIs.
+    """
+    return sa.engine.make_url(uri).drivername == 'postgresql+psycopg'
+
+def engine_options(config):
+    """
+    Returns the engine options of the configured driver.
+
+    Args:
+        config (Config): The application configuration.
+
+    Returns:
+        dict: The options, merged into `SQLALCHEMY_ENGINE_OPTIONS`.
+    """
+    if not uses_psycopg3(config.get('SQLALCHEMY_DATABASE_URI') or 'sqlite://'):
+        return {}
+    threshold = config.get('DB_PREPARE_THRESHOLD', 5)
+    if config.get('DB_PGBOUNCER', False) or threshold < 0:
+        # A statement prepared on one server connection is unknown to the others
+        threshold = None
+    return {'connect_args': {'prepare_threshold': threshold}}
+
+def pipelining_enabled(conn):
+    """
+    Tells whether queries can be pipelined on a connection.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+
+    Returns:
+        bool: True on psycopg 3 connections, unless `DB_PIPELINE` is off.
+    """
+    return conn.dialect.driver == 'psycopg' and current_app.config.get('DB_PIPELINE', True)
+
+def execute_pipelined(statements):
+    """
+    Executes independent SELECT statements in the current transaction, in a
+    single round trip when the driver supports pipelining.
+
+    Pipelined rows are read from the driver as is, so the statements must only
+    select plain columns; UUIDs are returned as strings, as `Uuid(as_uuid=False)`
+    columns do.
+
+    Args:
+        statements (list): The statements, none depending on the results of another.
+
+    Returns:
+        list: The rows of each statement, as tuples.
+    """
+    conn = db.session.connection()
+    if not pipelining_enabled(conn):
+        return [[tuple(row) for row in conn.execute(statement)] for statement in statements]
+
+    from psycopg.types.string import TextLoader
+
+    compiled = [statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+                for statement in statements]
+    with span('sql PIPELINE', statements=len(compiled)):
+        return run_pipeline(
+            conn, conn.connection.driver_connection, compiled,
+            lambda cursor: cursor.adapters.register_loader('uuid', TextLoader))
+
+def run_pipeline(conn, driver_connection, compiled, prepare_cursor=None):
+    """
+    Runs compiled statements in a pipeline of the driver connection.
+
+    The cursors bypass SQLAlchemy, so the cursor events of the engine are fired
+    here, for the slow query log, the circuit breaker, tracing and the query
+    counters to see every statement. Results arrive in statement order, so each
+    statement is timed from the result of the previous one, and only one is
+    running when the driver raises. Driver errors are handled, and wrapped, as
+    SQLAlchemy handles those of the statements it runs.
+
+    Args:
+        conn (Connection): The SQLAlchemy connection.
+        driver_connection: Its psycopg 3 connection.
+        compiled (list): The compiled statements.
+        prepare_cursor (callable, optional): Called with each new cursor.
+
+    Raises:
+        DBAPIError: If the driver raised an error.
+
+    Returns:
+        list: The rows of each statement, as tuples.
+    """
+    if not compiled:
+        return []
+    dispatch = conn.dispatch
+    cursors = []
+    for _ in compiled:
+        cursors.append(driver_connection.cursor())
+        if prepare_cursor is not None:
+            prepare_cursor(cursors[-1])
+
+    def before(index):
+        dispatch.before_cursor_execute(
+            conn, cursors[index], compiled[index].string, compiled[index].params, None, False)
+
+    def after(index):
+        dispatch.after_cursor_execute(
+            conn, cursors[index], compiled[index].string, compiled[index].params, None, False)
+
+    index = 0
+    results = []
+    before(index)
+    try:
+        with driver_connection.pipeline():
+            for cursor, statement in zip(cursors, compiled):
+                cursor.execute(statement.string, statement.params)
+            for index, cursor in enumerate(cursors):
+                if index:
+                    after(index - 1)
+                    before(index)
+                results.append([tuple(row) for row in cursor.fetchall()])
+        after(index)
+    except conn.dialect.loaded_dbapi.Error as e:
+        # Fires the handle_error event, invalidates lost connections, and raises
+        conn._handle_dbapi_exception(  # pylint: disable=protected-access
+            e, compiled[index].string, compiled[index].params, cursors[index], None)
+    finally:
+        for cursor in cursors:
+            cursor.close()
+    return results
+
+def init_database(app):
+    """
+    Adds the engine options of the configured driver, before the engine is created.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    options = engine_options(app.config)
+    if options:
+        merged = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        merged['connect_args'] = {**merged.get('connect_args', {}), **options['connect_args']}
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = merged
@@ -0,0 +1,96 @@
+"""
+This module maintains the pre-encoded JSON documents of breweries.
+When `BREWERY_DOCUMENTS` is enabled, the write routes rebuild the document of
+every brewery they touch in the same transaction, and `show_brewery` returns the
+stored bytes without serializing anything.
+"""
+
+from datetime import datetime, timezone
+from flask import current_app
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.models import Brewery, BreweryDocument
+from brewblog.queries import dialect_insert, select_breweries
+
+def documents_enabled():
+    """
+    Checks whether brewery documents are maintained.
+
+    Returns:
+        bool: True if the write routes rebuild documents.
+    """
+    return current_app.config.get('BREWERY_DOCUMENTS', False)
+
+def store_documents(breweries):
+    """
+    Stores the documents of serialized breweries, replacing the existing ones.
+
+    Args:
+        breweries (list): Breweries in the shape of `Brewery.serialize`.
+    """
+    if not breweries:
+        return
+    now = datetime.now(timezone.utc)
+    insert = dialect_insert(BreweryDocument).values([{
+        'brewery_id': brewery['id'],
+        'body': current_app.json.dumps(brewery).encode('utf-8'),
+        'updated_at': now
+    } for brewery in breweries])
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=[BreweryDocument.brewery_id],
+        set_={'body': insert.excluded.body, 'updated_at': insert.excluded.updated_at}))
+
+def rebuild_documents(ids):
+    """
+    Rebuilds the documents of breweries from their current rows.
+
+    The brewery rows stay locked until the transaction ends, so concurrent
+    writes to the same brewery rebuild its document one after the other, each
+    seeing the writes committed before it.
+
+    Args:
+        ids (list): The IDs of the breweries.
+    """
+    store_documents([
+        brewery for _, _, _, brewery in select_breweries(ids, lock=True)])
+
+def fetch_document(brewery_id):
+    """
+    Fetches the document of a brewery.
+
+    Args:
+        brewery_id (str): The ID of the brewery.
+
+    Returns:
+        bytes: The encoded brewery, or None if it has no document.
+    """
+    return db.session.scalar(
+        sa.select(BreweryDocument.body).where(BreweryDocument.brewery_id == brewery_id))
+
+def rebuild_all_documents(batch_size=500, on_batch=None):
+    """
+    Rebuilds the documents of every brewery, one batch per transaction.
+
+    Args:
+        batch_size (int): The number of breweries rebuilt per transaction.
+        on_batch (callable, optional): Called with the number of documents rebuilt so far,
+            after each batch.
+
+    Returns:
+        int: The number of documents rebuilt.
+    """
+    rebuilt = 0
+    last_id = None
+    while True:
+        query = sa.select(Brewery.id).order_by(Brewery.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(Brewery.id > last_id)
+        ids = db.session.scalars(query).all()
+        if not ids:
+            return rebuilt
+        rebuild_documents(ids)
+        db.session.commit()
+        rebuilt += len(ids)
+        last_id = ids[-1]
+        if on_batch is not None:
+            on_batch(rebuilt)
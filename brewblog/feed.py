@@ -0,0 +1,265 @@
+"""
+This module implements the per-worker change feed.
+A single listener per worker receives the change events published on commit by
+the write routes, and fans them out to any number of subscribers. On PostgreSQL
+the listener holds a dedicated connection that LISTENs for notifications, so it
+also receives the changes committed by other workers. On other databases events
+are published in-process, from the session's `after_commit` hook.
+"""
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from flask import current_app, has_app_context
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.changes import NOTIFY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """
+    A subscriber's queue of change events.
+
+    Attributes:
+        events (Queue): The pending events.
+        overflowed (bool): Whether events were dropped because the subscriber fell behind.
+    """
+    def __init__(self, max_pending):
+        self.events = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def put(self, event):
+        """
+        Queues an event, flagging the subscription if it is full.
+        """
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """
+        Waits for the next event.
+
+        Args:
+            timeout (float): The number of seconds to wait.
+
+        Raises:
+            Empty: If no event arrived in time.
+
+        Returns:
+            dict: The event.
+        """
+        return self.events.get(timeout=timeout)
+
+class ChangeFeed:
+    """
+    Fans change events out to subscribers, with one shared listener per worker.
+
+    Attributes:
+        engine (Engine): The engine the listener connects with.
+        max_pending (int): The maximum number of queued events per subscriber.
+        max_subscribers (int): The maximum number of subscribers at once, or 0 if unbounded.
+    """
+    def __init__(self, engine, max_pending=1000, max_subscribers=0):
+        self.engine = engine
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._callbacks = []
+        self._commit_callbacks = []
+        self._reset_callbacks = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+
+    @property
+    def uses_notify(self):
+        """
+        bool: Whether events are received through PostgreSQL notifications.
+        """
+        return self.engine.dialect.name == 'postgresql'
+
+    def subscribe(self):
+        """
+        Registers a new subscriber, starting the listener if needed.
+
+        Returns:
+            Subscription: The subscriber's queue of events, or None if the feed
+                already has `max_subscribers` subscribers.
+        """
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Removes a subscriber.
+
+        Args:
+            subscription (Subscription): The subscription to remove.
+        """
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_callback(self, callback, on_commit=None, on_reset=None):
+        """
+        Registers a function called with every event, from the listener.
+
+        Args:
+            callback (callable): The function to call with each event.
+            on_commit (callable, optional): Called with the events committed by this worker,
+                as soon as they commit, when `callback` receives them asynchronously.
+            on_reset (callable, optional): Called when events may have been missed,
+                after the listener reconnects.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            if on_commit is not None:
+                self._commit_callbacks.append(on_commit)
+            if on_reset is not None:
+                self._reset_callbacks.append(on_reset)
+
+    def committed(self, events):
+        """
+        Handles the events of a transaction committed by this worker.
+
+        Args:
+            events (list): The change events.
+        """
+        if not self.uses_notify:
+            for event in events:
+                self.publish(event)
+            return
+        # Subscribers receive the notifications; callbacks are told right away
+        with self._lock:
+            commit_callbacks = list(self._commit_callbacks)
+        for callback in commit_callbacks:
+            callback(events)
+
+    def publish(self, event):
+        """
+        Delivers an event to every subscriber and callback.
+
+        Args:
+            event (dict): The change event.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+            callbacks = list(self._callbacks)
+        for subscription in subscribers:
+            subscription.put(event)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Change feed callback failed')
+
+    def start(self):
+        """
+        Starts the notification listener thread, if the database supports it.
+
+        The thread is started again in a worker forked after it was started.
+        """
+        if not self.uses_notify or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(
+                target=self._listen, name='change-feed-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        """
+        Receives notifications on a dedicated connection, reconnecting on failure.
+        """
+        backoff = 1.0
+        connected_before = False
+        while True:
+            try:
+                raw = self.engine.raw_connection()
+                # The listening connection is held for the life of the worker
+                raw.detach()
+                connection = raw.dbapi_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                backoff = 1.0
+                if connected_before:
+                    self._reset()
+                connected_before = True
+                for payload in _notifications(connection):
+                    self.publish(json.loads(payload))
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Change feed listener disconnected, retrying in %.0fs', backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _reset(self):
+        """
+        Tells the reset callbacks that notifications may have been missed.
+        """
+        with self._lock:
+            reset_callbacks = list(self._reset_callbacks)
+        for callback in reset_callbacks:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Change feed reset callback failed')
+
+def _notifications(connection):
+    """
+    Yields the payloads of the notifications received on a psycopg2 or psycopg 3 connection.
+    """
+    if not hasattr(connection, 'poll'):
+        while True:
+            for notify in connection.notifies(timeout=5.0):
+                yield notify.payload
+    while True:
+        if select.select([connection], [], [], 5.0) == ([], [], []):
+            continue
+        connection.poll()
+        while connection.notifies:
+            yield connection.notifies.pop(0).payload
+
+def _publish_pending_changes(session):
+    """
+    Publishes the changes recorded in a session once its transaction commits.
+    """
+    pending = session.info.pop('pending_changes', None)
+    if pending and has_app_context():
+        feed = current_app.extensions.get('change_feed')
+        if feed is not None:
+            feed.committed(pending)
+
+def _discard_pending_changes(session, previous_transaction):  # pylint: disable=unused-argument
+    """
+    Discards the changes recorded in a session whose transaction rolled back.
+    """
+    session.info.pop('pending_changes', None)
+
+def init_change_feed(app):
+    """
+    Creates the change feed of the application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    with app.app_context():
+        app.extensions['change_feed'] = ChangeFeed(
+            db.engine, app.config.get('STREAM_MAX_PENDING', 1000),
+            app.config.get('STREAM_MAX_CONNECTIONS', 0))
+    if not sa.event.contains(db.session, 'after_commit', _publish_pending_changes):
+        sa.event.listen(db.session, 'after_commit', _publish_pending_changes)
+        sa.event.listen(db.session, 'after_soft_rollback', _discard_pending_changes)
@@ -0,0 +1,201 @@
+"""
+This module implements idempotency keys for the create endpoints.
+The first request sent with an `Idempotency-Key` header is executed and its
+response stored; retries with the same key replay the stored response without
+executing the request again, and concurrent duplicates wait for the first one.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import current_app, jsonify, request
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.models import IdempotencyKey
+from brewblog.queries import dialect_insert
+
+def request_fingerprint():
+    """
+    Computes a digest of the method, path and body of the current request, and
+    of the media type negotiated for its response, so a stored MessagePack body
+    is never replayed to a JSON client.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(request.method.encode('utf-8'))
+    digest.update(request.path.encode('utf-8'))
+    digest.update(b'msgpack' if current_app.json.wants_msgpack() else b'json')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def claim_key(subject, key, request_hash):
+    """
+    Claims an idempotency key for the current request.
+
+    A key is claimed if it was never used, or if its stored response expired, or if
+    the request holding it has been in progress for longer than the lock timeout.
+
+    Args:
+        subject (str): The subject of the JWT.
+        key (str): The idempotency key.
+        request_hash (str): The fingerprint of the request.
+
+    Returns:
+        bool: True if the key was claimed.
+    """
+    config = current_app.config
+    now = datetime.now(timezone.utc)
+    expired = now - timedelta(seconds=config.get('IDEMPOTENCY_TTL', 86400))
+    abandoned = now - timedelta(seconds=config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    values = {
+        'request_hash': request_hash,
+        'status_code': None,
+        'body': None,
+        'mimetype': None,
+        'created_at': now,
+    }
+    statement = dialect_insert(IdempotencyKey).values(subject=subject, key=key, **values)
+    row = db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.subject, IdempotencyKey.key],
+            set_=values,
+            where=sa.or_(
+                IdempotencyKey.created_at < expired,
+                sa.and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at < abandoned)))
+        .returning(IdempotencyKey.key)
+    ).first()
+    db.session.commit()
+    return row is not None
+
+def wait_for_response(subject, key):
+    """
+    Waits for the request holding an idempotency key to store its response.
+
+    Args:
+        subject (str): The subject of the JWT.
+        key (str): The idempotency key.
+
+    Returns:
+        Row | None: The stored request hash, status code, body and mimetype, if the key exists.
+    """
+    config = current_app.config
+    deadline = time.monotonic() + config.get('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while True:
+        row = db.session.execute(
+            sa.select(
+                IdempotencyKey.request_hash,
+                IdempotencyKey.status_code,
+                IdempotencyKey.body,
+                IdempotencyKey.mimetype)
+            .where(IdempotencyKey.subject == subject, IdempotencyKey.key == key)
+        ).first()
+        db.session.commit()
+        if row is None or row.status_code is not None or time.monotonic() >= deadline:
+            return row
+        time.sleep(config.get('IDEMPOTENCY_POLL_INTERVAL', 0.1))
+
+def store_response(subject, key, response):
+    """
+    Stores the response of the request holding an idempotency key.
+
+    Server errors release the key instead, so the request can be retried.
+
+    Args:
+        subject (str): The subject of the JWT.
+        key (str): The idempotency key.
+        response (Response): The response to store.
+    """
+    where = (IdempotencyKey.subject == subject, IdempotencyKey.key == key)
+    if response.status_code >= 500:
+        db.session.execute(sa.delete(IdempotencyKey).where(*where))
+    else:
+        db.session.execute(
+            sa.update(IdempotencyKey)
+            .where(*where)
+            .values(
+                status_code=response.status_code,
+                body=response.get_data(),
+                mimetype=response.mimetype))
+    db.session.commit()
+
+def release_key(subject, key):
+    """
+    Releases an idempotency key after the request holding it failed.
+
+    Args:
+        subject (str): The subject of the JWT.
+        key (str): The idempotency key.
+    """
+    db.session.rollback()
+    db.session.execute(
+        sa.delete(IdempotencyKey)
+        .where(IdempotencyKey.subject == subject, IdempotencyKey.key == key))
+    db.session.commit()
+
+def purge_expired_keys():
+    """
+    Deletes the idempotency keys whose stored response expired.
+
+    Returns:
+        int: The number of deleted keys.
+    """
+    expired = datetime.now(timezone.utc) - timedelta(
+        seconds=current_app.config.get('IDEMPOTENCY_TTL', 86400))
+    result = db.session.execute(
+        sa.delete(IdempotencyKey).where(IdempotencyKey.created_at < expired))
+    db.session.commit()
+    return result.rowcount
+
+def idempotent(f):
+    """
+    Decorator making an endpoint idempotent for requests with an Idempotency-Key header.
+
+    It must be applied below `requires_auth`, as keys are scoped to the JWT subject.
+
+    Args:
+        f (function): The function to be decorated.
+
+    Returns:
+        function: The decorated function.
+    """
+    @wraps(f)
+    def wrapper(*args, payload, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, payload=payload, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters.'}), 400
+
+        subject = payload.get('sub', '')
+        request_hash = request_fingerprint()
+
+        if not claim_key(subject, key, request_hash):
+            stored = wait_for_response(subject, key)
+            if stored is None:
+                return jsonify({'error': 'Idempotency-Key was released, please retry.'}), 409
+            if stored.request_hash != request_hash:
+                return jsonify({
+                    'error': 'Idempotency-Key was already used for a different request.'
+                }), 422
+            if stored.status_code is None:
+                response = jsonify({'error': 'A request with this Idempotency-Key is in progress.'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            response = current_app.response_class(
+                stored.body, status=stored.status_code, mimetype=stored.mimetype)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(f(*args, payload=payload, **kwargs))
+        except Exception:
+            release_key(subject, key)
+            raise
+        store_response(subject, key, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,51 @@
+"""
+This module validates brewery IDs.
+Brewery IDs are UUIDs, stored in the native `uuid` type on PostgreSQL, and
+represented in JSON and URLs in their canonical lowercase, hyphenated form.
+IDs from request bodies are parsed with `parse_brewery_id`, and IDs in paths
+with the `uuidstr` route converter, so malformed IDs never reach the database.
+"""
+
+import uuid
+from werkzeug.routing import BaseConverter
+
+def parse_brewery_id(value):
+    """
+    Parses a brewery ID into its canonical form.
+
+    Args:
+        value (object): The ID, as sent by the client.
+
+    Returns:
+        str: The lowercase, hyphenated UUID, or None if the value is not a UUID.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
+class UUIDStringConverter(BaseConverter):
+    """
+    Route converter matching a hyphenated UUID and passing it to the view as a canonical string.
+
+    Unlike werkzeug's `uuid` converter, the view receives a string, the Python
+    type of the brewery ID columns.
+    """
+    regex = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+
+    def to_python(self, value):
+        return value.lower()
+
+    def to_url(self, value):
+        return str(value)
+
+def register_converters(app):
+    """
+    Registers the route converters on the application, before its blueprints.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.url_map.converters['uuidstr'] = UUIDStringConverter
@@ -0,0 +1,73 @@
+"""
+This module defines the routes for the Job API.
+It includes endpoints to queue a background job and to follow its progress.
+The jobs themselves run in worker processes, started with `flask jobs worker`.
+"""
+
+from flask import request, jsonify, url_for
+from brewblog import db
+from brewblog.job import bp
+from brewblog.auth import requires_auth
+from brewblog.error_handlers import register_error_handlers
+from brewblog.idempotency import idempotent
+from brewblog.jobs import enqueue
+from brewblog.models import Job
+
+register_error_handlers(bp)
+
+@bp.route('/api/jobs', methods=['POST'])
+@requires_auth('run:jobs')
+@idempotent
+def create_job(payload):
+    """
+    Endpoint to queue a background job.
+
+    Retries sent with the same Idempotency-Key header replay the first response.
+
+    Args:
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The JSON response with the queued job, or an error message.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('kind'), str):
+        return jsonify({'error': 'Request must contain the kind of job.'}), 400
+
+    params = data.get('params', {})
+    max_attempts = data.get('max_attempts', 3)
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object.'}), 400
+    if not isinstance(max_attempts, int) or max_attempts < 1:
+        return jsonify({'error': 'max_attempts must be a positive integer.'}), 400
+
+    try:
+        new_job = enqueue(data['kind'], params, max_attempts, created_by=payload.get('sub'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Serialized before the commit expires its attributes
+    job_data = new_job.serialize()
+    db.session.commit()
+
+    response = jsonify(job_data)
+    response.status_code = 202
+    response.headers['Location'] = url_for('job.get_job', job_id=job_data['id'])
+    return response
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@requires_auth('run:jobs')
+def get_job(job_id, payload):
+    """
+    Endpoint to get the status and progress of a background job.
+
+    Args:
+        job_id (int): The ID of the job.
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The JSON response with the job details or an error message.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': f'Job with id {job_id} not found.'}), 404
+    return jsonify(job.serialize())
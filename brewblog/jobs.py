@@ -0,0 +1,335 @@
+"""
+This module implements the background job queue.
+Jobs are rows of the Job table, queued by the API and run by worker processes
+started with `flask jobs worker`. Workers claim jobs with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of them can share the queue
+without blocking each other. Failed jobs are retried with exponential backoff,
+and jobs whose worker stopped reporting progress are claimed again.
+"""
+
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.areas import refresh_areas
+from brewblog.changes import record_change
+from brewblog.documents import documents_enabled, rebuild_all_documents, rebuild_documents
+from brewblog.idempotency import purge_expired_keys
+from brewblog.ids import parse_brewery_id
+from brewblog.models import Beer, Brewery, Job
+from brewblog.queries import BREWERY_FIELDS, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Job functions by kind, registered with the `job` decorator
+JOBS = {}
+
+def job(kind):
+    """
+    Decorator registering a function as a kind of job.
+
+    The function is called with the job parameters and a `JobContext`, within an
+    application context, and returns a JSON serializable result.
+
+    Args:
+        kind (str): The name of the kind of job.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(f):
+        JOBS[kind] = f
+        return f
+    return decorator
+
+class JobContext:
+    """
+    The handle a running job function reports its progress through.
+
+    Attributes:
+        job_id (int): The ID of the running job.
+        worker_id (str): The ID of the worker running it.
+    """
+    def __init__(self, job_id, worker_id):
+        self.job_id = job_id
+        self.worker_id = worker_id
+
+    def progress(self, fraction, message=None):
+        """
+        Records the progress of the job, which also tells the queue its worker is alive.
+
+        Progress is written on its own connection, so it is visible while the
+        job's own transaction is still open.
+
+        Args:
+            fraction (float): The fraction of the job done, between 0 and 1.
+            message (str, optional): A description of the current step.
+        """
+        with db.engine.begin() as connection:
+            connection.execute(
+                sa.update(Job)
+                .where(Job.id == self.job_id, Job.locked_by == self.worker_id)
+                .values(
+                    progress=max(0.0, min(1.0, fraction)),
+                    message=message[:255] if message else None,
+                    locked_at=datetime.now(timezone.utc)))
+
+def enqueue(kind, params=None, max_attempts=3, created_by=None):
+    """
+    Queues a job in the current transaction.
+
+    Args:
+        kind (str): The kind of job.
+        params (dict, optional): The parameters of the job function.
+        max_attempts (int): The number of attempts after which a failing job is given up.
+        created_by (str, optional): The subject of the JWT that queued the job.
+
+    Raises:
+        ValueError: If the kind of job is unknown.
+
+    Returns:
+        Job: The queued job.
+    """
+    if kind not in JOBS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    now = datetime.now(timezone.utc)
+    new_job = Job(
+        kind=kind,
+        params=params or {},
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        progress=0,
+        created_by=created_by,
+        run_at=now,
+        created_at=now)
+    db.session.add(new_job)
+    db.session.flush()
+    return new_job
+
+def claim_job(worker_id):
+    """
+    Claims the next job due, skipping the jobs other workers are claiming.
+
+    Running jobs whose worker has not reported progress for `JOB_LOCK_TIMEOUT`
+    seconds are claimed again.
+
+    Args:
+        worker_id (str): The ID of the claiming worker.
+
+    Returns:
+        int: The ID of the claimed job, or None if no job is due.
+    """
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=current_app.config.get('JOB_LOCK_TIMEOUT', 300))
+    candidate = (
+        sa.select(Job.id)
+        .where(sa.or_(
+            sa.and_(Job.status == 'queued', Job.run_at <= now),
+            sa.and_(Job.status == 'running', Job.locked_at < stale)))
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery())
+    job_id = db.session.execute(
+        sa.update(Job)
+        .where(Job.id == candidate)
+        .values(status='running', attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now)
+        .returning(Job.id)
+    ).scalar()
+    db.session.commit()
+    return job_id
+
+def _finish(job_id, worker_id, **values):
+    """
+    Updates a job claimed by a worker, unless another worker claimed it since.
+    """
+    db.session.execute(
+        sa.update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id)
+        .values(locked_by=None, locked_at=None, **values))
+    db.session.commit()
+
+def run_job(job_id, worker_id):
+    """
+    Runs a claimed job, and records its result or schedules its retry.
+
+    Args:
+        job_id (int): The ID of the claimed job.
+        worker_id (str): The ID of the worker that claimed it.
+
+    Returns:
+        bool: Whether the job succeeded.
+    """
+    claimed = db.session.get(Job, job_id)
+    kind, params = claimed.kind, dict(claimed.params or {})
+    attempts, max_attempts = claimed.attempts, claimed.max_attempts
+    function = JOBS.get(kind)
+    try:
+        if function is None:
+            raise LookupError(f'Unknown job kind: {kind}')
+        if attempts > max_attempts:
+            raise RuntimeError('The worker running the job stopped responding.')
+        result = function(params, JobContext(job_id, worker_id))
+    except Exception as e:  # pylint: disable=broad-except
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed on attempt %s', job_id, kind, attempts)
+        now = datetime.now(timezone.utc)
+        if function is not None and attempts < max_attempts:
+            delay = current_app.config.get('JOB_RETRY_DELAY', 10) * 2 ** (attempts - 1)
+            _finish(job_id, worker_id, status='queued', error=str(e),
+                    run_at=now + timedelta(seconds=delay))
+        else:
+            _finish(job_id, worker_id, status='failed', error=str(e), finished_at=now)
+        return False
+
+    db.session.commit()
+    _finish(job_id, worker_id, status='succeeded', result=result, progress=1.0,
+            finished_at=datetime.now(timezone.utc))
+    return True
+
+def run_next_job(worker_id):
+    """
+    Claims and runs the next job due.
+
+    Args:
+        worker_id (str): The ID of the worker.
+
+    Returns:
+        bool: Whether a job was run.
+    """
+    job_id = claim_job(worker_id)
+    if job_id is None:
+        return False
+    run_job(job_id, worker_id)
+    db.session.remove()
+    return True
+
+def default_worker_id():
+    """
+    Returns the ID identifying this worker process.
+
+    Returns:
+        str: The host name and process ID.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def run_worker(worker_id, poll_interval, should_stop, once=False):
+    """
+    Runs jobs until asked to stop.
+
+    Args:
+        worker_id (str): The ID of the worker.
+        poll_interval (float): Seconds to wait when no job is due.
+        should_stop (callable): Returns True when the worker should stop, checked between jobs.
+        once (bool): Whether to stop as soon as no job is due.
+    """
+    while not should_stop():
+        if run_next_job(worker_id):
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _brewery_id(value):
+    brewery_id = parse_brewery_id(value)
+    if brewery_id is None:
+        raise ValueError(f'Brewery id {value!r} is not a UUID.')
+    return brewery_id
+
+@job('import_catalogue')
+def import_catalogue(params, context):
+    """
+    Imports breweries and beers, skipping those that already exist.
+
+    Args:
+        params (dict): The `breweries` and `beers` to import, in the shape of the create endpoints.
+        context (JobContext): The job context.
+
+    Returns:
+        dict: The number of breweries and beers imported.
+    """
+    breweries = params.get('breweries', [])
+    beers = params.get('beers', [])
+    total = max(len(breweries) + len(beers), 1)
+    done = 0
+    imported = {'breweries': 0, 'beers': 0}
+    touched = set()
+
+    for chunk in _chunks(breweries, 500):
+        ids = db.session.scalars(
+            dialect_insert(Brewery)
+            .values([
+                {field: brewery.get(field) for field in BREWERY_FIELDS}
+                | {'id': _brewery_id(brewery.get('id'))}
+                for brewery in chunk])
+            .on_conflict_do_nothing(index_elements=[Brewery.id])
+            .returning(Brewery.id)).all()
+        for brewery_id in ids:
+            record_change('brewery', brewery_id)
+        db.session.commit()
+        imported['breweries'] += len(ids)
+        touched.update(ids)
+        done += len(chunk)
+        context.progress(done / total, f'Imported {done} of {total} rows')
+
+    for chunk in _chunks(beers, 500):
+        rows = db.session.execute(
+            dialect_insert(Beer)
+            .values([{
+                'id': beer.get('id'),
+                'name': beer.get('name'),
+                'description': beer.get('description'),
+                'style_id': beer.get('style'),
+                'brewery_id': _brewery_id(beer.get('brewery_id'))
+            } for beer in chunk])
+            .on_conflict_do_nothing(index_elements=[Beer.id])
+            .returning(Beer.id, Beer.brewery_id)).all()
+        for row in rows:
+            record_change('beer', row.id)
+        db.session.commit()
+        imported['beers'] += len(rows)
+        touched.update(row.brewery_id for row in rows)
+        done += len(chunk)
+        context.progress(done / total, f'Imported {done} of {total} rows')
+
+    context.progress(1.0, 'Refreshing the area summaries')
+    refresh_areas()
+    if documents_enabled() and touched:
+        for ids in _chunks(sorted(touched), 500):
+            rebuild_documents(ids)
+            db.session.commit()
+    return imported
+
+@job('refresh_areas')
+def refresh_areas_job(params, context):  # pylint: disable=unused-argument
+    """
+    Rebuilds the area summary tables.
+    """
+    return {'areas': refresh_areas()}
+
+@job('rebuild_documents')
+def rebuild_documents_job(params, context):
+    """
+    Rebuilds the document of every brewery.
+    """
+    total = max(db.session.scalar(sa.select(sa.func.count()).select_from(Brewery)), 1)
+    rebuilt = rebuild_all_documents(
+        params.get('batch_size', 500),
+        on_batch=lambda rebuilt: context.progress(rebuilt / total, f'Rebuilt {rebuilt} documents'))
+    return {'documents': rebuilt}
+
+@job('purge_idempotency_keys')
+def purge_idempotency_keys_job(params, context):  # pylint: disable=unused-argument
+    """
+    Deletes the expired idempotency keys.
+    """
+    return {'deleted': purge_expired_keys()}
@@ -0,0 +1,139 @@
+"""
+This module defines the JSON provider used by the Flask application.
+It encodes responses with orjson when it is installed, falling back to the
+standard library encoder otherwise, and negotiates MessagePack responses for
+clients sending `Accept: application/msgpack`.
+"""
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from brewblog.tracing import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider encoding with orjson, with optional MessagePack negotiation.
+
+    Responses are the same as the default provider's: keys are sorted,
+    responses are indented in debug mode, and dates are passed to `default`, so
+    they are encoded as RFC 822 strings rather than orjson's ISO 8601 ones.
+    UUIDs, decimals and dataclasses are encoded as `default` encodes them.
+
+    Attributes:
+        use_orjson (bool): Whether orjson is used to encode and decode.
+        msgpack_enabled (bool): Whether MessagePack responses can be negotiated.
+    """
+    use_orjson = orjson is not None
+    msgpack_enabled = msgpack is not None
+
+    def dumps(self, obj, **kwargs):
+        """
+        Serializes data as a JSON string.
+        """
+        if not self.use_orjson:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        """
+        Deserializes data from a JSON string or bytes.
+        """
+        if not self.use_orjson or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def wants_msgpack(self):
+        """
+        Checks whether the current request prefers a MessagePack response.
+
+        Returns:
+            bool: True if MessagePack is enabled and preferred over JSON.
+        """
+        if not self.msgpack_enabled or not has_request_context():
+            return False
+        best = request.accept_mimetypes.best_match([self.mimetype, MSGPACK_MIMETYPE])
+        return best == MSGPACK_MIMETYPE
+
+    def response(self, *args, **kwargs):
+        """
+        Serializes the given arguments and returns a response.
+
+        Args:
+            *args: A single value to serialize, or multiple values to treat as a list.
+            **kwargs: Values to treat as a dict.
+
+        Returns:
+            Response: The JSON or MessagePack response.
+        """
+        with span('serialize'):
+            return self._encode_response(self._prepare_response_obj(args, kwargs))
+
+    def _encode_response(self, obj):
+        """
+        Encodes a prepared value as a JSON or MessagePack response.
+        """
+        if self.wants_msgpack():
+            response = self._app.response_class(
+                msgpack.packb(obj, default=self.default), mimetype=MSGPACK_MIMETYPE)
+            response.vary.add('Accept')
+            return response
+
+        if not self.use_orjson:
+            response = super().response(obj)
+        else:
+            option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                      | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE)
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                option |= orjson.OPT_INDENT_2
+            response = self._app.response_class(
+                orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype)
+        if self.msgpack_enabled:
+            response.vary.add('Accept')
+        return response
+
+    def raw_response(self, body):
+        """
+        Returns a response with a body already encoded as JSON.
+
+        Args:
+            body (bytes): The compact JSON encoded body, as produced by `dumps`.
+
+        Returns:
+            Response: The JSON response, or a MessagePack response if the client prefers it.
+        """
+        if self.wants_msgpack():
+            return self.response(self.loads(body))
+        response = self._app.response_class(body + b'\n', mimetype=self.mimetype)
+        if self.msgpack_enabled:
+            response.vary.add('Accept')
+        return response
+
+def init_json_provider(app):
+    """
+    Installs the JSON provider selected by the application configuration.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    provider = FastJSONProvider(app)
+    encoder = app.config.get('JSON_ENCODER', 'auto')
+    if encoder == 'stdlib':
+        provider.use_orjson = False
+    elif encoder == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER is set to orjson, but orjson is not installed.')
+    provider.msgpack_enabled = msgpack is not None and app.config.get('MSGPACK_ENABLED', True)
+    app.json = provider
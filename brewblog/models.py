@@ -14,7 +14,7 @@ class Brewery(db.Model):
     Brewery model representing a brewery entity.
 
     Attributes:
-        id (str): The unique identifier for the brewery.
+        id (str): The UUID of the brewery, in canonical form.
         name (str): The name of the brewery.
         address (str): The address of the brewery.
         phone (str): The phone number of the brewery.
@@ -25,7 +25,7 @@ class Brewery(db.Model):
     """
     __tablename__ = 'Brewery'
 
-    id = sa.Column(sa.String(36), primary_key=True)
+    id = sa.Column(sa.Uuid(as_uuid=False), primary_key=True)
     name = sa.Column(sa.String(120), index=True)
     address = sa.Column(sa.String(120))
     phone = sa.Column(sa.String(120))
@@ -69,14 +69,14 @@ class Brewery(db.Model):
         """
         Serializes the brewery object to a dictionary.
 
+        The beers are read through the `beers` relationship, so callers serializing
+        many breweries should eager load it (e.g. with `selectinload`) to avoid a
+        query per brewery.
+
         Returns:
             dict: The serialized brewery object.
         """
-        beers = db.session.execute(
-            sa.select(Beer, Style.name)
-            .join(Style, Beer.style_id == Style.id)
-            .filter(Beer.brewery_id == self.id)
-        ).all()
+        beers = self.beers
 
         return {
             "id": self.id,
@@ -89,10 +89,10 @@ class Brewery(db.Model):
             "beers": [{
                 "beer_id": beer.id,
                 "beer_name": beer.name,
-                "beer_style": style_name,
+                "beer_style": beer.style.name,
                 "beer_description": beer.description,
-            } for beer, style_name in beers],
-            "beers_count": self.get_beers_count()
+            } for beer in beers if beer.style is not None],
+            "beers_count": len(beers)
         }
 
 class Beer(db.Model):
@@ -113,11 +113,11 @@ class Beer(db.Model):
     id = sa.Column(sa.Integer, primary_key=True)
     name = sa.Column(sa.String, index=True)
     description = sa.Column(sa.String(500))
-    brewery_id = sa.Column(sa.String(36), sa.ForeignKey('Brewery.id'))
+    brewery_id = sa.Column(sa.Uuid(as_uuid=False), sa.ForeignKey('Brewery.id'), index=True)
     style_id = sa.Column(sa.Integer, sa.ForeignKey('Style.id'))
 
     brewery = relationship('Brewery', back_populates='beers')
-    style = relationship('Style')
+    style = relationship('Style', lazy='joined')
 
     def __repr__(self) -> str:
         return f'<Beer {self.name}>'
@@ -164,3 +164,186 @@ class Style(db.Model):
             "id": self.id,
             "name": self.name
         }
+
+class IdempotencyKey(db.Model):
+    """
+    IdempotencyKey model storing the response of a request sent with an Idempotency-Key header.
+
+    Attributes:
+        subject (str): The subject of the JWT that sent the request.
+        key (str): The value of the Idempotency-Key header.
+        request_hash (str): A digest of the method, path and body of the request.
+        status_code (int): The status code of the response, or None while the request is in progress.
+        body (bytes): The body of the response.
+        mimetype (str): The mimetype of the response.
+        created_at (datetime): When the key was first used.
+    """
+    __tablename__ = 'IdempotencyKey'
+
+    subject = sa.Column(sa.String(255), primary_key=True)
+    key = sa.Column(sa.String(255), primary_key=True)
+    request_hash = sa.Column(sa.String(64), nullable=False)
+    status_code = sa.Column(sa.Integer)
+    body = sa.Column(sa.LargeBinary)
+    mimetype = sa.Column(sa.String(120))
+    created_at = sa.Column(sa.DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f'<IdempotencyKey {self.key}>'
+
+class Change(db.Model):
+    """
+    Change model recording every write to a brewery or beer, in commit order.
+
+    Deleted rows are recorded as tombstones, so clients syncing incrementally
+    learn about deletions.
+
+    Attributes:
+        id (int): The sequence number of the change.
+        entity (str): The kind of entity that changed, 'brewery' or 'beer'.
+        entity_id (str): The ID of the entity that changed.
+        operation (str): 'upsert' if the entity was created or updated, 'delete' if it was deleted.
+        created_at (datetime): When the change was recorded.
+    """
+    __tablename__ = 'Change'
+
+    id = sa.Column(sa.BigInteger().with_variant(sa.Integer, 'sqlite'), primary_key=True)
+    entity = sa.Column(sa.String(20), nullable=False)
+    entity_id = sa.Column(sa.String(36), nullable=False)
+    operation = sa.Column(sa.String(10), nullable=False)
+    created_at = sa.Column(sa.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<Change {self.id} {self.operation} {self.entity} {self.entity_id}>'
+
+class BreweryDocument(db.Model):
+    """
+    BreweryDocument model storing the pre-encoded JSON representation of a brewery.
+
+    Documents are rebuilt in the same transaction as every write to the brewery
+    or its beers, so showing a brewery is a single primary key lookup.
+
+    Attributes:
+        brewery_id (str): The ID of the brewery.
+        body (bytes): The brewery, with its beers, encoded as JSON.
+        updated_at (datetime): When the document was last rebuilt.
+    """
+    __tablename__ = 'BreweryDocument'
+
+    brewery_id = sa.Column(
+        sa.Uuid(as_uuid=False), sa.ForeignKey('Brewery.id', ondelete='CASCADE'), primary_key=True)
+    body = sa.Column(sa.LargeBinary, nullable=False)
+    updated_at = sa.Column(sa.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<BreweryDocument {self.brewery_id}>'
+
+class AreaSummary(db.Model):
+    """
+    AreaSummary model holding the number of breweries and beers of each area.
+
+    Rows are updated incrementally by the write routes. Breweries without a
+    city or state are counted under an empty string.
+
+    Attributes:
+        city (str): The city of the area.
+        state (str): The state of the area.
+        brewery_count (int): The number of breweries in the area.
+        beer_count (int): The number of beers brewed in the area.
+    """
+    __tablename__ = 'AreaSummary'
+
+    city = sa.Column(sa.String(120), primary_key=True)
+    state = sa.Column(sa.String(120), primary_key=True)
+    brewery_count = sa.Column(sa.Integer, nullable=False, default=0)
+    beer_count = sa.Column(sa.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f'<AreaSummary {self.city}, {self.state}>'
+
+class AreaStyle(db.Model):
+    """
+    AreaStyle model holding the number of beers of each style brewed in each area.
+
+    Attributes:
+        city (str): The city of the area.
+        state (str): The state of the area.
+        style_id (int): The ID of the style.
+        beer_count (int): The number of beers of the style brewed in the area.
+    """
+    __tablename__ = 'AreaStyle'
+
+    city = sa.Column(sa.String(120), primary_key=True)
+    state = sa.Column(sa.String(120), primary_key=True)
+    style_id = sa.Column(sa.Integer, sa.ForeignKey('Style.id'), primary_key=True)
+    beer_count = sa.Column(sa.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f'<AreaStyle {self.city}, {self.state} {self.style_id}>'
+
+class Job(db.Model):
+    """
+    Job model representing a background job, queued by the API and run by a worker process.
+
+    Attributes:
+        id (int): The unique identifier for the job.
+        kind (str): The name of the job function.
+        params (dict): The parameters of the job function.
+        status (str): 'queued', 'running', 'succeeded' or 'failed'.
+        attempts (int): The number of times the job was started.
+        max_attempts (int): The number of attempts after which a failing job is given up.
+        progress (float): The fraction of the job done, between 0 and 1.
+        message (str): The latest progress message.
+        result (dict): The result of a succeeded job.
+        error (str): The error of the latest failed attempt.
+        created_by (str): The subject of the JWT that queued the job.
+        run_at (datetime): The earliest time the job can be started.
+        locked_by (str): The worker running the job.
+        locked_at (datetime): When the worker running the job last reported progress.
+        created_at (datetime): When the job was queued.
+        finished_at (datetime): When the job succeeded or was given up.
+    """
+    __tablename__ = 'Job'
+    __table_args__ = (sa.Index('ix_Job_status_run_at', 'status', 'run_at'),)
+
+    id = sa.Column(sa.BigInteger().with_variant(sa.Integer, 'sqlite'), primary_key=True)
+    kind = sa.Column(sa.String(50), nullable=False)
+    params = sa.Column(sa.JSON, nullable=False, default=dict)
+    status = sa.Column(sa.String(20), nullable=False, default='queued')
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    max_attempts = sa.Column(sa.Integer, nullable=False, default=3)
+    progress = sa.Column(sa.Float, nullable=False, default=0)
+    message = sa.Column(sa.String(255))
+    result = sa.Column(sa.JSON)
+    error = sa.Column(sa.Text)
+    created_by = sa.Column(sa.String(255))
+    run_at = sa.Column(sa.DateTime(timezone=True), nullable=False)
+    locked_by = sa.Column(sa.String(255))
+    locked_at = sa.Column(sa.DateTime(timezone=True))
+    created_at = sa.Column(sa.DateTime(timezone=True), nullable=False)
+    finished_at = sa.Column(sa.DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def serialize(self):
+        """
+        Serializes the job object to a dictionary.
+
+        Returns:
+            dict: The serialized job object.
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,295 @@
+"""
+This module implements sampled request profiling.
+A configurable fraction of requests, and any request carrying a valid signed
+`X-Profile` header, are profiled by a background thread sampling their stack
+at a fixed interval, which costs the request nothing between samples. Each
+profile is written in the folded stack format read by flamegraph.pl and
+speedscope, one directory per endpoint, and `flask profiles aggregate` merges
+them per route.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+# The request environ key holding the thread a request is profiled on
+PROFILE_KEY = 'brewblog.profile'
+
+def frame_name(frame):
+    """
+    Returns the name of a stack frame in a folded stack.
+
+    Args:
+        frame (frame): The frame.
+
+    Returns:
+        str: The module and qualified name of the function, without spaces or semicolons.
+    """
+    code = frame.f_code
+    name = f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+    return name.replace(';', ':').replace(' ', '_')
+
+def fold_stack(frame):
+    """
+    Folds a stack into a single line, from the outermost frame to the innermost.
+
+    Args:
+        frame (frame): The innermost frame.
+
+    Returns:
+        str: The frame names, separated by semicolons.
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    """
+    Samples the stacks of the threads being profiled, from a background thread.
+
+    Attributes:
+        interval (float): Seconds between two samples.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self, thread_id):
+        """
+        Starts sampling a thread.
+
+        Args:
+            thread_id (int): The identifier of the thread.
+
+        Returns:
+            bool: False if the thread is already being sampled.
+        """
+        with self._lock:
+            if thread_id in self._stacks:
+                return False
+            self._stacks[thread_id] = Counter()
+            # The sampling thread does not survive a fork, so each worker starts its own
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name='brewblog-profiler', daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+        return True
+
+    def stop(self, thread_id):
+        """
+        Stops sampling a thread.
+
+        Args:
+            thread_id (int): The identifier of the thread.
+
+        Returns:
+            Counter: The number of samples of each folded stack.
+        """
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                thread_ids = list(self._stacks)
+                if not thread_ids:
+                    self._wakeup.clear()
+                    continue
+            frames = sys._current_frames()  # pylint: disable=protected-access
+            samples = [(thread_id, fold_stack(frames[thread_id]))
+                       for thread_id in thread_ids if thread_id in frames]
+            del frames
+            with self._lock:
+                for thread_id, stack in samples:
+                    if thread_id in self._stacks:
+                        self._stacks[thread_id][stack] += 1
+            time.sleep(self.interval)
+
+def sign_profile_request(secret, path, timestamp=None):
+    """
+    Builds the value of the header requesting a profile of a request.
+
+    Args:
+        secret (str): The PROFILE_SECRET of the application.
+        path (str): The path of the request.
+        timestamp (int, optional): The signing time, in seconds since the epoch. Defaults to now.
+
+    Returns:
+        str: The timestamp and the signature of the path.
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode('utf-8'), f'{timestamp}:{path}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{timestamp}:{signature}'
+
+def verify_profile_request(secret, path, value, max_age):
+    """
+    Checks the header requesting a profile of a request.
+
+    Args:
+        secret (str): The PROFILE_SECRET of the application.
+        path (str): The path of the request.
+        value (str): The value of the header.
+        max_age (float): Seconds during which a signature is accepted.
+
+    Returns:
+        bool: True if the header was signed with the secret for this path, recently.
+    """
+    if not secret or not value:
+        return False
+    timestamp, _, signature = value.partition(':')
+    try:
+        if abs(time.time() - int(timestamp)) > max_age:
+            return False
+    except ValueError:
+        return False
+    expected = sign_profile_request(secret, path, int(timestamp)).partition(':')[2]
+    return hmac.compare_digest(expected, signature)
+
+def should_profile():
+    """
+    Decides whether the current request is profiled.
+
+    Returns:
+        bool: True if the request is sampled, or carries a valid profile header.
+    """
+    config = current_app.config
+    if not config.get('PROFILE_SECRET') and not config.get('PROFILE_SAMPLE_RATE'):
+        return False
+    if verify_profile_request(
+            config.get('PROFILE_SECRET'), request.path, request.headers.get(PROFILE_HEADER),
+            config.get('PROFILE_SIGNATURE_MAX_AGE', 300)):
+        return True
+    return random.random() < config.get('PROFILE_SAMPLE_RATE', 0)
+
+def start_profile():
+    """
+    Starts profiling the current request, if it is sampled.
+    """
+    if not should_profile():
+        return
+    thread_id = threading.get_ident()
+    # The sub-requests of a batch are part of the profile of the batch
+    if current_app.extensions['profiler'].start(thread_id):
+        request.environ[PROFILE_KEY] = thread_id
+
+def finish_profile(exc=None):  # pylint: disable=unused-argument
+    """
+    Stops profiling the current request, and writes its profile.
+    """
+    thread_id = request.environ.pop(PROFILE_KEY, None)
+    if thread_id is None:
+        return
+    stacks = current_app.extensions['profiler'].stop(thread_id)
+    if not stacks:
+        return
+    directory = os.path.join(current_app.config.get('PROFILE_DIR', 'profiles'),
+                             request.endpoint or 'unmatched')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{time.time_ns()}-{os.getpid()}.folded')
+        write_folded(path, stacks)
+    except OSError:
+        logger.exception('Could not write the profile of %s', request.path)
+
+def write_folded(path, stacks):
+    """
+    Writes stacks in the folded format.
+
+    Args:
+        path (str): The path of the file.
+        stacks (Counter): The number of samples of each folded stack.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+def read_folded(path):
+    """
+    Reads stacks in the folded format.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        Counter: The number of samples of each folded stack.
+    """
+    stacks = Counter()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+def aggregate_profiles(directory):
+    """
+    Merges the profiles written for each endpoint.
+
+    Args:
+        directory (str): The PROFILE_DIR the profiles were written to.
+
+    Returns:
+        dict: The number of profiles and the merged stacks of each endpoint.
+    """
+    routes = {}
+    if not os.path.isdir(directory):
+        return routes
+    for endpoint in sorted(os.listdir(directory)):
+        endpoint_dir = os.path.join(directory, endpoint)
+        if not os.path.isdir(endpoint_dir):
+            continue
+        files = [name for name in os.listdir(endpoint_dir) if name.endswith('.folded')]
+        stacks = Counter()
+        for name in files:
+            stacks.update(read_folded(os.path.join(endpoint_dir, name)))
+        if files:
+            routes[endpoint] = {'profiles': len(files), 'stacks': stacks}
+    return routes
+
+def self_time(stacks):
+    """
+    Counts the samples in which each function was running, rather than waiting on a callee.
+
+    Args:
+        stacks (Counter): The number of samples of each folded stack.
+
+    Returns:
+        Counter: The number of samples of each innermost frame.
+    """
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rpartition(';')[2]] += count
+    return leaves
+
+def init_profiling(app):
+    """
+    Creates the stack sampler of the application, and registers the hooks profiling requests.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.extensions['profiler'] = StackSampler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+    # Registered first, so the profiles include the time spent waiting for admission
+    app.before_request(start_profile)
+    app.teardown_request(finish_profile)
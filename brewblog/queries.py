@@ -0,0 +1,251 @@
+"""
+This module defines the Core statements behind the hot endpoints.
+Reads select only the needed columns and serialize the resulting rows directly,
+bypassing ORM instances (identity map, attribute instrumentation, lazy-load
+state). The output is identical to `Brewery.serialize` and `Beer.serialize`,
+unless a sparse fieldset is requested.
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from brewblog import db
+from brewblog.database import execute_pipelined, pipelining_enabled
+from brewblog.ids import parse_brewery_id
+from brewblog.models import Beer, Brewery, Style
+
+BREWERY_FIELDS = {
+    'id': Brewery.id,
+    'name': Brewery.name,
+    'address': Brewery.address,
+    'city': Brewery.city,
+    'state': Brewery.state,
+    'phone': Brewery.phone,
+    'website_link': Brewery.website_link,
+}
+
+BREWERY_EMBEDS = ('beers',)
+
+def parse_fieldset(args):
+    """
+    Parses the `fields` and `include` query parameters of a brewery request.
+
+    Without either parameter every field is returned and beers are embedded, as
+    in `Brewery.serialize`. Once either parameter is given, only the listed fields
+    (all of them if `fields` is omitted) and the listed embeds are returned.
+
+    Args:
+        args (MultiDict): The query parameters of the request.
+
+    Raises:
+        ValueError: If an unknown field or embed, or an empty field list, is requested.
+
+    Returns:
+        tuple: The requested field names, and whether beers are embedded.
+    """
+    if 'fields' not in args and 'include' not in args:
+        return tuple(BREWERY_FIELDS), True
+
+    fields = tuple(BREWERY_FIELDS)
+    if 'fields' in args:
+        fields = tuple(field for field in args['fields'].split(',') if field)
+        if not fields:
+            raise ValueError('The fields parameter lists no field.')
+        for field in fields:
+            if field not in BREWERY_FIELDS:
+                raise ValueError(f'Unknown field: {field}')
+
+    include = [embed for embed in args.get('include', '').split(',') if embed]
+    for embed in include:
+        if embed not in BREWERY_EMBEDS:
+            raise ValueError(f'Unknown include: {embed}')
+
+    return fields, 'beers' in include
+
+def brewery_beers_query(ids=None):
+    """
+    Builds the query fetching the beers of breweries.
+
+    Args:
+        ids (list, optional): The ids of the breweries. All breweries if omitted.
+
+    Returns:
+        Select: The query, with the columns read by `group_brewery_beers`.
+    """
+    beer_query = _beer_query()
+    if ids is not None:
+        beer_query = beer_query.where(Beer.brewery_id.in_(ids))
+    return beer_query
+
+def group_brewery_beers(rows):
+    """
+    Groups the rows of `brewery_beers_query` by brewery.
+
+    Args:
+        rows (iterable): The rows of the query.
+
+    Returns:
+        tuple: The serialized beers by brewery id, and the beer count by brewery id.
+    """
+    beers_by_brewery = {}
+    counts = {}
+    for beer_id, beer_name, style_name, description, brewery_id in rows:
+        counts[brewery_id] = counts.get(brewery_id, 0) + 1
+        if style_name is None:
+            continue
+        beers_by_brewery.setdefault(brewery_id, []).append({
+            "beer_id": beer_id,
+            "beer_name": beer_name,
+            "beer_style": style_name,
+            "beer_description": description,
+        })
+    return beers_by_brewery, counts
+
+def fetch_brewery_beers(ids=None):
+    """
+    Fetches the serialized beers of breweries in a single query.
+
+    Args:
+        ids (list, optional): The ids of the breweries. All breweries if omitted.
+
+    Returns:
+        tuple: The serialized beers by brewery id, and the beer count by brewery id.
+    """
+    return group_brewery_beers(db.session.execute(brewery_beers_query(ids)))
+
+def select_breweries(ids=None, fields=tuple(BREWERY_FIELDS), include_beers=True, lock=False):
+    """
+    Fetches serialized breweries, selecting only the columns that are requested.
+
+    Breweries and their beers are fetched in two queries, or a single query when
+    beers are not embedded. On psycopg 3 both queries are pipelined, in a single
+    round trip.
+
+    Args:
+        ids (list, optional): The ids of the breweries to fetch. All breweries if omitted.
+        fields (tuple): The brewery fields to serialize.
+        include_beers (bool): Whether to embed the beers and their count.
+        lock (bool): Whether to lock the brewery rows until the end of the transaction.
+
+    Returns:
+        list: (id, city, state, brewery) tuples, where brewery has the shape of `Brewery.serialize`.
+    """
+    columns = [BREWERY_FIELDS[field] for field in fields]
+    brewery_query = sa.select(Brewery.id, Brewery.city, Brewery.state, *columns)
+    if ids is not None:
+        brewery_query = brewery_query.where(Brewery.id.in_(ids))
+    if lock:
+        brewery_query = brewery_query.with_for_update()
+
+    beers_by_brewery, counts = {}, {}
+    if include_beers and pipelining_enabled(db.session.connection()):
+        rows, beer_rows = execute_pipelined([brewery_query, brewery_beers_query(ids)])
+        beers_by_brewery, counts = group_brewery_beers(beer_rows)
+    else:
+        rows = db.session.execute(brewery_query).all()
+        if include_beers and rows:
+            beers_by_brewery, counts = fetch_brewery_beers(ids)
+
+    breweries = []
+    for brewery_id, city, state, *values in rows:
+        brewery = dict(zip(fields, values))
+        if include_beers:
+            brewery["beers"] = beers_by_brewery.get(brewery_id, [])
+            brewery["beers_count"] = counts.get(brewery_id, 0)
+        breweries.append((brewery_id, city, state, brewery))
+    return breweries
+
+def fetch_breweries(ids=None, fields=tuple(BREWERY_FIELDS), include_beers=True):
+    """
+    Fetches serialized breweries, selecting only the columns that are requested.
+
+    Args:
+        ids (list, optional): The ids of the breweries to fetch. All breweries if omitted.
+        fields (tuple): The brewery fields to serialize.
+        include_beers (bool): Whether to embed the beers and their count.
+
+    Returns:
+        list: The serialized breweries, in the same shape as `Brewery.serialize`.
+    """
+    return [brewery for _, _, _, brewery in select_breweries(ids, fields, include_beers)]
+
+def lookup_breweries(ids, fields=tuple(BREWERY_FIELDS), include_beers=True):
+    """
+    Fetches serialized breweries by id, in a fixed number of queries.
+
+    Ids that are not UUIDs cannot exist, and are reported as not found.
+
+    Args:
+        ids (list): The ids of the breweries, in the order they are returned.
+        fields (tuple): The brewery fields to serialize.
+        include_beers (bool): Whether to embed the beers and their count.
+
+    Returns:
+        tuple: The breweries found, in the order of `ids`, and the ids that were not found.
+    """
+    # Requested ids by canonical form, so differently cased duplicates are collapsed
+    requested = {}
+    for brewery_id in ids:
+        requested.setdefault(parse_brewery_id(brewery_id) or brewery_id, brewery_id)
+    valid_ids = [key for key, brewery_id in requested.items() if parse_brewery_id(brewery_id)]
+    found = {
+        brewery_id: brewery
+        for brewery_id, _, _, brewery in select_breweries(valid_ids, fields, include_beers)}
+    return (
+        [found[key] for key in requested if key in found],
+        [brewery_id for key, brewery_id in requested.items() if key not in found])
+
+def _serialize_beer_rows(rows):
+    return [{
+        "id": beer_id,
+        "name": name,
+        "style": style_name,
+        "description": description,
+        "brewery_id": beer_brewery_id
+    } for beer_id, name, style_name, description, beer_brewery_id in rows]
+
+def _beer_query():
+    return (
+        sa.select(Beer.id, Beer.name, Style.name, Beer.description, Beer.brewery_id)
+        .outerjoin(Style, Beer.style_id == Style.id))
+
+def fetch_beers_for_brewery(brewery_id):
+    """
+    Fetches the serialized beers of a brewery in a single query.
+
+    Args:
+        brewery_id (str): The ID of the brewery.
+
+    Returns:
+        list: The serialized beers, in the same shape as `Beer.serialize`.
+    """
+    return _serialize_beer_rows(db.session.execute(
+        _beer_query().where(Beer.brewery_id == brewery_id)))
+
+def fetch_beers(ids=None):
+    """
+    Fetches serialized beers in a single query.
+
+    Args:
+        ids (list, optional): The ids of the beers to fetch. All beers if omitted.
+
+    Returns:
+        list: The serialized beers, in the same shape as `Beer.serialize`.
+    """
+    query = _beer_query()
+    if ids is not None:
+        query = query.where(Beer.id.in_(ids))
+    return _serialize_beer_rows(db.session.execute(query))
+
+def dialect_insert(model):
+    """
+    Creates an INSERT statement supporting ON CONFLICT on the current database.
+
+    Args:
+        model (Model): The model to insert into.
+
+    Returns:
+        Insert: The dialect specific INSERT statement.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return sqlite.insert(model)
+    return postgresql.insert(model)
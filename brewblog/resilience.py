@@ -0,0 +1,302 @@
+"""
+This module keeps the read routes available while the database is not.
+Read views marked with the `stale_if_error` decorator keep the last good
+response of each request. When the database cannot be reached they serve it,
+for up to `STALE_IF_ERROR_MAX_AGE` seconds, with `Warning` and `Age` headers.
+A circuit breaker counts the failed connections: once it opens, requests stop
+reaching the database and get the stale response or a fast 503 instead. After
+`CIRCUIT_RESET_TIMEOUT` seconds, a single request is let through to probe
+whether the database recovered.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+import sqlalchemy as sa
+from brewblog import db
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# The request environ key holding how the circuit breaker let a request through
+CIRCUIT_KEY = 'brewblog.circuit'
+
+# Endpoints that do not need the database, or that check it themselves
+EXEMPT_ENDPOINTS = ('ready', 'stream.stream', 'batch.batch', 'static')
+
+# Errors of the database, rather than of the request, that a stale response can stand in for
+DATABASE_ERRORS = (sa.exc.OperationalError, sa.exc.InterfaceError)
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+class CircuitBreaker:
+    """
+    Stops requests from reaching the database after consecutive connection failures.
+
+    Attributes:
+        failure_threshold (int): The number of consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a probe is let through.
+        state (str): CLOSED, OPEN or HALF_OPEN.
+        failures (int): The number of consecutive failures.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Decides whether a request may use the database.
+
+        Returns:
+            str: CLOSED if it may, HALF_OPEN if it is the probe of an open circuit,
+                or None if it may not.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return CLOSED
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return HALF_OPEN
+            return None
+
+    def retry_after(self):
+        """
+        Returns the number of seconds until the next probe.
+
+        Returns:
+            int: The delay, at least 1.
+        """
+        with self._lock:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        return max(math.ceil(remaining), 1)
+
+    def record_success(self):
+        """
+        Records a statement that reached the database, closing the circuit.
+        """
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """
+        Records a failed connection, opening the circuit after too many of them.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """
+        Lets another request probe the database, when the probe did not use it.
+        """
+        with self._lock:
+            self._probing = False
+
+class StaleResponseStore:
+    """
+    Keeps the last good response of each read request, within a number of
+    requests and a size budget, evicting the least recently used first.
+
+    Attributes:
+        max_age (float): Seconds during which a response can be served stale. 0 disables the store.
+        max_entries (int): The maximum number of responses kept.
+        max_bytes (int): The maximum total size of the bodies kept, or 0 if unbounded.
+        size (int): The total size of the bodies kept.
+    """
+    def __init__(self, max_age, max_entries, max_bytes=0):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, response):
+        """
+        Keeps a copy of a response.
+
+        Args:
+            key (tuple): The request the response answers.
+            response (Response): The response, before it is compressed.
+        """
+        if self.max_age <= 0 or response.status_code != 200 or response.is_streamed:
+            return
+        body = response.get_data()
+        headers = {name: value for name, value in response.headers.items()
+                   if name in ('Content-Type', 'Vary')}
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            if self.max_bytes and len(body) > self.max_bytes:
+                # It would evict every other response
+                return
+            self._entries[key] = (time.time(), body, headers)
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes and self.size > self.max_bytes):
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get(self, key):
+        """
+        Builds a stale response from the last good response of a request.
+
+        Args:
+            key (tuple): The request.
+
+        Returns:
+            Response: The response with `Warning` and `Age` headers, or None if
+                there is none younger than `max_age`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return None
+        stored_at, body, headers = entry
+        age = time.time() - stored_at
+        if age > self.max_age:
+            return None
+        response = current_app.response_class(body, status=200, headers=headers)
+        response.headers['Age'] = str(int(age))
+        response.headers['Warning'] = STALE_WARNING
+        return response
+
+def request_key():
+    """
+    Returns the key of the current request in the stale response store.
+
+    Returns:
+        tuple: The path with its query string, and the media types the client accepts.
+    """
+    return request.full_path, request.headers.get('Accept', '')
+
+def database_unavailable():
+    """
+    Builds the 503 response of a request that needs the database while it is unavailable.
+
+    Returns:
+        Response: The response, telling the client when to retry.
+    """
+    response = jsonify({'error': 'The database is unavailable, please retry later.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.extensions['circuit_breaker'].retry_after())
+    return response
+
+def stale_if_error(f):
+    """
+    Decorator serving the last good response of a read view when the database is unavailable.
+
+    Args:
+        f (function): The view function.
+
+    Returns:
+        function: The decorated function.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        store = current_app.extensions['stale_responses']
+        key = request_key()
+        if request.environ.get(CIRCUIT_KEY, CLOSED) is None:
+            # The circuit is open: the database is not tried
+            return store.get(key) or database_unavailable()
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except DATABASE_ERRORS:
+            db.session.rollback()
+            return store.get(key) or database_unavailable()
+        store.put(key, response)
+        return response
+    wrapper.stale_if_error = True
+    return wrapper
+
+def guard_request():
+    """
+    Keeps requests from reaching the database while the circuit is open.
+
+    Returns:
+        Response: A 503 response, or None if the request proceeds.
+    """
+    # Requests matching no route still get their 404, or 405
+    if (request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS
+            or CIRCUIT_KEY in request.environ):
+        return None
+    allowed = current_app.extensions['circuit_breaker'].allow()
+    request.environ[CIRCUIT_KEY] = allowed
+    view = current_app.view_functions.get(request.endpoint)
+    if allowed is None and not getattr(view, 'stale_if_error', False):
+        return database_unavailable()
+    return None
+
+def finish_probe(exc=None):  # pylint: disable=unused-argument
+    """
+    Frees the probe of a half-open circuit, if the request holding it did not use the database.
+    """
+    if request.environ.get(CIRCUIT_KEY) == HALF_OPEN:
+        breaker = current_app.extensions['circuit_breaker']
+        if breaker.state == HALF_OPEN:
+            breaker.release_probe()
+        request.environ[CIRCUIT_KEY] = CLOSED
+
+def handle_database_error(error):  # pylint: disable=unused-argument
+    """
+    Handles the database errors of the views without a stale response.
+
+    Returns:
+        Response: A 503 response.
+    """
+    db.session.rollback()
+    return database_unavailable()
+
+def init_resilience(app):
+    """
+    Creates the circuit breaker and the stale response store of the application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    config = app.config
+    breaker = CircuitBreaker(
+        config.get('CIRCUIT_FAILURE_THRESHOLD', 5), config.get('CIRCUIT_RESET_TIMEOUT', 5.0))
+    app.extensions['circuit_breaker'] = breaker
+    app.extensions['stale_responses'] = StaleResponseStore(
+        config.get('STALE_IF_ERROR_MAX_AGE', 300), config.get('STALE_IF_ERROR_MAX_ENTRIES', 256),
+        config.get('STALE_IF_ERROR_MAX_BYTES', 16 * 1024 * 1024))
+
+    def after_cursor_execute(*args):  # pylint: disable=unused-argument
+        breaker.record_success()
+
+    def handle_error(exception_context):
+        # Only lost and refused connections count, not failed statements
+        if exception_context.is_disconnect or exception_context.connection is None:
+            breaker.record_failure()
+
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    sa.event.listen(engine, 'handle_error', handle_error)
+    if config.get('CIRCUIT_BREAKER_ENABLED', True):
+        app.before_request(guard_request)
+        app.teardown_request(finish_probe)
+    for error in DATABASE_ERRORS:
+        app.register_error_handler(error, handle_database_error)
@@ -0,0 +1,225 @@
+"""
+This module logs slow SQL statements issued by the application.
+It hooks into SQLAlchemy's cursor execution events to time each statement,
+and can optionally capture an EXPLAIN (ANALYZE, BUFFERS) plan for slow
+SELECT statements on a background thread. Locking reads only get a plain
+EXPLAIN, since ANALYZE would take their row locks again.
+"""
+
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from flask import has_request_context, request
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+_explain_state = threading.local()
+
+# The row locking clauses of a SELECT statement
+LOCKING_CLAUSE = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b', re.IGNORECASE)
+
+def redact_parameters(parameters):
+    """
+    Replaces bound parameter values with their type names.
+
+    Args:
+        parameters (dict | list | tuple | None): The DBAPI parameters of a statement.
+
+    Returns:
+        dict | list | None: The parameters with every value redacted.
+    """
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: f'<{type(value).__name__}>' for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(value) if isinstance(value, (dict, list, tuple))
+                else f'<{type(value).__name__}>' for value in parameters]
+    return f'<{type(parameters).__name__}>'
+
+def current_route():
+    """
+    Describes the request that issued the current statement.
+
+    Returns:
+        str | None: The method, path and endpoint of the request, if any.
+    """
+    if not has_request_context():
+        return None
+    return f'{request.method} {request.path} ({request.endpoint})'
+
+def explain_statement(statement):
+    """
+    Builds the EXPLAIN statement capturing the plan of a slow statement.
+
+    ANALYZE executes the statement, which for a locking read would take the row
+    locks of the request again, or wait behind it, so those are only planned.
+
+    Args:
+        statement (str): The SELECT statement.
+
+    Returns:
+        str: The EXPLAIN statement.
+    """
+    if LOCKING_CLAUSE.search(statement):
+        return f'EXPLAIN {statement}'
+    return f'EXPLAIN (ANALYZE, BUFFERS) {statement}'
+
+class SlowQueryLog:
+    """
+    Times SQL statements on an engine and logs the ones over a threshold.
+
+    Attributes:
+        engine (Engine): The engine whose statements are timed.
+        threshold (float): The threshold in seconds above which a statement is logged.
+        explain (bool): Whether to capture EXPLAIN plans for slow SELECT statements.
+        explain_interval (float): The minimum number of seconds between two plan captures
+            of the same statement.
+        explain_global_interval (float): The minimum number of seconds between two plan captures.
+    """
+    def __init__(self, engine, threshold_ms, explain=False, explain_interval=60.0,
+                 explain_global_interval=5.0):
+        self.engine = engine
+        self.threshold = threshold_ms / 1000.0
+        self.explain = explain and engine.dialect.name == 'postgresql'
+        self.explain_interval = explain_interval
+        self.explain_global_interval = explain_global_interval
+        self._last_explain = None
+        self._explained = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=16)
+        self._worker_pid = None
+
+    def register(self):
+        """
+        Registers the timing listeners on the engine.
+        """
+        sa.event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        sa.event.listen(self.engine, 'after_cursor_execute', self.after_cursor_execute)
+        sa.event.listen(self.engine, 'handle_error', self.handle_error)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Records the start time of a statement on the connection.
+        """
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Logs the statement if it ran for longer than the threshold.
+        """
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        if duration < self.threshold or getattr(_explain_state, 'active', False):
+            return
+
+        logger.warning(
+            'Slow query (%.1f ms) from %s: %s; parameters=%s',
+            duration * 1000.0,
+            current_route() or 'no request',
+            statement,
+            redact_parameters(parameters))
+
+        if self.explain and not executemany and self._should_explain(statement):
+            self._enqueue_explain(statement, parameters)
+
+    def handle_error(self, exception_context):
+        """
+        Discards the start time of a failed statement.
+        """
+        conn = exception_context.connection
+        start_times = conn.info.get('query_start_time') if conn is not None else None
+        if start_times:
+            start_times.pop()
+
+    def _should_explain(self, statement):
+        """
+        Applies the rate limit to plan captures.
+
+        A plan is captured at most once per `explain_global_interval` overall,
+        and each distinct statement at most once per `explain_interval`. ANALYZE
+        executes the statement, so only SELECT statements are ever explained,
+        and locking reads without it (see `explain_statement`).
+
+        Args:
+            statement (str): The SQL statement.
+
+        Returns:
+            bool: True if a plan should be captured for the statement.
+        """
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if (self._last_explain is not None
+                    and now - self._last_explain < self.explain_global_interval):
+                return False
+            if statement in self._explained and now - self._explained[statement] < self.explain_interval:
+                return False
+            self._last_explain = now
+            self._explained[statement] = now
+            if len(self._explained) > 1024:
+                self._explained.clear()
+        return True
+
+    def _enqueue_explain(self, statement, parameters):
+        """
+        Hands a statement to the background plan capture thread.
+
+        Args:
+            statement (str): The SQL statement.
+            parameters (dict | tuple): The DBAPI parameters of the statement.
+        """
+        with self._lock:
+            # The capture thread does not survive a fork, so each worker starts its own
+            if self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                threading.Thread(
+                    target=self._explain_worker, name='slow-query-explain', daemon=True).start()
+        try:
+            self._queue.put_nowait((statement, parameters))
+        except queue.Full:
+            pass
+
+    def _explain_worker(self):
+        """
+        Captures and logs plans for queued statements on a dedicated connection.
+        """
+        _explain_state.active = True
+        while True:
+            statement, parameters = self._queue.get()
+            try:
+                with self.engine.connect() as conn:
+                    plan = conn.exec_driver_sql(
+                        explain_statement(statement), parameters).scalars().all()
+                    conn.rollback()
+                logger.warning('Plan for slow query: %s\n%s', statement, '\n'.join(plan))
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Unable to capture plan for slow query: %s', statement)
+
+def register_slow_query_log(app, engine):
+    """
+    Enables slow query logging on an engine if a threshold is configured.
+
+    Args:
+        app (Flask): The Flask application instance.
+        engine (Engine): The engine whose statements are timed.
+
+    Returns:
+        SlowQueryLog | None: The registered slow query log, if enabled.
+    """
+    threshold_ms = float(app.config.get('SLOW_QUERY_THRESHOLD_MS') or 0)
+    if threshold_ms <= 0:
+        return None
+
+    slow_query_log = SlowQueryLog(
+        engine,
+        threshold_ms,
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', False),
+        explain_interval=float(app.config.get('SLOW_QUERY_EXPLAIN_INTERVAL', 60)),
+        explain_global_interval=float(app.config.get('SLOW_QUERY_EXPLAIN_GLOBAL_INTERVAL', 5)))
+    slow_query_log.register()
+    return slow_query_log
@@ -0,0 +1,10 @@
+"""
+This module initializes the Blueprint for the Stream API routes.
+It sets up the blueprint and imports the routes to register them with the blueprint.
+"""
+
+from flask import Blueprint
+
+bp = Blueprint('stream', __name__)
+
+from brewblog.stream import routes
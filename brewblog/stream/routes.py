@@ -0,0 +1,138 @@
+"""
+This module defines the routes for the Stream API.
+It includes a server-sent events endpoint pushing brewery and beer changes as
+they are committed, so dashboards do not have to poll the listing endpoints.
+"""
+
+import queue
+import time
+from flask import Response, current_app, jsonify, request, stream_with_context
+import sqlalchemy as sa
+from brewblog import db
+from brewblog.stream import bp
+from brewblog.auth import requires_auth
+from brewblog.error_handlers import register_error_handlers
+from brewblog.models import Change
+
+register_error_handlers(bp)
+
+# Milliseconds the client waits before reconnecting after the stream closes
+RECONNECT_DELAY_MS = 3000
+
+def format_event(event, dumps):
+    """
+    Formats a change event as a server-sent event frame.
+
+    Args:
+        event (dict): The change event.
+        dumps (callable): Serializes the event data to JSON.
+
+    Returns:
+        str: The event frame.
+    """
+    return f'id: {event["id"]}\nevent: change\ndata: {dumps(event)}\n\n'
+
+def read_backlog(last_event_id, limit):
+    """
+    Reads the changes recorded after the last event a client received.
+
+    Args:
+        last_event_id (int): The ID of the last event received.
+        limit (int): The maximum number of changes to read.
+
+    Returns:
+        list: The change events, in sequence order.
+    """
+    rows = db.session.execute(
+        sa.select(Change.id, Change.entity, Change.entity_id, Change.operation, Change.created_at)
+        .where(Change.id > last_event_id)
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+    return [{
+        'id': row.id,
+        'entity': row.entity,
+        'entity_id': row.entity_id,
+        'operation': row.operation,
+        'ts': row.created_at.timestamp()
+    } for row in rows]
+
+@bp.route('/api/stream')
+@requires_auth('get:breweries')
+def stream(payload):
+    """
+    Endpoint streaming brewery and beer change events.
+
+    Clients resuming a stream send the ID of the last event they received in
+    the `Last-Event-ID` header, or the `last_event_id` query parameter, and
+    first receive the changes they missed. If they missed too many, a single
+    `resync` event asks them to sync through `/api/sync` instead. Once the
+    worker holds `STREAM_MAX_CONNECTIONS` streams, new ones are rejected with a 503.
+
+    Args:
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The event stream.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID.'}), 400
+
+    config = current_app.config
+    feed = current_app.extensions['change_feed']
+    dumps = current_app.json.dumps
+    heartbeat = config['STREAM_HEARTBEAT_SECONDS']
+    max_pending = config['STREAM_MAX_PENDING']
+    deadline = time.monotonic() + config['STREAM_MAX_DURATION']
+
+    # Subscribe before reading the backlog, so no change falls between the two
+    subscription = feed.subscribe()
+    if subscription is None:
+        # Streams are exempt from admission, so this bounds the threads they hold
+        response = jsonify({'error': 'Too many open streams, please retry later.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(config['STREAM_RETRY_AFTER'])
+        return response
+    backlog = []
+    if last_event_id is not None:
+        try:
+            backlog = read_backlog(last_event_id, max_pending)
+        except Exception:
+            feed.unsubscribe(subscription)
+            raise
+        finally:
+            # Do not hold a pooled connection for the life of the stream
+            db.session.close()
+
+    def generate():
+        try:
+            yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+            if len(backlog) > max_pending:
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            sent = set()
+            for event in backlog:
+                sent.add(event['id'])
+                yield format_event(event, dumps)
+
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = subscription.get(min(heartbeat, remaining))
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if event['id'] not in sent:
+                    yield format_event(event, dumps)
+        finally:
+            feed.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
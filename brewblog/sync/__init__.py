@@ -0,0 +1,10 @@
+"""
+This module initializes the Blueprint for the Sync API routes.
+It sets up the blueprint and imports the routes to register them with the blueprint.
+"""
+
+from flask import Blueprint
+
+bp = Blueprint('sync', __name__)
+
+from brewblog.sync import routes
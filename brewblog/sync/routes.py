@@ -0,0 +1,75 @@
+"""
+This module defines the routes for the Sync API.
+It includes an endpoint returning the breweries and beers that changed since a
+sync token, so clients can keep a local copy up to date incrementally.
+"""
+
+from flask import current_app, request, jsonify
+from brewblog.sync import bp
+from brewblog.auth import requires_auth
+from brewblog.changes import read_changes, settled_sequence
+from brewblog.error_handlers import register_error_handlers
+from brewblog.queries import fetch_beers, fetch_breweries
+
+register_error_handlers(bp)
+
+@bp.route('/api/sync')
+@requires_auth('get:breweries')
+def sync(payload):
+    """
+    Endpoint to get the breweries and beers changed since a sync token.
+
+    Without a `since` token, every brewery and beer is returned. Breweries are
+    returned without their beers, which are synced separately.
+
+    Args:
+        payload (dict): The JWT payload containing user information.
+
+    Returns:
+        Response: The JSON response with the changed and deleted entities and a new token.
+    """
+    since = request.args.get('since')
+
+    if not since:
+        # Taken before the data, so changes committed meanwhile are synced again
+        token = settled_sequence(current_app.config.get('SYNC_SETTLE_SECONDS', 5))
+        return jsonify({
+            'token': str(token),
+            'breweries': fetch_breweries(include_beers=False),
+            'beers': fetch_beers(),
+            'deleted': {'breweries': [], 'beers': []},
+            'has_more': False
+        })
+
+    try:
+        since = int(since)
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f'Invalid sync token: {since}'}), 400
+
+    changes, token, has_more = read_changes(
+        since,
+        current_app.config.get('SYNC_PAGE_SIZE', 1000),
+        current_app.config.get('SYNC_SETTLE_SECONDS', 5))
+
+    brewery_ids = {change.entity_id for change in changes if change.entity == 'brewery'}
+    beer_ids = {int(change.entity_id) for change in changes if change.entity == 'beer'}
+
+    breweries = fetch_breweries(list(brewery_ids), include_beers=False) if brewery_ids else []
+    beers = fetch_beers(list(beer_ids)) if beer_ids else []
+
+    # Entities that changed but no longer exist were deleted
+    deleted_breweries = brewery_ids - {brewery['id'] for brewery in breweries}
+    deleted_beers = beer_ids - {beer['id'] for beer in beers}
+
+    return jsonify({
+        'token': str(token),
+        'breweries': breweries,
+        'beers': beers,
+        'deleted': {
+            'breweries': sorted(deleted_breweries),
+            'beers': sorted(deleted_beers)
+        },
+        'has_more': has_more
+    })
@@ -0,0 +1,361 @@
+"""
+This module implements request tracing.
+When `TRACE_ENABLED` is set, each request records a trace made of a server
+span and child spans for token verification, each SQL statement, the view,
+serialization and response encoding. Traces continue the W3C `traceparent`
+header of incoming requests, and are exported as Zipkin v2 JSON, one trace
+per line, to a file or stdout, so no collector is needed to read them and any
+Zipkin compatible collector can ingest them.
+"""
+
+import contextvars
+import json
+import logging
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, request
+import sqlalchemy as sa
+from brewblog import db
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+TRACERESPONSE_HEADER = 'traceresponse'
+
+TRACEPARENT_PATTERN = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+
+# The request environ key holding the server span of a request
+TRACE_KEY = 'brewblog.trace'
+
+_current_span = contextvars.ContextVar('brewblog_span', default=None)
+
+class Trace:
+    """
+    The spans of a request, collected as they finish.
+
+    Attributes:
+        trace_id (str): The 32 hex digit ID shared by the spans of the trace.
+        spans (list): The finished spans.
+    """
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+        trace (Trace): The trace of the span.
+        name (str): The name of the operation.
+        span_id (str): The 16 hex digit ID of the span.
+        parent_id (str): The ID of the parent span, or None for a root span.
+        kind (str): The Zipkin kind of the span, such as 'SERVER' or 'CLIENT', or None.
+        tags (dict): The string tags of the span.
+    """
+    def __init__(self, trace, name, parent_id=None, kind=None, tags=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.tags = {}
+        self.timestamp = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+        for key, value in (tags or {}).items():
+            self.tag(key, value)
+
+    def tag(self, key, value):
+        """
+        Sets a tag of the span.
+
+        Args:
+            key (str): The name of the tag.
+            value (object): The value, converted to a string.
+        """
+        self.tags[key] = str(value)
+
+    def finish(self):
+        """
+        Ends the span and adds it to its trace.
+        """
+        self.duration = time.perf_counter() - self._start
+        self.trace.spans.append(self)
+
+    def to_zipkin(self, service_name):
+        """
+        Converts the span to the Zipkin v2 JSON model.
+
+        Args:
+            service_name (str): The name of the service recording the span.
+
+        Returns:
+            dict: The span.
+        """
+        span = {
+            'traceId': self.trace.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': int(self.timestamp * 1_000_000),
+            'duration': max(int(self.duration * 1_000_000), 1),
+            'localEndpoint': {'serviceName': service_name},
+            'tags': self.tags,
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        return span
+
+@contextmanager
+def span(name, **tags):
+    """
+    Records a child span of the current span, if the request is traced.
+
+    Args:
+        name (str): The name of the operation.
+        **tags: The tags of the span.
+
+    Yields:
+        Span: The span, or None if the request is not traced.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, tags=tags)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.tag('error', type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+def parse_traceparent(value):
+    """
+    Parses a W3C traceparent header.
+
+    Args:
+        value (str): The value of the header.
+
+    Returns:
+        tuple: The trace ID, the parent span ID and whether the trace is sampled,
+            or None if the header is missing or invalid.
+    """
+    match = TRACEPARENT_PATTERN.match(value or '')
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    if (version == 'ff' or (version == '00' and rest)
+            or trace_id == '0' * 32 or parent_id == '0' * 16):
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+def format_traceparent(current):
+    """
+    Formats the W3C traceparent header of a span.
+
+    Args:
+        current (Span): The span.
+
+    Returns:
+        str: The header value.
+    """
+    return f'00-{current.trace.trace_id}-{current.span_id}-01'
+
+def trace_headers():
+    """
+    Returns the headers propagating the current trace to a sub-request.
+
+    Returns:
+        dict: The traceparent header, or nothing if the request is not traced.
+    """
+    current = _current_span.get()
+    return {} if current is None else {TRACEPARENT_HEADER: format_traceparent(current)}
+
+class TraceExporter:
+    """
+    Writes traces as Zipkin v2 JSON, one trace per line.
+
+    Attributes:
+        output (str): The path of the file traces are appended to, or '-' for stdout.
+        service_name (str): The service name of the spans.
+    """
+    def __init__(self, output, service_name):
+        self.output = output
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        """
+        Writes a trace.
+
+        Args:
+            trace (Trace): The trace.
+        """
+        line = json.dumps([s.to_zipkin(self.service_name) for s in trace.spans]) + '\n'
+        with self._lock:
+            try:
+                if self.output == '-':
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                else:
+                    with open(self.output, 'a', encoding='utf-8') as f:
+                        f.write(line)
+            except OSError:
+                logger.exception('Could not export trace %s', trace.trace_id)
+
+def start_request_trace():
+    """
+    Starts the server span of the current request, if it is sampled.
+
+    Requests continue the trace of their traceparent header, and follow its
+    sampling decision.
+    """
+    incoming = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+    if incoming is not None:
+        trace_id, parent_id, sampled = incoming
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = random.random() < current_app.config.get('TRACE_SAMPLE_RATE', 1.0)
+    if not sampled:
+        return
+
+    root = Span(Trace(trace_id), f'{request.method} {request.endpoint or "unmatched"}',
+                parent_id, kind='SERVER', tags={
+                    'http.method': request.method,
+                    'http.path': request.path,
+                })
+    if request.url_rule is not None:
+        root.tag('http.route', request.url_rule.rule)
+    for name, value in (request.view_args or {}).items():
+        # brewery_id is tagged brewery.id
+        root.tag(name[:-3] + '.id' if name.endswith('_id') else name, value)
+    request.environ[TRACE_KEY] = (root, _current_span.set(root))
+
+def tag_response(response):
+    """
+    Tags the server span with the status code, and returns its traceparent to the client.
+    """
+    entry = request.environ.get(TRACE_KEY)
+    if entry is not None:
+        root = entry[0]
+        root.tag('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            root.tag('error', str(response.status_code))
+        response.headers[TRACERESPONSE_HEADER] = format_traceparent(root)
+    return response
+
+def finish_request_trace(exc=None):
+    """
+    Ends the server span of the current request, and exports its trace.
+    """
+    entry = request.environ.pop(TRACE_KEY, None)
+    if entry is None:
+        return
+    root, token = entry
+    if exc is not None:
+        root.tag('error', type(exc).__name__)
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # The request was torn down in another context than it started in
+        _current_span.set(None)
+    root.finish()
+    current_app.extensions['trace_exporter'].export(root.trace)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+    """
+    Starts a span for a SQL statement issued by a traced request.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+    conn.info.setdefault('trace_spans', []).append(Span(
+        parent.trace, f'sql {operation}', parent.span_id, kind='CLIENT', tags={
+            'db.system': conn.dialect.name,
+            'db.statement': statement,
+        }))
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+    """
+    Ends the span of a SQL statement.
+    """
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().finish()
+
+def handle_error(exception_context):
+    """
+    Ends the span of a failed SQL statement.
+    """
+    conn = exception_context.connection
+    spans = conn.info.get('trace_spans') if conn is not None else None
+    if spans:
+        failed = spans.pop()
+        failed.tag('error', type(exception_context.original_exception).__name__)
+        failed.finish()
+
+def trace_view(endpoint, view):
+    """
+    Wraps a view function in a span.
+
+    Args:
+        endpoint (str): The endpoint of the view.
+        view (function): The view function.
+
+    Returns:
+        function: The wrapped view function.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with span(f'view {endpoint}'):
+            return view(*args, **kwargs)
+    return wrapper
+
+def instrument_views(app):
+    """
+    Wraps the views of the application in spans, once its blueprints are registered.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    if not app.config.get('TRACE_ENABLED', False):
+        return
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint != 'static':
+            app.view_functions[endpoint] = trace_view(endpoint, view)
+
+def init_tracing(app):
+    """
+    Registers request tracing on the application, when enabled.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    config = app.config
+    if not config.get('TRACE_ENABLED', False):
+        return
+    app.extensions['trace_exporter'] = TraceExporter(
+        config.get('TRACE_OUTPUT', 'traces.jsonl'), config.get('TRACE_SERVICE_NAME', 'brewblog'))
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    sa.event.listen(engine, 'handle_error', handle_error)
+    # Registered first, so the server span covers the other hooks, and its
+    # response hook and teardown run last
+    app.before_request(start_request_trace)
+    app.after_request(tag_response)
+    app.teardown_request(finish_request_trace)
@@ -0,0 +1,48 @@
+"""
+This module warms up a worker before it accepts requests.
+Startup only does what every request needs; the rest is deferred to first use.
+The warmup then pays those first-use costs ahead of traffic, so the first
+requests of a freshly started worker are as fast as the next ones: it imports
+the JWT libraries, fetches the JWKS of the Auth0 tenant and caches the styles.
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+def warm_up(app):
+    """
+    Pre-populates the caches of a worker. Failures are logged, and the worker
+    starts anyway, filling the caches on first use instead.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        float: The duration of the warmup, in seconds.
+    """
+    started = time.perf_counter()
+    if not app.config.get('WARMUP_ENABLED', True) or os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        # CLI commands, such as `flask db upgrade`, do not serve requests
+        return 0.0
+
+    from jose import jwt  # pylint: disable=unused-import
+    from brewblog.auth import get_jwks
+    from brewblog.beer.routes import cached_styles
+
+    with app.app_context():
+        if os.getenv('FLASK_ENV') != 'testing':
+            try:
+                get_jwks()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Could not fetch the JWKS during warmup')
+        try:
+            cached_styles()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Could not cache the styles during warmup')
+
+    elapsed = time.perf_counter() - started
+    logger.info('Worker warmed up in %.0fms', elapsed * 1000)
+    return elapsed
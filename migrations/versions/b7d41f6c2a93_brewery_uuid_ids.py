@@ -0,0 +1,73 @@
+"""brewery uuid ids
+
+Revision ID: b7d41f6c2a93
+Revises: 2d9e4a7b1c53
+Create Date: 2026-10-19 16:02:37.918245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41f6c2a93'
+down_revision = '2d9e4a7b1c53'
+branch_labels = None
+depends_on = None
+
+# The columns holding brewery ids
+BREWERY_ID_COLUMNS = [('Brewery', 'id'), ('Beer', 'brewery_id'), ('BreweryDocument', 'brewery_id')]
+
+FOREIGN_KEYS = [
+    ('Beer_brewery_id_fkey', 'Beer', {}),
+    ('BreweryDocument_brewery_id_fkey', 'BreweryDocument', {'ondelete': 'CASCADE'}),
+]
+
+
+def upgrade():
+    # Fails on the first brewery id that is not a UUID, which must be fixed beforehand
+    if op.get_context().dialect.name == 'postgresql':
+        for name, table, _ in FOREIGN_KEYS:
+            op.drop_constraint(name, table, type_='foreignkey')
+        for table, column in BREWERY_ID_COLUMNS:
+            op.alter_column(
+                table, column,
+                existing_type=sa.String(length=36),
+                type_=sa.Uuid(),
+                postgresql_using=f'"{column}"::uuid')
+        for name, table, options in FOREIGN_KEYS:
+            op.create_foreign_key(name, table, 'Brewery', ['brewery_id'], ['id'], **options)
+    else:
+        # Other databases store UUIDs as 32 lowercase hex digits
+        for table, column in BREWERY_ID_COLUMNS:
+            op.execute(f'UPDATE "{table}" SET "{column}" = lower(replace("{column}", \'-\', \'\'))')
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.alter_column(column, existing_type=sa.String(length=36), type_=sa.Uuid())
+
+    with op.batch_alter_table('Beer', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_Beer_brewery_id'), ['brewery_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Beer', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_Beer_brewery_id'))
+
+    if op.get_context().dialect.name == 'postgresql':
+        for name, table, _ in FOREIGN_KEYS:
+            op.drop_constraint(name, table, type_='foreignkey')
+        for table, column in BREWERY_ID_COLUMNS:
+            op.alter_column(
+                table, column,
+                existing_type=sa.Uuid(),
+                type_=sa.String(length=36),
+                postgresql_using=f'"{column}"::text')
+        for name, table, options in FOREIGN_KEYS:
+            op.create_foreign_key(name, table, 'Brewery', ['brewery_id'], ['id'], **options)
+    else:
+        for table, column in BREWERY_ID_COLUMNS:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.alter_column(column, existing_type=sa.Uuid(), type_=sa.String(length=36))
+            op.execute(
+                f'UPDATE "{table}" SET "{column}" = substr("{column}", 1, 8) || \'-\' || '
+                f'substr("{column}", 9, 4) || \'-\' || substr("{column}", 13, 4) || \'-\' || '
+                f'substr("{column}", 17, 4) || \'-\' || substr("{column}", 21, 12)')
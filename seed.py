@@ -6,25 +6,26 @@ It defines a function to add predefined beer styles to the database.
 from brewblog import create_app, db
 from brewblog.models import Style
 
+STYLES = [
+    'Pale Ale',
+    'IPA',
+    'Wheat',
+    'Amber',
+    'Red',
+    'Porter',
+    'Stout',
+    'Sour',
+    'Pilsner'
+]
+
 def seed_styles():
     """
     Seeds the database with predefined beer styles.
 
     If the styles table is empty, it adds a list of predefined beer styles to the database.
     """
-    styles = [
-        'Pale Ale',
-        'IPA',
-        'Wheat',
-        'Amber',
-        'Red',
-        'Porter',
-        'Stout',
-        'Sour',
-        'Pilsner'
-    ]
     if not Style.query.first():
-        for name in styles:
+        for name in STYLES:
             new_style = Style(name=name)
             db.session.add(new_style)
     db.session.commit()
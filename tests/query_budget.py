@@ -0,0 +1,89 @@
+"""
+This module provides helpers to count the SQL statements issued by the application,
+and the per-route query budgets enforced by the test suite.
+"""
+
+from contextlib import contextmanager
+import sqlalchemy as sa
+
+# Maximum number of SQL statements each endpoint may issue, independent of the
+# amount of data in the database.
+ROUTE_BUDGETS = {
+    'brewery.get_breweries': 2,
+    'brewery.lookup_breweries_by_id': 2,
+    'brewery.create_brewery': 3,
+    'brewery.show_brewery': 2,
+    'brewery.edit_brewery': 7,
+    'brewery.get_area_summary': 2,
+    'beer.get_beers_for_brewery': 1,
+    'beer.create_beer': 6,
+    'beer.delete_beer': 5,
+    'beer.get_styles': 1,
+    'sync.sync': 3,
+    'stream.stream': 1,
+    # The sum of the budgets of its sub-requests: the test batch reads the
+    # styles, a brewery and its beers
+    'batch.batch': 4,
+    'job.create_job': 1,
+    'job.get_job': 1,
+    'ready': 0,
+}
+
+class QueryCounter:
+    """
+    Collects the SQL statements executed on an engine.
+
+    Attributes:
+        statements (list): The statements executed so far.
+    """
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        """
+        int: The number of statements executed so far.
+        """
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine):
+    """
+    Counts the SQL statements executed on an engine within the block.
+
+    Args:
+        engine (Engine): The engine to listen on.
+
+    Yields:
+        QueryCounter: The counter collecting the statements.
+    """
+    counter = QueryCounter()
+    sa.event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', counter)
+
+@contextmanager
+def assert_query_budget(testcase, engine, endpoint):
+    """
+    Asserts that the block stays within the query budget of an endpoint.
+
+    Args:
+        testcase (TestCase): The test case used to report failures.
+        engine (Engine): The engine to listen on.
+        endpoint (str): The endpoint name, as declared in ROUTE_BUDGETS.
+
+    Yields:
+        QueryCounter: The counter collecting the statements.
+    """
+    budget = ROUTE_BUDGETS[endpoint]
+    with count_queries(engine) as counter:
+        yield counter
+    testcase.assertLessEqual(
+        counter.count, budget,
+        f'{endpoint} issued {counter.count} queries (budget {budget}):\n'
+        + '\n'.join(counter.statements))
@@ -0,0 +1,143 @@
+"""
+This module contains tests for the deterministic parts of the benchmark tooling.
+The benchmarks themselves need a loaded database or a running instance, but the
+dataset they run against, and the way the load test reads and reports requests,
+must not change silently between two runs that are compared.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+import jwt
+from benchmarks.dataset import Dataset
+from benchmarks.loadtest import load_collection, percentile
+
+def _token(permissions):
+    # The collection's own tokens are only decoded, never verified
+    return jwt.encode({'permissions': permissions}, 'collection-signing-secret-unused-here', algorithm='HS256')
+
+COLLECTION = {
+    'info': {'name': 'BrewBlog API'},
+    'item': [
+        {
+            'name': 'Public',
+            'item': [{
+                'name': 'Styles',
+                'request': {'method': 'GET', 'url': {'raw': '{{endpoint}}/styles'}}
+            }]
+        },
+        {
+            'name': 'Brewer',
+            'auth': {'type': 'bearer', 'bearer': [{'key': 'token', 'value': '{{brewer_token}}'}]},
+            'item': [
+                {
+                    'name': 'Create Brewery',
+                    'request': {
+                        'method': 'POST',
+                        'url': '{{endpoint}}/breweries/create',
+                        'body': {'mode': 'raw', 'raw': '{"name": "New Brewery"}'}
+                    }
+                },
+                {
+                    'name': 'Delete Beer',
+                    'request': {'method': 'POST', 'url': {'raw': '{{endpoint}}/beers/1/delete'}}
+                }
+            ]
+        }
+    ],
+    'variable': [
+        {'key': 'endpoint', 'value': 'https://brewblog.example.com/api'},
+        {'key': 'brewer_token', 'value': _token(['create:breweries', 'delete:beers'])}
+    ]
+}
+
+class DatasetTestCase(unittest.TestCase):
+    """
+    This class represents the synthetic dataset test case.
+    """
+    def test_beer_counts_follow_zipf(self):
+        """
+        Test that the beers are spread over the breweries with a fixed, heavily skewed distribution.
+        """
+        dataset = Dataset(20, 200, seed=7)
+        counts = dataset.beer_counts()
+        self.assertEqual(counts, [2, 3, 2, 2, 5, 3, 9, 2, 5, 6, 14, 19, 30, 63, 2, 8, 11, 3, 4, 7])
+        self.assertEqual(counts, Dataset(20, 200, seed=7).beer_counts())
+        self.assertNotEqual(counts, Dataset(20, 200, seed=8).beer_counts())
+
+        counts = sorted(Dataset(1000, 100000).beer_counts(), reverse=True)
+        self.assertEqual(sum(counts), 100000)
+        self.assertGreaterEqual(min(counts), 1)
+        # The largest brewery has about 2**1.1 times the beers of the second one
+        self.assertAlmostEqual(counts[0] / counts[1], 2 ** 1.1, delta=0.05)
+        self.assertGreater(sum(counts[:10]), sum(counts) / 3)
+
+    def test_beer_rows_ids_and_breweries(self):
+        """
+        Test that beers get consecutive ids and belong to breweries in proportion to their counts.
+        """
+        dataset = Dataset(5, 50, seed=3)
+        brewery_ids = [brewery['id'] for brewery in dataset.brewery_rows()]
+        self.assertEqual(brewery_ids, [brewery['id'] for brewery in Dataset(5, 50, seed=3).brewery_rows()])
+        self.assertEqual(len(set(brewery_ids)), 5)
+
+        rows = list(dataset.beer_rows(brewery_ids, [1, 2], first_id=10))
+        self.assertEqual([row['id'] for row in rows], list(range(10, 60)))
+        self.assertEqual([sum(1 for row in rows if row['brewery_id'] == brewery_id)
+                          for brewery_id in brewery_ids], dataset.beer_counts())
+        # The beers of a brewery are generated together, in brewery order
+        self.assertEqual(list(dict.fromkeys(row['brewery_id'] for row in rows)),
+                         [brewery_id for brewery_id, count in zip(brewery_ids, dataset.beer_counts())
+                          if count])
+        self.assertTrue(all(row['style_id'] in (1, 2) for row in rows))
+        self.assertEqual(rows, list(dataset.beer_rows(brewery_ids, [1, 2], first_id=10)))
+
+class LoadTestTestCase(unittest.TestCase):
+    """
+    This class represents the load test tooling test case.
+    """
+    def test_percentile(self):
+        """
+        Test the nearest-rank percentiles of sorted samples.
+        """
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.5), 50)
+        self.assertEqual(percentile(samples, 0.95), 95)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile(samples, 1), 100)
+        self.assertEqual(percentile(samples, 0), 1)
+        self.assertEqual(percentile([0.2, 0.4, 0.7], 0.5), 0.4)
+        self.assertEqual(percentile([0.2], 0.99), 0.2)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_load_collection(self):
+        """
+        Test that the Postman collection is read into request shapes, with locally minted tokens.
+        """
+        with open('tests/private_key.pem', 'r', encoding='utf-8') as f:
+            private_key = f.read()
+        with open('tests/public_key.pem', 'r', encoding='utf-8') as f:
+            public_key = f.read()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'collection.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(COLLECTION, f)
+            shapes = load_collection(path, private_key)
+
+        self.assertEqual([(shape['name'], shape['method'], shape['path'], shape['body'])
+                          for shape in shapes], [
+            ('Public/Styles', 'GET', '/styles', None),
+            ('Brewer/Create Brewery', 'POST', '/breweries/create', {'name': 'New Brewery'}),
+            ('Brewer/Delete Beer', 'POST', '/beers/1/delete', None),
+        ])
+        self.assertEqual(shapes[0]['headers'], {})
+        # Each token variable is minted once, with its permissions, and signed with the test key
+        self.assertEqual(shapes[1]['headers'], shapes[2]['headers'])
+        scheme, token = shapes[1]['headers']['Authorization'].split()
+        self.assertEqual(scheme, 'Bearer')
+        claims = jwt.decode(token, public_key, algorithms=['RS256'])
+        self.assertEqual(claims['permissions'], ['create:breweries', 'delete:beers'])
+
+if __name__ == '__main__':
+    unittest.main()
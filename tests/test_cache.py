@@ -0,0 +1,47 @@
+"""
+This module contains tests for the choice of the cache invalidation mode.
+"""
+
+import unittest
+from brewblog import create_app
+from config import Config
+
+class CacheTestCase(unittest.TestCase):
+    """
+    This class represents the cache invalidation test case.
+    """
+    def create_app(self, mode):
+        """
+        Creates an application on an in-memory SQLite database.
+
+        Args:
+            mode (str): The CACHE_INVALIDATION setting.
+
+        Returns:
+            Flask: The application.
+        """
+        class CacheConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite://'
+            CACHE_INVALIDATION = mode
+        return create_app(CacheConfig)
+
+    def test_auto_polls_without_notifications(self):
+        """
+        Test that the automatic mode polls the change log on databases without LISTEN/NOTIFY.
+        """
+        with self.assertLogs('brewblog.cache', 'INFO') as logs:
+            app = self.create_app('auto')
+        self.assertEqual(app.extensions['invalidation_bus'].mode, 'poll')
+        self.assertIn('Cache invalidation mode: poll, on sqlite', logs.output[0])
+
+    def test_notify_without_notifications_warns(self):
+        """
+        Test that notifications requested on a database without them are kept, with a warning.
+        """
+        with self.assertLogs('brewblog.cache', 'WARNING') as logs:
+            app = self.create_app('notify')
+        self.assertEqual(app.extensions['invalidation_bus'].mode, 'notify')
+        self.assertIn('sqlite has no LISTEN/NOTIFY', logs.output[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+This module contains unit tests for request profiling.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from brewblog import create_app
+from brewblog.profiling import (
+    StackSampler, sign_profile_request, verify_profile_request, write_folded)
+from config import Config
+
+class ProfilingTestCase(unittest.TestCase):
+    """
+    This class represents the profiling test case.
+    """
+    def test_profile_sampler_and_aggregate(self):
+        """
+        Test sampling the stack of a thread, and aggregating the profile per route.
+        """
+        done = threading.Event()
+        def slow_serialize():
+            while not done.is_set():
+                time.sleep(0.001)
+
+        worker = threading.Thread(target=slow_serialize)
+        worker.start()
+        sampler = StackSampler(0.001)
+        try:
+            self.assertTrue(sampler.start(worker.ident))
+            self.assertFalse(sampler.start(worker.ident))
+            time.sleep(0.05)
+            stacks = sampler.stop(worker.ident)
+        finally:
+            done.set()
+            worker.join()
+        self.assertTrue(any('slow_serialize' in stack for stack in stacks))
+
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'brewery.get_breweries'))
+            for name in ('1.folded', '2.folded'):
+                write_folded(os.path.join(directory, 'brewery.get_breweries', name), stacks)
+            class ProfilingConfig(Config):
+                SQLALCHEMY_DATABASE_URI = 'sqlite://'
+            result = create_app(ProfilingConfig).test_cli_runner().invoke(
+                args=['profiles', 'aggregate', '--directory', directory])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn(f'brewery.get_breweries: 2 profiles, {2 * sum(stacks.values())} samples',
+                      result.output)
+
+    def test_verify_profile_request(self):
+        """
+        Test that only recent profile headers signed for the requested path are accepted.
+        """
+        header = sign_profile_request('secret', '/api/breweries')
+        self.assertTrue(verify_profile_request('secret', '/api/breweries', header, 300))
+        self.assertFalse(verify_profile_request('other', '/api/breweries', header, 300))
+        self.assertFalse(verify_profile_request('secret', '/api/styles', header, 300))
+        self.assertFalse(verify_profile_request(
+            'secret', '/api/breweries', sign_profile_request('secret', '/api/breweries', 0), 300))
+        self.assertFalse(verify_profile_request('secret', '/api/breweries', 'garbage', 300))
+        self.assertFalse(verify_profile_request(None, '/api/breweries', header, 300))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,360 @@
+"""
+This module contains query budget tests for the Brewery API routes.
+Each route is exercised against seeded datasets of increasing size, and must stay
+within its declared budget regardless of the amount of data, so N+1 query
+patterns fail the build. Every test resets its database, so the routes run
+against a throwaway SQLite file, or the database of `TEST_DATABASE_URI`, and
+never against the configured `SQLALCHEMY_DATABASE_URI`.
+"""
+
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+import jwt
+from brewblog import create_app, db
+from brewblog.areas import refresh_areas
+from brewblog.documents import rebuild_all_documents
+from brewblog.models import Brewery, Beer, Style
+from config import Config
+from tests.query_budget import ROUTE_BUDGETS, assert_query_budget
+
+# (breweries, beers per brewery) for each seeded dataset
+DATASET_SIZES = [(1, 1), (5, 3), (20, 10)]
+
+def brewery_id(i):
+    """
+    Returns the ID of the i-th seeded brewery.
+    """
+    return str(uuid.UUID(int=i))
+
+NEW_BREWERY_ID = brewery_id(10**6)
+
+class QueryBudgetTestCase(unittest.TestCase):
+    """
+    This class represents the query budget test case.
+    """
+    def setUp(self):
+        load_dotenv()
+
+        self.directory = tempfile.TemporaryDirectory()
+        database_uri = os.environ.get(
+            'TEST_DATABASE_URI', f'sqlite:///{os.path.join(self.directory.name, "budgets.db")}')
+        class QueryBudgetConfig(Config):
+            SQLALCHEMY_DATABASE_URI = database_uri
+            CACHE_INVALIDATION = 'notify'
+        self.app = create_app(QueryBudgetConfig)
+        self.client = self.app.test_client()
+        with open('tests/private_key.pem', 'r', encoding='utf-8') as f:
+            self.private_key = f.read()
+
+    def tearDown(self):
+        """
+        Tear down the database after each test.
+        """
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.directory.cleanup()
+
+    def seed_data(self, breweries, beers_per_brewery):
+        """
+        Reset the database and seed it with a dataset of the given size.
+
+        Args:
+            breweries (int): The number of breweries to create.
+            beers_per_brewery (int): The number of beers to create for each brewery.
+        """
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            styles = [Style(id=i, name=name) for i, name in enumerate(['IPA', 'Stout', 'Sour'], 1)]
+            db.session.add_all(styles)
+            beer_id = 1
+            for i in range(1, breweries + 1):
+                db.session.add(Brewery(
+                    id=brewery_id(i),
+                    name=f'Brewery {i}',
+                    address=f'{i} Test St',
+                    city=f'City {i % 4}',
+                    state='ND',
+                    phone='123-456-7890',
+                    website_link=f'http://brewery{i}.com'))
+                for j in range(beers_per_brewery):
+                    db.session.add(Beer(
+                        id=beer_id,
+                        name=f'Beer {beer_id}',
+                        description='A test beer',
+                        brewery_id=brewery_id(i),
+                        style_id=styles[j % len(styles)].id))
+                    beer_id += 1
+            db.session.commit()
+        # The seeded data is written out of band, without invalidations
+        self.app.extensions['cache'].clear()
+
+    def assert_budget(self, endpoint, send_request, prepare=None):
+        """
+        Send a request against each dataset size and check it stays within budget.
+
+        Args:
+            endpoint (str): The endpoint name, as declared in ROUTE_BUDGETS.
+            send_request (callable): Sends the request and returns the response.
+            prepare (callable, optional): Runs after seeding, before counting queries.
+        """
+        counts = []
+        for breweries, beers_per_brewery in DATASET_SIZES:
+            with self.subTest(breweries=breweries, beers_per_brewery=beers_per_brewery):
+                self.seed_data(breweries, beers_per_brewery)
+                if prepare is not None:
+                    prepare()
+                with self.app.app_context():
+                    engine = db.engine
+                with assert_query_budget(self, engine, endpoint) as counter:
+                    response = send_request()
+                self.assertLess(response.status_code, 300)
+                counts.append(counter.count)
+        self.assertEqual(len(set(counts)), 1, f'{endpoint} query count grows with data: {counts}')
+
+    def test_every_route_has_a_budget(self):
+        """
+        Test that every blueprint route declares a query budget.
+        """
+        endpoints = {
+            rule.endpoint for rule in self.app.url_map.iter_rules()
+            if rule.endpoint != 'static'}
+        self.assertTrue(endpoints)
+        for endpoint in endpoints:
+            self.assertIn(endpoint, ROUTE_BUDGETS)
+
+    def test_get_breweries_budget(self):
+        """
+        Test the query budget of listing breweries.
+        """
+        self.assert_budget('brewery.get_breweries', lambda: self.client.get(
+            '/api/breweries',
+            headers=self.get_auth_headers('get:breweries')))
+
+    def test_get_breweries_by_ids_budget(self):
+        """
+        Test the query budget of listing breweries by id.
+        """
+        self.assert_budget('brewery.get_breweries', lambda: self.client.get(
+            f'/api/breweries?ids={brewery_id(1)},{NEW_BREWERY_ID},missing',
+            headers=self.get_auth_headers('get:breweries')))
+
+    def test_lookup_breweries_budget(self):
+        """
+        Test the query budget of looking up breweries by id.
+        """
+        self.assert_budget('brewery.lookup_breweries_by_id', lambda: self.client.post(
+            '/api/breweries/lookup',
+            headers=self.get_auth_headers('get:breweries'),
+            json={'ids': [brewery_id(i) for i in range(1, 30)]}))
+
+    def test_create_brewery_budget(self):
+        """
+        Test the query budget of creating a brewery.
+        """
+        self.assert_budget('brewery.create_brewery', lambda: self.client.post(
+            '/api/breweries/create',
+            headers=self.get_auth_headers('create:breweries'),
+            json={
+                'id': NEW_BREWERY_ID,
+                'name': 'New Brewery',
+                'address': '456 New St',
+                'city': 'New City',
+                'state': 'NC',
+                'phone': '987-654-3210',
+                'website_link': 'http://newbrewery.com'
+            }))
+
+    def test_show_brewery_budget(self):
+        """
+        Test the query budget of showing a brewery.
+        """
+        self.assert_budget('brewery.show_brewery', lambda: self.client.get(
+            f'/api/breweries/{brewery_id(1)}',
+            headers=self.get_auth_headers('get:breweries')))
+
+    def test_show_brewery_document_budget(self):
+        """
+        Test the query budget of showing a brewery from its stored document.
+        """
+        def rebuild():
+            with self.app.app_context():
+                rebuild_all_documents()
+
+        self.app.config['BREWERY_DOCUMENTS'] = True
+        self.assert_budget('brewery.show_brewery', lambda: self.client.get(
+            f'/api/breweries/{brewery_id(1)}',
+            headers=self.get_auth_headers('get:breweries')), prepare=rebuild)
+
+    def test_edit_brewery_budget(self):
+        """
+        Test the query budget of editing a brewery.
+        """
+        self.assert_budget('brewery.edit_brewery', lambda: self.client.patch(
+            f'/api/breweries/{brewery_id(1)}/edit',
+            headers=self.get_auth_headers('edit:breweries'),
+            json={
+                'name': 'Updated Brewery',
+                'address': '123 Updated St',
+                'city': 'Updated City',
+                'state': 'US',
+                'phone': '123-456-7890',
+                'website_link': 'http://updatedbrewery.com'
+            }))
+
+    def test_get_area_summary_budget(self):
+        """
+        Test the query budget of summarizing breweries by area.
+        """
+        def refresh():
+            with self.app.app_context():
+                refresh_areas()
+
+        self.assert_budget('brewery.get_area_summary', lambda: self.client.get(
+            '/api/areas/summary',
+            headers=self.get_auth_headers('get:breweries')), prepare=refresh)
+
+    def test_get_beers_for_brewery_budget(self):
+        """
+        Test the query budget of listing the beers of a brewery.
+        """
+        self.assert_budget('beer.get_beers_for_brewery', lambda: self.client.get(
+            f'/api/breweries/{brewery_id(1)}/beers',
+            headers=self.get_auth_headers('get:breweries')))
+
+    def test_create_beer_budget(self):
+        """
+        Test the query budget of creating a beer.
+        """
+        self.assert_budget('beer.create_beer', lambda: self.client.post(
+            '/api/beers/create',
+            headers=self.get_auth_headers('create:beers'),
+            json={
+                'id': 10000,
+                'name': 'New Beer',
+                'description': 'A new beer',
+                'style': 1,
+                'brewery_id': brewery_id(1)
+            }))
+
+    def test_delete_beer_budget(self):
+        """
+        Test the query budget of deleting a beer.
+        """
+        self.assert_budget('beer.delete_beer', lambda: self.client.post(
+            '/api/beers/1/delete',
+            headers=self.get_auth_headers('delete:beers')))
+
+    def test_get_styles_budget(self):
+        """
+        Test the query budget of listing beer styles.
+        """
+        self.assert_budget('beer.get_styles', lambda: self.client.get('/api/styles'))
+
+    def test_sync_budget(self):
+        """
+        Test the query budget of an incremental sync.
+        """
+        def create_beers():
+            headers = self.get_auth_headers('create:beers')
+            for beer_id in range(20000, 20005):
+                self.client.post('/api/beers/create', headers=headers, json={
+                    'id': beer_id,
+                    'name': 'New Beer',
+                    'description': 'A new beer',
+                    'style': 1,
+                    'brewery_id': brewery_id(1)
+                })
+            self.client.post('/api/beers/1/delete', headers=self.get_auth_headers('delete:beers'))
+
+        self.assert_budget('sync.sync', lambda: self.client.get(
+            '/api/sync?since=0',
+            headers=self.get_auth_headers('get:breweries')), prepare=create_beers)
+
+    def test_stream_budget(self):
+        """
+        Test the query budget of resuming an event stream.
+        """
+        def resume_stream():
+            response = self.client.get(
+                '/api/stream',
+                headers={**self.get_auth_headers('get:breweries'), 'Last-Event-ID': '0'})
+            response.close()
+            return response
+
+        self.app.config['STREAM_MAX_DURATION'] = 0
+        self.assert_budget('stream.stream', resume_stream)
+
+    def test_batch_budget(self):
+        """
+        Test the query budget of a batch of reads.
+        """
+        self.assert_budget('batch.batch', lambda: self.client.post(
+            '/api/batch',
+            headers=self.get_auth_headers('get:breweries'),
+            json={'requests': [
+                {'method': 'GET', 'path': '/api/styles'},
+                {'method': 'GET', 'path': f'/api/breweries/{brewery_id(1)}'},
+                {'method': 'GET', 'path': f'/api/breweries/{brewery_id(1)}/beers'}
+            ]}))
+
+    def test_create_job_budget(self):
+        """
+        Test the query budget of queueing a job.
+        """
+        self.assert_budget('job.create_job', lambda: self.client.post(
+            '/api/jobs',
+            headers=self.get_auth_headers('run:jobs'),
+            json={'kind': 'refresh_areas'}))
+
+    def test_get_job_budget(self):
+        """
+        Test the query budget of getting the status of a job.
+        """
+        def queue_job():
+            self.client.post(
+                '/api/jobs',
+                headers=self.get_auth_headers('run:jobs'),
+                json={'kind': 'refresh_areas'})
+
+        self.assert_budget('job.get_job', lambda: self.client.get(
+            '/api/jobs/1',
+            headers=self.get_auth_headers('run:jobs')), prepare=queue_job)
+
+    def test_ready_budget(self):
+        """
+        Test that the readiness endpoint does not query the database.
+        """
+        self.assert_budget('ready', lambda: self.client.get('/ready'))
+
+    def get_auth_headers(self, permission):
+        """
+        Helper method to get authorization headers with a mock JWT token.
+
+        Args:
+            permission (str): The permission to include in the JWT token.
+
+        Returns:
+            dict: The authorization headers.
+        """
+        payload = {
+            'permissions': [permission],
+            'exp': int((datetime.now(timezone.utc) + timedelta(hours=1)).timestamp()),
+            'iat': int(datetime.now(timezone.utc).timestamp()),
+            'iss': 'test_issuer',
+            'sub': 'test_subject'
+        }
+        token = jwt.encode(payload, self.private_key, algorithm='RS256')
+        return {
+            'Authorization': f'Bearer {token}'
+        }
+
+if __name__ == '__main__':
+    unittest.main()
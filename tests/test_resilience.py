@@ -0,0 +1,61 @@
+"""
+This module contains unit tests for the circuit breaker and the stale response store.
+"""
+
+import time
+import unittest
+from flask import Flask
+from brewblog.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, StaleResponseStore
+
+class ResilienceTestCase(unittest.TestCase):
+    """
+    This class represents the resilience test case.
+    """
+    def test_circuit_breaker(self):
+        """
+        Test that the circuit opens after consecutive failures, and lets a single probe through.
+        """
+        breaker = CircuitBreaker(2, 0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.allow(), CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertIsNone(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.allow(), HALF_OPEN)
+        self.assertIsNone(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.allow(), HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.allow(), CLOSED)
+
+    def test_stale_response_store_byte_budget(self):
+        """
+        Test that the stale response store evicts the least recently used responses over its size budget.
+        """
+        app = Flask(__name__)
+        store = StaleResponseStore(300, 10, max_bytes=100)
+        with app.app_context():
+            store.put('a', app.response_class(b'a' * 40))
+            store.put('b', app.response_class(b'b' * 40))
+            self.assertIsNotNone(store.get('a'))
+            store.put('c', app.response_class(b'c' * 40))
+            self.assertIsNone(store.get('b'))
+            self.assertEqual(store.get('a').get_data(), b'a' * 40)
+            self.assertEqual(store.size, 80)
+
+            # Replacing a response does not count it twice
+            store.put('c', app.response_class(b'c' * 50))
+            self.assertEqual(store.size, 90)
+
+            # A response over the budget is not kept, nor is its previous version
+            store.put('a', app.response_class(b'a' * 101))
+            self.assertIsNone(store.get('a'))
+            self.assertEqual(store.size, 50)
+
+if __name__ == '__main__':
+    unittest.main()
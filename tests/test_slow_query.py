@@ -0,0 +1,106 @@
+"""
+This module contains tests for the slow query log.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+import sqlalchemy as sa
+from brewblog import create_app, db
+from brewblog.models import Style
+from brewblog.slow_query import SlowQueryLog, explain_statement, redact_parameters
+from config import Config
+
+class SlowQueryTestCase(unittest.TestCase):
+    """
+    This class represents the slow query log test case.
+    """
+    def test_redact_parameters(self):
+        """
+        Test that parameter values are replaced with their type names, keeping their shape.
+        """
+        self.assertIsNone(redact_parameters(None))
+        self.assertEqual(redact_parameters({'name': 'secret', 'id': 1}),
+                         {'name': '<str>', 'id': '<int>'})
+        self.assertEqual(redact_parameters(('secret', 1.5)), ['<str>', '<float>'])
+        self.assertEqual(redact_parameters([{'name': 'secret'}, ('a', None)]),
+                         [{'name': '<str>'}, ['<str>', '<NoneType>']])
+        self.assertEqual(redact_parameters('secret'), '<str>')
+
+    def test_logs_slow_statements_with_route(self):
+        """
+        Test that statements over the threshold are logged with the route that issued them.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            class SlowQueryConfig(Config):
+                SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(directory, "slow.db")}'
+                SLOW_QUERY_THRESHOLD_MS = 0.000001
+                CACHE_TTL = 0
+            app = create_app(SlowQueryConfig)
+            with app.app_context():
+                db.create_all()
+                db.session.add(Style(name='IPA'))
+                db.session.commit()
+
+            with self.assertLogs('brewblog.slow_query', 'WARNING') as logs:
+                response = app.test_client().get('/api/styles?secret=1')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(any('GET /api/styles (beer.get_styles)' in line for line in logs.output))
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+    def test_explain_rate_limit(self):
+        """
+        Test that plans are captured at most once per global interval, and per statement interval.
+        """
+        engine = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'))
+        slow_query_log = SlowQueryLog(
+            engine, 1, explain=True, explain_interval=60, explain_global_interval=0.05)
+        first = 'SELECT * FROM "Brewery"'
+        second = 'SELECT * FROM "Beer"'
+
+        self.assertFalse(slow_query_log._should_explain('UPDATE "Brewery" SET name = %(name)s'))
+        self.assertTrue(slow_query_log._should_explain(first))
+        # Within the global interval
+        self.assertFalse(slow_query_log._should_explain(second))
+
+        time.sleep(0.06)
+        self.assertTrue(slow_query_log._should_explain(second))
+        time.sleep(0.06)
+        # Within the interval of the statement
+        self.assertFalse(slow_query_log._should_explain(first))
+
+    def test_explain_locking_reads_without_analyze(self):
+        """
+        Test that locking reads are only planned, as ANALYZE would take their row locks.
+        """
+        select = 'SELECT * FROM "Brewery" WHERE id = %(id)s'
+        self.assertEqual(explain_statement(select), f'EXPLAIN (ANALYZE, BUFFERS) {select}')
+        for clause in ('FOR UPDATE', 'FOR NO KEY UPDATE', 'FOR SHARE', 'for key share',
+                       'FOR UPDATE SKIP LOCKED', 'FOR UPDATE OF "Brewery" NOWAIT'):
+            with self.subTest(clause=clause):
+                statement = f'{select} {clause}'
+                self.assertEqual(explain_statement(statement), f'EXPLAIN {statement}')
+        # Only the locking clause counts, not the words in identifiers or literals
+        self.assertTrue(explain_statement(
+            'SELECT "FORMAT" FROM "Share"').startswith('EXPLAIN (ANALYZE'))
+
+    def test_failed_statement_discards_start_time(self):
+        """
+        Test that the start time of a failed statement is not left on the connection.
+        """
+        engine = sa.create_engine('sqlite://')
+        SlowQueryLog(engine, 1000).register()
+        with engine.connect() as conn:
+            with self.assertRaises(sa.exc.OperationalError):
+                conn.execute(sa.text('SELECT * FROM missing'))
+            self.assertEqual(conn.info['query_start_time'], [])
+            conn.execute(sa.text('SELECT 1'))
+            self.assertEqual(conn.info['query_start_time'], [])
+        engine.dispose()
+
+if __name__ == '__main__':
+    unittest.main()
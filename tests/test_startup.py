@@ -0,0 +1,67 @@
+"""
+This module contains the startup time budget test.
+Autoscaled workers start under load, so `create_app` only does what every
+request needs. The application is created in a fresh interpreter, which must
+stay within the budget and must not import the libraries deferred to first use.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Seconds to import the package and create the application, override with STARTUP_BUDGET_SECONDS
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 1.5))
+
+# Libraries only needed by the CLI or on first use
+DEFERRED_MODULES = ('flask_migrate', 'alembic', 'jose', 'cryptography')
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from brewblog import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+'''
+
+class StartupTestCase(unittest.TestCase):
+    """
+    This class represents the startup test case.
+    """
+    def create_app_in_subprocess(self):
+        """
+        Creates the application in a fresh interpreter.
+
+        Returns:
+            dict: The time taken, in seconds, and the imported modules.
+        """
+        env = dict(os.environ, FLASK_ENV='testing')
+        env.pop('FLASK_RUN_FROM_CLI', None)
+        env.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], env=env, capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_create_app_within_budget(self):
+        """
+        Test that importing and creating the application stays within the startup budget.
+        """
+        # The best of a few runs, so a busy machine does not fail the build
+        elapsed = min(self.create_app_in_subprocess()['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, STARTUP_BUDGET_SECONDS,
+                        f'create_app took {elapsed:.3f}s, over the {STARTUP_BUDGET_SECONDS}s budget')
+
+    def test_create_app_defers_imports(self):
+        """
+        Test that the migration tooling and the JWT libraries are not imported at startup.
+        """
+        modules = set(self.create_app_in_subprocess()['modules'])
+        for module in DEFERRED_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, modules)
+
+if __name__ == '__main__':
+    unittest.main()